@@ -7,7 +7,8 @@ from collections import defaultdict
 from adhoccomputing.Experimentation.Topology import Topology
 from adhoccomputing.GenericModel import GenericModel, GenericMessageHeader,  GenericMessage
 from adhoccomputing.Generics import *
-from Snapshot.Snapshot import SnapshotComponentModel, SnapshotMessageTypes, SnapshotEventTypes
+from Snapshot.Snapshot import SnapshotComponentModel, SnapshotMessageTypes, SnapshotEventTypes, SnapshotCollectionModes, \
+    SnapshotInstance
 
 
 
@@ -17,39 +18,49 @@ class ChandyLamportMessageTypes(Enum):
 
 class ChandyLamportState:
     """
-    ChandyLamportState keeps track of states.
+    ChandyLamportState keeps track of states: the incrementally recorded LocalState of the component and the events
+    recorded on each incoming channel. Both are kept as they are, not copied.
     """
 
-    def __init__(self, component, state, chnl_states):
+    def __init__(self, component, state, chnl_states, snapshot_id=None):
         self.component_id = component
-        self.component_state = []
-        for s in state:
-            self.component_state.append(s)
+        self.component_state = state
+        self.chnl_states = dict(chnl_states)
+        self.snapshot_id = snapshot_id
 
-        self.chnl_states = defaultdict(list)
-        for c, s in chnl_states.items():
-            self.chnl_states[c].append(s)
 
-class ChandyLamportComponentModel(SnapshotComponentModel):
+class ChandyLamportInstance(SnapshotInstance):
     """
-    A ComponentModel that you can take a snapshot of using the Chandy-Lamport algorithm
+    State of a component for one Chandy-Lamport snapshot.
     """
 
-    def __init__(self, componentname, componentinstancenumber, context=None, configurationparameters=None, num_worker_threads=1, topology=None):
-        super().__init__(componentname, componentinstancenumber, context, configurationparameters, num_worker_threads, topology)
-        self.global_state = dict()
+    def __init__(self, snapshot_id):
+        super().__init__(snapshot_id)
+        self.global_state = dict()  # At the initiator, state of each component by component id
         self.in_chnl_states = defaultdict(list)
         self.in_chnl_events = defaultdict(list)
         self.mark_recv_chnls = set()
-        self.gsu_chnls = set()
 
-    def on_gsu_recv(self, state: ChandyLamportState):
-        if not self.init_snapshot:
+
+class ChandyLamportComponentModel(SnapshotComponentModel):
+    """
+    A ComponentModel that you can take a snapshot of using the Chandy-Lamport algorithm
+
+    Markers carry the id of their snapshot, so that the snapshots are independent: a message is recorded in the state of
+    a channel for every snapshot whose marker has not arrived on the channel yet.
+
+    In SPANNING_TREE collection mode, the channel of the first marker of a component is its parent in the spanning tree
+    and markers carry the parent channel of their sender, so that a component knows its children once it has received
+    a marker on every channel, i.e. when its local state is complete.
+    """
+    snapshot_instance_type = ChandyLamportInstance
+
+    def on_gsu_recv(self, instance, state: ChandyLamportState):
+        if not instance.init_snapshot:
             return
 
-        report=f"State of component: {state.component_id}="
-        report += ", ".join(str(e) for e in state.component_state)
-        logger.debug(report)
+        instance.global_state[state.component_id] = state
+        logger.debug(f"State of component: {state.component_id}={state.component_state}")
         for chnl, events in state.chnl_states.items():
             chnl_rep = f"State of channel: {chnl}="
             chnl_rep += ", ".join(str(e) for e in events)
@@ -58,42 +69,46 @@ class ChandyLamportComponentModel(SnapshotComponentModel):
     def send_msg(self, event: Event):
         self.send_down(event)
 
-    def mark_send(self):
+    def mark_send(self, instance):
         # Record the state
-        self.state = []
-        for re in self.recv_events:
-            self.state.append(re)
+        instance.state = self.record_local_state()
 
         # Broadcast the mark message
         mark_msg = GenericMessage(
             GenericMessageHeader(ChandyLamportMessageTypes.MARKER, None, None),
-            None)
+            (instance.snapshot_id, instance.tree_parent))
         self.send_msg(Event(self, EventTypes.MFRT, mark_msg))
 
-    def on_take_snapshot(self):
+    def on_take_snapshot(self, instance):
         """Initializes a global snapshot and a report will be printed out when
         complete"""
-        self.mark_send()
+        self.mark_send(instance)
 
-    def mark_recv(self, from_chnl):
-        if self.state is None:
+    def mark_recv(self, from_chnl, snapshot_id, parent_chnl=None):
+        instance = self.snapshot(snapshot_id)
+        if instance is None:
+            return
+        if instance.state is None:
             # First mark message, save component and channel state
-            self.mark_send()
-            self.in_chnl_states[from_chnl] = []
+            self.join_tree(instance, from_chnl)
+            self.mark_send(instance)
+            instance.in_chnl_states[from_chnl] = []
         else:
             # Consequent mark messages, save channel states
-            for e in self.in_chnl_events[from_chnl]:
-                self.in_chnl_states[e].append(e)
+            instance.in_chnl_states[from_chnl] = instance.in_chnl_events.pop(from_chnl, [])
 
-        self.mark_recv_chnls.add(from_chnl)
-        if self.mark_recv_chnls == self.chnls:
-            # Local snapshot completed, broadcast the local state
+        if parent_chnl == from_chnl:
+            # The sender joined the tree with our marker
+            self.add_tree_child(instance, from_chnl)
+
+        instance.mark_recv_chnls.add(from_chnl)
+        if instance.mark_recv_chnls == self.chnls:
             local_state = ChandyLamportState(self.componentinstancenumber,
-                                             self.state, self.in_chnl_states)
-            gsu_msg = GenericMessage(
-                GenericMessageHeader(SnapshotMessageTypes.GLOBALSNAPSHOT, None, None),
-                local_state)
-            self.send_msg(Event(self, EventTypes.MFRT, gsu_msg))
+                                             instance.state, instance.in_chnl_states, snapshot_id)
+            if self.collection_mode == SnapshotCollectionModes.SPANNING_TREE:
+                self.tree_local_state_done(instance, local_state)
+                return
+            # Local snapshot completed, broadcast the local state
             self.gsu_recv(local_state)
 
     def msg_recv(self, event: Event):
@@ -102,24 +117,15 @@ class ChandyLamportComponentModel(SnapshotComponentModel):
         if type(contnt := event.eventcontent) == GenericMessage and\
            type(header := contnt.header) == GenericMessageHeader:
             if header.messagetype == ChandyLamportMessageTypes.MARKER:
-                self.mark_recv(from_chnl)
+                self.mark_recv(from_chnl, *contnt.payload)
             elif header.messagetype == SnapshotMessageTypes.GLOBALSNAPSHOT:
                 self.gsu_recv(contnt.payload)
 
             return event
 
-        if self.state is None:
-            return event
-
-        # If the state is not recorded
-        if from_chnl not in self.in_chnl_states:
-            self.in_chnl_events[from_chnl].append(event)
+        for instance in self.snapshots.values():
+            # If the state is recorded but not the state of the channel
+            if instance.state is not None and from_chnl not in instance.in_chnl_states:
+                instance.in_chnl_events[from_chnl].append(event)
 
         return event
-
-    def reset_state(self):
-        super().reset_state()
-        self.in_chnl_states.clear()
-        self.in_chnl_events.clear()
-        self.mark_recv_chnls.clear()
-
@@ -3,16 +3,15 @@ from enum import Enum
 from adhoccomputing.Experimentation.Topology import Topology
 from adhoccomputing.GenericModel import GenericModel, GenericMessageHeader, GenericMessagePayload, GenericMessage
 from adhoccomputing.Generics import *
-from collections import defaultdict
-from Snapshot.Snapshot import SnapshotComponentModel, SnapshotMessageTypes, SnapshotEventTypes
+from collections import defaultdict, Counter
+from Snapshot.Snapshot import SnapshotComponentModel, SnapshotMessageTypes, SnapshotEventTypes, SnapshotInstance
 
 
 class LaiYangState:
-    def __init__(self, comp_id, comp_state, received, sent):
+    def __init__(self, comp_id, comp_state, received, sent, snapshot_id=None):
         self.component_id = comp_id
-        self.component_state = []
-        for cs in comp_state:
-            self.component_state.append(cs)
+        self.component_state = comp_state
+        self.snapshot_id = snapshot_id
 
         self.received = defaultdict(list)
         for chnl, r in received.items():
@@ -22,67 +21,81 @@ class LaiYangState:
         for chnl, s in sent.items():
             self.sent[chnl].append(s)
 
+
+class LaiYangInstance(SnapshotInstance):
+    """
+    State of a component for one Lai-Yang snapshot.
+    """
+
+    def __init__(self, snapshot_id):
+        super().__init__(snapshot_id)
+        self.global_state = dict()
+        self.sent_remaining = dict()
+        self.recv_remaining = dict()
+
+
 class LaiYangComponentModel(SnapshotComponentModel):
+    """
+    A ComponentModel that you can take a snapshot of using the Lai-Yang algorithm. Messages carry the ids of the
+    snapshots their sender recorded, i.e. they are red for these snapshots and white for the others.
+    """
+    snapshot_instance_type = LaiYangInstance
+
     def __init__(self, componentname, componentinstancenumber, context=None, configurationparameters=None, num_worker_threads=1, topology=None):
         super().__init__(componentname, componentinstancenumber, context, configurationparameters, num_worker_threads, topology)
         self.chnl_recv = defaultdict(list)
         self.chnl_sent = defaultdict(list)
-        self.global_state = dict()
-        self.sent_remaining = dict()
-        self.recv_remaining = dict()
 
     def send_msg(self, event: Event):
-        event.eventcontent = (event.eventcontent, self.state is not None)
+        event.eventcontent = (event.eventcontent, self.recorded_snapshot_ids())
         for c in self.chnls:
             self.chnl_sent[c].append(event)
 
         self.send_down(event)
 
-    def handle_snapshot(self):
+    def handle_snapshot(self, instance):
         # Take a snapshot
-        self.state = LaiYangState(self.componentinstancenumber,
-                                  self.recv_events, self.chnl_recv,
-                                  self.chnl_sent)
-        self.gsu_recv(self.state)
+        instance.state = LaiYangState(self.componentinstancenumber,
+                                      self.record_local_state(), self.chnl_recv,
+                                      self.chnl_sent, instance.snapshot_id)
+        self.gsu_recv(instance.state)
 
-    def on_take_snapshot(self):
-        self.handle_snapshot()
+    def on_take_snapshot(self, instance):
+        self.handle_snapshot(instance)
 
         # Broadcast a dummy message so that other components record
         # and broadcast their snapshots
         self.send_msg(Event(self, EventTypes.MFRT, "dummy"))
 
-    def report_and_save_channel_state(self, channel, set_recv, set_sent):
+    def report_and_save_channel_state(self, instance, channel, set_recv, set_sent):
         if not set_recv.issubset(set_sent):
             raise Exception("Not a consistent global state")
 
         chnl_state = list(set_sent - set_recv)
-        self.global_state[channel] = chnl_state
+        instance.global_state[channel] = chnl_state
         logger.debug(f"State of channel: {channel}=chnl_state")
 
-    def on_gsu_recv(self, state: LaiYangState):
-        if not self.init_snapshot:
+    def on_gsu_recv(self, instance, state: LaiYangState):
+        if not instance.init_snapshot:
             return
         # Report the snapshot if we are the source component of the snapshot
-        self.global_state[state.component_id] = state.component_state
-        report = f"State of component: {state.component_id}="
-        report += ", ".join(str(e) for e in state.component_state)
-        logger.debug(report)
+        instance.global_state[state.component_id] = state.component_state
+        logger.debug(f"State of component: {state.component_id}={state.component_state}")
 
         # Compute the messages in transit
         for chnl, recv in state.received:
-            if chnl in self.sent_remaining:
+            if chnl in instance.sent_remaining:
                 self.report_and_save_channel_state(
-                    chnl, set(recv), set(self.sent_remaining[chnl]))
+                    instance, chnl, set(recv), set(instance.sent_remaining[chnl]))
             else:
-                self.recv_remaining[chnl] = recv
+                instance.recv_remaining[chnl] = recv
 
         for chnl, sent in state.sent:
-            if chnl in self.recv_remaining:
+            if chnl in instance.recv_remaining:
                 self.report_and_save_channel_state(
-                    chnl, set(self.recv_remaining[chnl]), set(sent))
+                    instance, chnl, set(instance.recv_remaining[chnl]), set(sent))
             else:
-                self.sent_remaining[chnl] = sent
+                instance.sent_remaining[chnl] = sent
 
     def msg_recv(self, event: Event):
         content = event.eventcontent
@@ -91,12 +104,14 @@ class LaiYangComponentModel(SnapshotComponentModel):
                             "{self.unique_name()}")
 
         # Unpack the event content and modify the event with the actual content
-        act_cntnt, post_snapshot = content
+        act_cntnt, post_snapshot_ids = content
         event.eventcontent = act_cntnt
 
         # We are white and the message is post-snapshot
-        if self.state is None and post_snapshot:
-            self.handle_snapshot()
+        for snapshot_id in post_snapshot_ids:
+            instance = self.snapshot(snapshot_id)
+            if instance is not None and instance.state is None:
+                self.handle_snapshot(instance)
 
         from_chnl = self.channel_of(event)
         self.chnl_recv[from_chnl].append(event)
@@ -110,6 +125,156 @@ class LaiYangComponentModel(SnapshotComponentModel):
         self.gsu_recv(act_cntnt.payload)
         return event
 
-    def reset_state(self):
-        super().reset_state()
-        self.global_state.clear()
\ No newline at end of file
+
+class LaiYangCounterState:
+    """
+    LaiYangCounterState keeps the local state of a component for the counting variant of Lai-Yang: its LocalState, the
+    number of messages it sent on each channel before the snapshot and the number of messages it received on each
+    channel from each sender before the snapshot.
+    """
+
+    def __init__(self, comp_id, comp_state, sent_counts, received_counts, snapshot_id=None):
+        self.component_id = comp_id
+        self.component_state = comp_state
+        self.sent_counts = sent_counts
+        self.received_counts = received_counts
+        self.snapshot_id = snapshot_id
+
+
+class LaiYangChannelStates:
+    """
+    Messages in transit at the snapshot on every incoming channel of a receiver, by (channel, sender), reported by the
+    receiver once it has received all of them.
+    """
+
+    def __init__(self, receiver_id, chnl_states, snapshot_id=None):
+        self.component_id = (receiver_id, "channels")  # Unique, GLOBALSNAPSHOT messages are redirected once
+        self.receiver_id = receiver_id
+        self.chnl_states = chnl_states
+        self.snapshot_id = snapshot_id
+
+
+class LaiYangCounterInstance(SnapshotInstance):
+    """
+    State of a component for one snapshot of the counting variant of Lai-Yang.
+    """
+
+    def __init__(self, snapshot_id):
+        super().__init__(snapshot_id)
+        self.white_received = None  # for each (channel, sender), number of white messages received, once recorded
+        self.expected_received = dict()  # for each (channel, sender), number of white messages the sender sent
+        self.in_transit = defaultdict(list)  # for each (channel, sender), white messages received after the snapshot
+        self.completed_chnls = set()  # (channel, sender) whose white messages are all received
+        self.chnl_states_reported = False
+        self.global_state = dict()
+        self.chnl_states = dict()
+
+
+class CountingLaiYangComponentModel(SnapshotComponentModel):
+    """
+    Variant of Lai-Yang counting messages as in the algorithm of Mattern, instead of recording the history of every
+    channel. Messages carry the ids of the snapshots their sender recorded, they are white for the other snapshots and
+    red for these, as in Lai-Yang. A component counts the messages it sent on each channel and received on each channel
+    from each sender, the counters at its snapshot are the numbers of white messages, and buffers the white messages it
+    receives after its own snapshot, which are exactly the messages in transit at the snapshot. The channel from a
+    sender is complete when the receiver has received as many white messages as the sender sent, which it learns from
+    the state of the sender. Once every incoming channel is complete, the receiver reports the buffered messages of all
+    of them in a single LaiYangChannelStates, so the memory of a component does not grow with the traffic and collecting
+    the states costs one flooding per component, not one per channel. Channels are point-to-point, as in the topologies
+    of Topology, i.e. a component has a single sender on each of its channels.
+    """
+    snapshot_instance_type = LaiYangCounterInstance
+
+    def __init__(self, componentname, componentinstancenumber, context=None, configurationparameters=None, num_worker_threads=1, topology=None):
+        super().__init__(componentname, componentinstancenumber, context, configurationparameters, num_worker_threads, topology)
+        self.sent_counts = Counter()  # for each channel, number of messages sent
+        self.received_counts = Counter()  # for each (channel, sender), number of messages received
+
+    def send_msg(self, event: Event):
+        event.eventcontent = (event.eventcontent, self.recorded_snapshot_ids())
+        for c in self.chnls:
+            self.sent_counts[c] += 1
+
+        self.send_down(event)
+
+    def handle_snapshot(self, instance):
+        # Take a snapshot
+        instance.state = LaiYangCounterState(self.componentinstancenumber, self.record_local_state(),
+                                             dict(self.sent_counts), dict(self.received_counts), instance.snapshot_id)
+        instance.white_received = Counter(self.received_counts)
+        self.gsu_recv(instance.state)
+
+    def on_take_snapshot(self, instance):
+        self.handle_snapshot(instance)
+
+        # Broadcast a dummy message so that other components record
+        # and broadcast their snapshots
+        self.send_msg(Event(self, EventTypes.MFRT, "dummy"))
+
+    def report_completed_chnl(self, instance, key):
+        """
+        Marks the channel from a sender as complete once every white message of the sender is received, and reports the
+        states of the incoming channels once they are all complete.
+        """
+        if instance.state is None or key in instance.completed_chnls or key not in instance.expected_received:
+            return
+        if instance.white_received[key] < instance.expected_received[key]:
+            return
+        instance.completed_chnls.add(key)
+        if instance.chnl_states_reported or not self.chnls.issubset(chnl for chnl, _ in instance.completed_chnls):
+            return
+        instance.chnl_states_reported = True
+        chnl_states = {key: instance.in_transit.pop(key, []) for key in instance.completed_chnls}
+        self.gsu_recv(LaiYangChannelStates(self.componentinstancenumber, chnl_states, instance.snapshot_id))
+
+    def on_gsu_recv(self, instance, state):
+        if isinstance(state, LaiYangCounterState) and state.component_id != self.componentinstancenumber:
+            # Channels shared with the sender tell how many white messages to wait for
+            for chnl, count in state.sent_counts.items():
+                if chnl in self.chnls:
+                    instance.expected_received[(chnl, state.component_id)] = count
+                    self.report_completed_chnl(instance, (chnl, state.component_id))
+
+        if not instance.init_snapshot:
+            return
+        if isinstance(state, LaiYangCounterState):
+            instance.global_state[state.component_id] = state.component_state
+            logger.debug(f"State of component: {state.component_id}={state.component_state}")
+        elif isinstance(state, LaiYangChannelStates):
+            instance.chnl_states.update(state.chnl_states)
+            for (chnl, sender_id), events in state.chnl_states.items():
+                logger.debug(f"State of channel: {chnl} from {sender_id}=" + ", ".join(str(e) for e in events))
+
+    def msg_recv(self, event: Event):
+        content = event.eventcontent
+        if type(content) is not tuple or len(content) != 2:
+            raise Exception("Malformed message received by: "
+                            f"{self.componentname}-{self.componentinstancenumber}")
+
+        # Unpack the event content and modify the event with the actual content
+        act_cntnt, post_snapshot_ids = content
+        event.eventcontent = act_cntnt
+
+        # We are white and the message is post-snapshot
+        for snapshot_id in post_snapshot_ids:
+            instance = self.snapshot(snapshot_id)
+            if instance is not None and instance.state is None:
+                self.handle_snapshot(instance)
+
+        key = (self.channel_of(event), event.eventsource_componentinstancenumber)
+        for instance in list(self.snapshots.values()):
+            if instance.state is not None and instance.snapshot_id not in post_snapshot_ids:
+                # Sent before the snapshot of the sender and received after ours, so in transit
+                instance.white_received[key] += 1
+                instance.in_transit[key].append(event)
+                self.report_completed_chnl(instance, key)
+        self.received_counts[key] += 1
+
+        # If not a GLOBALSNAPSHOT message return the modified event
+        if type(act_cntnt) != GenericMessage or\
+           type(header := act_cntnt.header) != GenericMessageHeader or\
+               header.messagetype != SnapshotMessageTypes.GLOBALSNAPSHOT:
+            return event
+
+        self.gsu_recv(act_cntnt.payload)
+        return event
@@ -6,10 +6,20 @@ This module implemenTAKESNAPSHOT Chandy Lamport and Lai Yang algorithms.
 
 
 from enum import Enum
+from itertools import islice
 from adhoccomputing.Experimentation.Topology import Topology
 from adhoccomputing.GenericModel import GenericModel, GenericMessageHeader, GenericMessagePayload, GenericMessage
 from adhoccomputing.Generics import *
-from collections import defaultdict
+from collections import defaultdict, deque, Counter, OrderedDict
+
+# Number of the last received events that a component retains, older events are only counted in the event summary
+RECORDED_EVENTS_LIMIT = 1024
+# Number of snapshots whose state a component keeps, the oldest is dropped beyond it, so it must exceed the number of
+# snapshots in progress at the same time. Messages of a dropped snapshot are ignored
+SNAPSHOT_INSTANCES_LIMIT = 64
+# Number of the last dropped snapshots whose ids a component remembers, a message of a snapshot dropped before them
+# starts the snapshot again
+DROPPED_SNAPSHOT_IDS_LIMIT = 4096
 
 class SnapshotEventTypes(Enum):
     """ 
@@ -21,22 +31,126 @@ class SnapshotMessageTypes(Enum):
     GLOBALSNAPSHOT = "GLOBALSNAPSHOT"
 
 
+class SnapshotCollectionModes(Enum):
+    """
+    How the local states are collected. With FLOODING, every component redirects every local state to its neighbors,
+    which costs O(N x E) messages. With SPANNING_TREE, the local states are merged up the spanning tree built by the
+    propagation of the snapshot and the initiator receives one global state, which costs N - 1 messages.
+    """
+    FLOODING = "FLOODING"
+    SPANNING_TREE = "SPANNING_TREE"
+
+
+class LocalState:
+    """
+    Local state of a component recorded incrementally: the events received since the previous local snapshot of the
+    component, called checkpoint, and the number of events received so far by event type. The events of a component
+    are the concatenation of the events of its consecutive checkpoints, except the dropped ones.
+
+    Checkpoints are numbered per component, not per snapshot: with concurrent snapshots, the local state of a snapshot
+    holds only the events since the local state the component recorded for any other snapshot. The events of a
+    component up to a snapshot are then rebuilt by chaining its local states of every snapshot id in checkpoint order.
+    """
+
+    def __init__(self, component_id, checkpoint, events, dropped_event_count, event_summary):
+        """
+        :param checkpoint: Sequence number of the local snapshot, starting from 0.
+        :param events: Events received since the previous checkpoint, at most the retained ones.
+        :param dropped_event_count: Number of events received since the previous checkpoint that were not retained.
+        :param event_summary: Number of events received since the start by event type.
+        """
+        self.component_id = component_id
+        self.checkpoint = checkpoint
+        self.events = events
+        self.dropped_event_count = dropped_event_count
+        self.event_summary = event_summary
+
+    def event_count(self):
+        return sum(self.event_summary.values())
+
+    def __str__(self):
+        events = ", ".join(str(e) for e in self.events)
+        return f"LocalState(component={self.component_id}, checkpoint={self.checkpoint}, " \
+               f"dropped={self.dropped_event_count}, summary={self.event_summary}, events=[{events}])"
+
+
+class GlobalSnapshot:
+    """
+    Local states of the components of a subtree of the spanning tree, sent on the channel to the parent of the subtree,
+    or the whole global state pushed down from the initiator.
+    """
+
+    def __init__(self, snapshot_id, chnl, states, down=False):
+        self.snapshot_id = snapshot_id
+        self.chnl = chnl
+        self.states = states  # Local state of each component by component id
+        self.down = down
+
+    def __str__(self):
+        return f"GlobalSnapshot(components={sorted(self.states, key=str)}, down={self.down})"
+
+
+class SnapshotInstance:
+    """
+    State of a component for one snapshot. Messages of the snapshot algorithms carry the id of their snapshot, so that
+    snapshots of different initiators, or consecutive snapshots of the same initiator, proceed independently.
+    Algorithms extend it with their own state.
+    """
+
+    def __init__(self, snapshot_id):
+        self.snapshot_id = snapshot_id
+        self.state = None  # Local state, once recorded
+        self.init_snapshot = False  # Whether the component initiated the snapshot
+        self.gsu_redirected_comps = set()
+        self.tree_parent = None  # Channel to the parent in the spanning tree, None at the initiator
+        self.tree_children = set()  # Channels to the children in the spanning tree
+        self.tree_states = dict()  # Local states of the subtree collected so far by component id
+        self.tree_reported_chnls = set()  # Children that sent the states of their subtree
+        self.tree_local_state = None  # Local state, once it is complete
+        self.global_snapshot = None
+
+
 class SnapshotComponentModel(GenericModel):
     """
     A generic snapshot component model to implement various snapshot algorithms.
 
     Extend SnapshotComponentModel to implement your own snapshot algorithm.
+
+    Received events are kept in a ring buffer of recorded_events_limit events, so that the memory of a component does
+    not grow with its history, and its local state is recorded as the events since its previous local snapshot, see
+    record_local_state.
+
+    The state of each snapshot is a snapshot_instance_type kept in snapshots by snapshot id. A TAKESNAPSHOT event starts
+    a snapshot with the id in its content, or a new id unique to the initiator if there is none.
+
+    With the SPANNING_TREE collection mode, the algorithm calls join_tree when the snapshot reaches the component,
+    add_tree_child for the neighbors that joined the tree through it and tree_local_state_done once its local state is
+    complete and its children are known. The global state is then available as the global_snapshot of the snapshot at
+    the initiator, and at every component if push_global_snapshot is set.
     """
+    recorded_events_limit = RECORDED_EVENTS_LIMIT
+    collection_mode = SnapshotCollectionModes.FLOODING
+    push_global_snapshot = False
+    snapshot_instance_type = SnapshotInstance
+    snapshot_instances_limit = SNAPSHOT_INSTANCES_LIMIT
+    dropped_snapshot_ids_limit = DROPPED_SNAPSHOT_IDS_LIMIT
+
     def __init__(self, componentname, componentinstancenumber, context=None, configurationparameters=None, num_worker_threads=1, topology=None):
         """
         Initializes the SnapshotComponentModel
         """
         super().__init__(componentname, componentinstancenumber, context, configurationparameters, num_worker_threads, topology)
-        self.state = None
-        self.gsu_redirected_comps = set()
-        self.recv_events = []
+        self.snapshots = OrderedDict()  # snapshot_instance_type by snapshot id, oldest first
+        # Ids of the last snapshots dropped beyond snapshot_instances_limit, as a set and oldest first
+        self.dropped_snapshot_ids = set()
+        self.dropped_snapshot_id_order = deque()
+        self.snapshot_sequence = 0
+        self.recv_events = deque(maxlen=self.recorded_events_limit)
+        self.event_summary = Counter()  # Number of received events by event type
+        self.received_event_count = 0
+        self.checkpoint_event_count = 0  # received_event_count at the previous local snapshot
+        self.checkpoint = 0
         self.chnls = set()
-        self.init_snapshot = False
         self.eventhandlers[SnapshotEventTypes.TAKESNAPSHOT] = self.take_snapshot
 
     def on_connected_to_component(self, name, channel):
@@ -46,6 +160,12 @@ class SnapshotComponentModel(GenericModel):
         super().on_connected_to_component(name, channel)
         self.chnls.add(channel.componentinstancenumber)
 
+    def connect_me_to_component(self, name, component):
+        # Topology connects the components to their channels without calling on_connected_to_component
+        super().connect_me_to_component(name, component)
+        if name == ConnectorTypes.DOWN:
+            self.on_connected_to_component(name, component)
+
     def channel_of(self, eventobj: Event):
         from_chnl = eventobj.fromchannel
         if from_chnl is None:
@@ -55,10 +175,55 @@ class SnapshotComponentModel(GenericModel):
 
     def on_pre_event(self, event):
         """
-        PreEvent Handler
+        PreEvent Handler, records the event
+        """
+        self.recv_events.append(event)
+        self.event_summary[str(event.event)] += 1
+        self.received_event_count += 1
+
+    def record_local_state(self):
+        """
+        Records the local state as a checkpoint. It costs the number of events received since the previous checkpoint
+        and the number of event types, not the whole history. The previous checkpoint may belong to another snapshot,
+        see LocalState.
         """
-        return self.recv_events.append(event)
+        new_event_count = self.received_event_count - self.checkpoint_event_count
+        retained_event_count = min(new_event_count, len(self.recv_events))
+        events = list(islice(reversed(self.recv_events), retained_event_count))
+        events.reverse()
+        local_state = LocalState(self.componentinstancenumber, self.checkpoint, events,
+                                 new_event_count - retained_event_count, dict(self.event_summary))
+        self.checkpoint_event_count = self.received_event_count
+        self.checkpoint += 1
+        return local_state
 
+    def snapshot(self, snapshot_id):
+        """
+        :return: The state of the component for the snapshot, created when the snapshot reaches the component, or None if
+        the snapshot is dropped. The oldest snapshot is dropped beyond snapshot_instances_limit snapshots, its id is
+        remembered so that a late message of the snapshot does not start it again, among the last
+        dropped_snapshot_ids_limit ones.
+        """
+        instance = self.snapshots.get(snapshot_id)
+        if instance is None:
+            if snapshot_id in self.dropped_snapshot_ids:
+                return None
+            instance = self.snapshot_instance_type(snapshot_id)
+            self.snapshots[snapshot_id] = instance
+            if len(self.snapshots) > self.snapshot_instances_limit:
+                dropped_snapshot_id, _ = self.snapshots.popitem(last=False)
+                self.dropped_snapshot_ids.add(dropped_snapshot_id)
+                self.dropped_snapshot_id_order.append(dropped_snapshot_id)
+                if len(self.dropped_snapshot_id_order) > self.dropped_snapshot_ids_limit:
+                    self.dropped_snapshot_ids.discard(self.dropped_snapshot_id_order.popleft())
+        return instance
+
+    def latest_snapshot(self):
+        return next(reversed(self.snapshots.values()), None)
+
+    def recorded_snapshot_ids(self):
+        """Ids of the snapshots whose local state is recorded, messages sent now are after these snapshots"""
+        return frozenset(snapshot_id for snapshot_id, instance in self.snapshots.items() if instance.state is not None)
 
     def send_msg(self, event: Event):
         """Generic send message function"""
@@ -68,31 +233,103 @@ class SnapshotComponentModel(GenericModel):
         """Generic message received function"""
         pass
 
+    def send_msg_on_chnl(self, event: Event, chnl):
+        """Sends the message on a single channel, send_msg sends it on all channels"""
+        for c in self.connectors[ConnectorTypes.DOWN]:
+            if c.componentinstancenumber == chnl:
+                c.trigger_event(event)
+
     def send_gsu(self, local_state):
         """Send GLOBALSNAPSHOT message """
-        gsu_msg = GenericMessage(
-            GenericMessageHeader(SnapshotMessageTypes.GLOBALSNAPSHOT, None, None),
-            local_state)
-        self.send_msg(Event(self, EventTypes.MFRT, gsu_msg))
+        self.send_msg(self.create_gsu_event(local_state))
 
     def gsu_recv(self, state):
+        instance = self.snapshot(state.snapshot_id)
+        if instance is None:
+            return
+        if isinstance(state, GlobalSnapshot):
+            return self.tree_gsu_recv(instance, state)
+
         # Redirect the GLOBALSNAPSHOT if we are not the source component of the snapshot
-        if state.component_id not in self.gsu_redirected_comps:
-            self.gsu_redirected_comps.add(state.component_id)
+        if state.component_id not in instance.gsu_redirected_comps:
+            instance.gsu_redirected_comps.add(state.component_id)
             self.send_gsu(state)
 
-        self.on_gsu_recv(state)
+        self.on_gsu_recv(instance, state)
+
+    def on_gsu_recv(self, instance, state):
+        pass
+
+    def join_tree(self, instance, parent_chnl):
+        instance.tree_parent = parent_chnl
+
+    def add_tree_child(self, instance, chnl):
+        instance.tree_children.add(chnl)
+
+    def tree_local_state_done(self, instance, local_state):
+        instance.tree_local_state = local_state
+        instance.tree_states[local_state.component_id] = local_state
+        self.send_tree_states(instance)
+
+    def tree_gsu_recv(self, instance, global_snapshot: GlobalSnapshot):
+        if global_snapshot.down:
+            self.deliver_global_snapshot(instance, global_snapshot.states)
+            return
+        # States of the subtree of a child, merged with ours
+        instance.tree_states.update(global_snapshot.states)
+        instance.tree_reported_chnls.add(global_snapshot.chnl)
+        self.send_tree_states(instance)
 
-    def on_gsu_recv(self, state):
+    def send_tree_states(self, instance):
+        """
+        Sends the states of the subtree to the parent once the local state is complete and every child reported, the
+        initiator has the global state then.
+        """
+        if instance.tree_local_state is None or not instance.tree_children.issubset(instance.tree_reported_chnls):
+            return
+        if instance.tree_parent is not None:
+            global_snapshot = GlobalSnapshot(instance.snapshot_id, instance.tree_parent, instance.tree_states)
+            self.send_msg_on_chnl(self.create_gsu_event(global_snapshot), instance.tree_parent)
+        else:
+            self.deliver_global_snapshot(instance, instance.tree_states)
+        instance.tree_local_state = None
+
+    def deliver_global_snapshot(self, instance, states):
+        instance.global_snapshot = states
+        if instance.init_snapshot:
+            for state in states.values():
+                self.on_gsu_recv(instance, state)
+            self.on_global_snapshot(instance.snapshot_id, states)
+        if self.push_global_snapshot:
+            for chnl in instance.tree_children:
+                global_snapshot = GlobalSnapshot(instance.snapshot_id, chnl, states, down=True)
+                self.send_msg_on_chnl(self.create_gsu_event(global_snapshot), chnl)
+
+    def on_global_snapshot(self, snapshot_id, states):
+        """Called at the initiator with the local state of each component by component id, in SPANNING_TREE mode"""
         pass
 
-    def on_take_snapshot(self):
+    def create_gsu_event(self, payload):
+        gsu_msg = GenericMessage(
+            GenericMessageHeader(SnapshotMessageTypes.GLOBALSNAPSHOT, None, None),
+            payload)
+        return Event(self, EventTypes.MFRT, gsu_msg)
+
+    def on_take_snapshot(self, instance):
         """Generic report snapshot"""
         pass
 
     def take_snapshot(self, eventobj: Event):
-        self.init_snapshot = True
-        self.on_take_snapshot()
+        snapshot_id = eventobj.eventcontent
+        if snapshot_id is None:
+            snapshot_id = (self.componentinstancenumber, self.snapshot_sequence)
+            self.snapshot_sequence += 1
+        instance = self.snapshot(snapshot_id)
+        if instance is None:
+            logger.error(f"Snapshot {snapshot_id} is dropped, it cannot be taken again")
+            return
+        instance.init_snapshot = True
+        self.on_take_snapshot(instance)
 
     # When overridden call this function with 'super'
     def on_message_from_bottom(self, eventobj: Event):
@@ -106,6 +343,9 @@ class SnapshotComponentModel(GenericModel):
     def on_message_from_top(self, eventobj: Event):
         return self.msg_recv(eventobj)
 
-    def reset_state(self):
-        self.state = None
-        self.gsu_redirected_comps.clear()
+    def reset_state(self, snapshot_id=None):
+        """Drops the state of the snapshot, or of every snapshot if snapshot_id is None"""
+        if snapshot_id is None:
+            self.snapshots.clear()
+        else:
+            self.snapshots.pop(snapshot_id, None)
@@ -0,0 +1,359 @@
+"""
+Benchmark of the snapshot algorithms on large generated topologies. Each run builds a ring, grid, random or full-mesh
+topology of components connected by channels, sends background traffic from every component, takes a snapshot from one
+component and reports as JSON:
+
+* completion_time: seconds from the start of the snapshot until the initiator has the state of every component, and of
+  every channel for Lai-Yang.
+* control_messages, collection_messages and application_messages: messages sent on channels during the snapshot, i.e.
+  markers (and the message broadcast by the Lai-Yang initiator), messages collecting the local states and background
+  traffic, together with the snapshot ids piggybacked on application messages by Lai-Yang.
+* recorded_state_bytes and recorded_events: size of the global state at the initiator, serialized without the
+  components referenced by its events, and number of events recorded in it.
+* peak_rss_bytes: peak resident memory of the process of the run, every run gets a fresh process.
+* queued_events: events waiting in the queues of the components and channels when the snapshot starts, which grows with
+  the duration of the warm-up if the background traffic is more than the process can handle.
+
+The algorithms are Chandy-Lamport collecting the local states by flooding or over the spanning tree of the markers, and
+the counting variant of Lai-Yang, whose channel states stay bounded. Runs the topologies with, for example::
+
+    python -m Snapshot.benchmark --topologies ring grid random --components 64 256 --output snapshots.json
+    python -m Snapshot.benchmark --topologies full_mesh --components 32 --algorithms lai_yang
+
+Every component is a few threads, a full mesh of n components has n (n - 1) / 2 channels, so keep full meshes small.
+"""
+import argparse
+import io
+import itertools
+import json
+import multiprocessing
+import pickle
+import resource
+import sys
+import threading
+import time
+from enum import Enum
+
+import networkx as nx
+from adhoccomputing.Experimentation.Topology import Topology
+from adhoccomputing.GenericModel import GenericModel, GenericMessage, GenericMessageHeader
+from adhoccomputing.Generics import *
+from adhoccomputing.Networking.LogicalChannels.GenericChannel import GenericChannel
+
+from Snapshot.ChandyLamportSnapshot import ChandyLamportComponentModel, ChandyLamportMessageTypes
+from Snapshot.LaiYangSnapshot import CountingLaiYangComponentModel
+from Snapshot.Snapshot import SnapshotEventTypes, SnapshotMessageTypes, SnapshotCollectionModes
+
+TOPOLOGIES = ("ring", "grid", "random", "full_mesh")
+RANDOM_TOPOLOGY_DEGREE = 4  # Average degree of the random topologies
+# Interval between two application messages of a component. The threads of all components share a single interpreter,
+# traffic they cannot keep up with makes queues grow and completion times measure the queueing, see queued_events.
+TRAFFIC_INTERVAL_IN_MS = 500
+WARMUP_IN_SECS = 1.0  # Background traffic runs for this long before the snapshot starts
+SNAPSHOT_TIMEOUT_IN_SECS = 60
+INITIATOR = 0
+SNAPSHOT_ID = "benchmark"
+
+
+class BenchmarkEventTypes(Enum):
+    TICK = "TICK"  # Makes a component send an application message
+
+
+class MessageKinds(Enum):
+    CONTROL = "control"
+    COLLECTION = "collection"
+    APPLICATION = "application"
+
+
+def message_kind(content):
+    if type(content) == GenericMessage and type(header := content.header) == GenericMessageHeader:
+        if header.messagetype == ChandyLamportMessageTypes.MARKER:
+            return MessageKinds.CONTROL
+        if header.messagetype == SnapshotMessageTypes.GLOBALSNAPSHOT:
+            return MessageKinds.COLLECTION
+    if content == "dummy":
+        return MessageKinds.CONTROL
+    return MessageKinds.APPLICATION
+
+
+class BenchmarkStatistics:
+    """
+    Messages sent by the components of a run and completion of its snapshot, collected in class attributes since every
+    run has its own process.
+    """
+    lock = threading.Lock()
+    sent_messages = {kind: 0 for kind in MessageKinds}
+    piggybacked_snapshot_ids = 0
+    expected_states = 0
+    expected_channel_states = 0
+    start_time = None
+    completion_time = None
+    completed = threading.Event()
+
+    @classmethod
+    def count_sent(cls, kind, channel_count, piggybacked_snapshot_ids=0):
+        with cls.lock:
+            cls.sent_messages[kind] += channel_count
+            cls.piggybacked_snapshot_ids += piggybacked_snapshot_ids * channel_count
+
+    @classmethod
+    def counters(cls):
+        with cls.lock:
+            counters = {f'{kind.value}_messages': count for kind, count in cls.sent_messages.items()}
+            counters['piggybacked_snapshot_ids'] = cls.piggybacked_snapshot_ids
+            return counters
+
+    @classmethod
+    def check_completion(cls, state_count, channel_state_count):
+        if cls.completed.is_set() or state_count < cls.expected_states or \
+                channel_state_count < cls.expected_channel_states:
+            return
+        cls.completion_time = time.time() - cls.start_time
+        cls.completed.set()
+
+
+class BenchmarkComponent:
+    """
+    Sends an application message on every channel at each tick and counts the messages it sends by kind. The initiator
+    reports the completion of the snapshot once it has every local state, and every channel state if the algorithm
+    reports them separately, i.e. if reports_channel_states is set.
+    """
+    reports_channel_states = False
+
+    def __init__(self, componentname, componentinstancenumber, context=None, configurationparameters=None, num_worker_threads=1, topology=None):
+        super().__init__(componentname, componentinstancenumber, context, configurationparameters, num_worker_threads, topology)
+        self.application_sent = 0
+        self.eventhandlers[BenchmarkEventTypes.TICK] = self.on_tick
+
+    def on_tick(self, eventobj: Event):
+        self.application_sent += 1
+        self.send_msg(Event(self, EventTypes.MFRT, ("application", self.componentinstancenumber, self.application_sent)))
+
+    def send_msg(self, event: Event):
+        kind = message_kind(event.eventcontent)
+        piggybacked_snapshot_ids = 0
+        if kind == MessageKinds.APPLICATION and isinstance(self, CountingLaiYangComponentModel):
+            piggybacked_snapshot_ids = len(self.recorded_snapshot_ids())
+        BenchmarkStatistics.count_sent(kind, len(self.chnls), piggybacked_snapshot_ids)
+        super().send_msg(event)
+
+    def send_msg_on_chnl(self, event: Event, chnl):
+        BenchmarkStatistics.count_sent(message_kind(event.eventcontent), 1)
+        super().send_msg_on_chnl(event, chnl)
+
+    def on_gsu_recv(self, instance, state):
+        super().on_gsu_recv(instance, state)
+        if instance.init_snapshot:
+            BenchmarkStatistics.check_completion(len(instance.global_state),
+                                                 len(getattr(instance, 'chnl_states', {})))
+
+
+class ChandyLamportBenchmarkComponent(BenchmarkComponent, ChandyLamportComponentModel):
+    pass
+
+
+class TreeChandyLamportBenchmarkComponent(BenchmarkComponent, ChandyLamportComponentModel):
+    collection_mode = SnapshotCollectionModes.SPANNING_TREE
+
+
+class LaiYangBenchmarkComponent(BenchmarkComponent, CountingLaiYangComponentModel):
+    reports_channel_states = True  # once from each end of every channel
+
+
+ALGORITHMS = {
+    'chandy_lamport': ChandyLamportBenchmarkComponent,
+    'chandy_lamport_tree': TreeChandyLamportBenchmarkComponent,
+    'lai_yang': LaiYangBenchmarkComponent
+}
+
+
+def create_graph(topology, number_of_components, seed=None):
+    """
+    :param topology: One of TOPOLOGIES. A grid is the largest square grid with at most number_of_components components,
+    a random topology is a connected random graph of average degree RANDOM_TOPOLOGY_DEGREE.
+    :return: networkx graph of the components, numbered from 0.
+    """
+    if topology == "ring":
+        return nx.cycle_graph(number_of_components)
+    if topology == "grid":
+        side = max(int(number_of_components ** 0.5), 1)
+        return nx.convert_node_labels_to_integers(nx.grid_2d_graph(side, side))
+    if topology == "random":
+        return nx.connected_watts_strogatz_graph(number_of_components, RANDOM_TOPOLOGY_DEGREE, 1.0, seed=seed)
+    if topology == "full_mesh":
+        return nx.complete_graph(number_of_components)
+    raise ValueError(f"Unknown topology {topology}, expected one of {TOPOLOGIES}")
+
+
+class RecordedStatePickler(pickle.Pickler):
+    """
+    Serializes recorded states, the components referenced by their events are serialized as references.
+    """
+
+    def persistent_id(self, obj):
+        if isinstance(obj, GenericModel):
+            return f"{obj.componentname}-{obj.componentinstancenumber}"
+        return None
+
+
+def recorded_state_size(states):
+    output = io.BytesIO()
+    RecordedStatePickler(output, protocol=pickle.HIGHEST_PROTOCOL).dump(states)
+    return output.tell()
+
+
+def recorded_event_count(instance):
+    event_count = 0
+    for state in instance.global_state.values():
+        local_state = getattr(state, 'component_state', state)
+        event_count += len(local_state.events)
+        event_count += sum(len(events) for events in getattr(state, 'chnl_states', {}).values())
+    event_count += sum(len(events) for events in getattr(instance, 'chnl_states', {}).values())
+    return event_count
+
+
+def send_traffic(components, interval, stopped):
+    """
+    Makes every component send an application message every interval seconds until stopped is set.
+    """
+    while not stopped.is_set():
+        start_time = time.time()
+        for component in components:
+            component.trigger_event(Event(None, BenchmarkEventTypes.TICK, None))
+        stopped.wait(max(interval - (time.time() - start_time), 0))
+
+
+def stop_components(topology):
+    """
+    Stops the components and channels right after the event they are handling, instead of after the events waiting in
+    their queues, and waits for them. Components go on collecting states after the completion, e.g. redirecting them
+    by flooding, so the recorded states are measured once they are stopped.
+    """
+    components = list(topology.nodes.values()) + list(topology.channels.values())
+    for component in components:
+        component.terminated = True
+    topology.exit()
+    for component in components:
+        for worker in component.t:
+            worker.join()
+
+
+def run_snapshot_benchmark(configuration):
+    """
+    Runs a single snapshot, in a process of its own since the statistics are collected in class attributes and the
+    threads of the components outlive the run.
+    :param configuration: Dictionary of the algorithm (a key of ALGORITHMS), topology, number_of_components and optionally
+    traffic_interval_in_ms, seed and timeout_in_secs.
+    :return: Dictionary of the configuration together with the number of components and channels, whether the snapshot
+    completed in time and the results described in the module documentation.
+    """
+    component_class = ALGORITHMS[configuration['algorithm']]
+    graph = create_graph(configuration['topology'], configuration['number_of_components'], configuration.get('seed'))
+    topology = Topology()
+    topology.construct_from_graph(graph, component_class, GenericChannel)
+    components = list(topology.nodes.values())
+    BenchmarkStatistics.expected_states = len(components)
+    if component_class.reports_channel_states:
+        BenchmarkStatistics.expected_channel_states = 2 * graph.number_of_edges()
+    topology.start()
+    stopped = threading.Event()
+    traffic_thread = threading.Thread(target=send_traffic, daemon=True,
+                                      args=(components, configuration.get('traffic_interval_in_ms',
+                                                                          TRAFFIC_INTERVAL_IN_MS) / 1000.0, stopped))
+    traffic_thread.start()
+    time.sleep(WARMUP_IN_SECS)
+
+    counters_at_start = BenchmarkStatistics.counters()
+    queued_events = sum(component.inputqueue.qsize()
+                        for component in list(topology.nodes.values()) + list(topology.channels.values()))
+    initiator = topology.nodes[INITIATOR]
+    BenchmarkStatistics.start_time = time.time()
+    initiator.trigger_event(Event(None, SnapshotEventTypes.TAKESNAPSHOT, SNAPSHOT_ID))
+    completed = BenchmarkStatistics.completed.wait(configuration.get('timeout_in_secs', SNAPSHOT_TIMEOUT_IN_SECS))
+    counters_at_end = BenchmarkStatistics.counters()
+    stopped.set()
+    traffic_thread.join()
+    # Linux reports the peak resident memory in kilobytes
+    peak_rss_bytes = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+    stop_components(topology)
+
+    result = dict(configuration)
+    result['number_of_components'] = len(components)
+    result['number_of_channels'] = graph.number_of_edges()
+    result['completed'] = completed
+    result['completion_time'] = BenchmarkStatistics.completion_time
+    result['queued_events'] = queued_events
+    for name, count in counters_at_end.items():
+        result[name] = count - counters_at_start[name]
+    instance = initiator.snapshots[SNAPSHOT_ID]
+    states = (instance.global_state, getattr(instance, 'chnl_states', None))
+    result['recorded_state_bytes'] = recorded_state_size(states)
+    result['recorded_events'] = recorded_event_count(instance)
+    result['peak_rss_bytes'] = peak_rss_bytes
+    return result
+
+
+def run_in_worker(configuration):
+    setAHCLogLevel(CRITICAL)
+    return run_snapshot_benchmark(configuration)
+
+
+def run_benchmarks(configurations, processes=1):
+    """
+    Runs each configuration in a fresh process of a pool.
+    :param processes: Number of runs at the same time, more than one makes the runs compete for the cores.
+    :return: List of the results, in the order of the configurations.
+    """
+    results = []
+    with multiprocessing.Pool(processes, maxtasksperchild=1) as pool:
+        for run_number, result in enumerate(pool.imap(run_in_worker, configurations)):
+            logger.critical(f"Snapshot run {run_number + 1}/{len(configurations)} finished: "
+                            f"{result['algorithm']} on {result['topology']} of {result['number_of_components']} "
+                            f"components, completion_time={result['completion_time']}")
+            results.append(result)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmarks the snapshot algorithms on generated topologies.")
+    parser.add_argument("--topologies", nargs="+", default=list(TOPOLOGIES), choices=TOPOLOGIES)
+    parser.add_argument("--components", nargs="+", type=int, default=[256],
+                        help="numbers of components, full meshes use at most --max-full-mesh-components")
+    parser.add_argument("--max-full-mesh-components", type=int, default=32)
+    parser.add_argument("--algorithms", nargs="+", default=list(ALGORITHMS), choices=list(ALGORITHMS))
+    parser.add_argument("--traffic-interval-in-ms", type=float, default=TRAFFIC_INTERVAL_IN_MS,
+                        help="interval between two application messages of a component")
+    parser.add_argument("--seed", type=int, default=1, help="seed of the random topologies")
+    parser.add_argument("--timeout-in-secs", type=float, default=SNAPSHOT_TIMEOUT_IN_SECS)
+    parser.add_argument("--processes", type=int, default=1, help="number of runs at the same time")
+    parser.add_argument("--output", help="JSON file of the results, written to the standard output if not given")
+    arguments = parser.parse_args()
+
+    configurations = []
+    for topology, number_of_components, algorithm in itertools.product(arguments.topologies, arguments.components,
+                                                                       arguments.algorithms):
+        if topology == "full_mesh":
+            number_of_components = min(number_of_components, arguments.max_full_mesh_components)
+        configuration = {
+            'algorithm': algorithm,
+            'topology': topology,
+            'number_of_components': number_of_components,
+            'traffic_interval_in_ms': arguments.traffic_interval_in_ms,
+            'seed': arguments.seed,
+            'timeout_in_secs': arguments.timeout_in_secs
+        }
+        if configuration not in configurations:
+            configurations.append(configuration)
+    setAHCLogLevel(CRITICAL)
+    results = run_benchmarks(configurations, arguments.processes)
+    if arguments.output is None:
+        json.dump(results, sys.stdout, indent=2)
+        print()
+    else:
+        with open(arguments.output, "w") as results_file:
+            json.dump(results, results_file, indent=2)
+        logger.critical(f"Wrote the results of {len(results)} runs to {arguments.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,76 @@
+"""
+Admission control of client commands at the proposer. Without it, the proposer appends every command it receives, so
+under overload the uncommitted tail of the log and the input queue of the proposer grow without limit and so does the
+latency of every command. The admission controller rejects commands with a busy response instead, which the client
+backs off from before sending the command again, so that the latency of admitted commands stays bounded.
+
+Two limits are checked, each one disabled if it is None:
+
+* The in-flight window, the number of entries appended to the log but not committed yet. It bounds the work the
+  followers are behind by, and the memory of the uncommitted log tail.
+* The queue time target, in the manner of CoDel. The queue time of a command is the time from its creation to the
+  start of its handling by the proposer. A queue time above the target is tolerated for a short interval, to absorb
+  bursts, commands are rejected once the queue time has stayed above the target for the whole interval and until it
+  drops below the target again.
+"""
+import random
+
+
+class AdmissionController:
+    """
+    Decides whether the proposer admits a client command.
+    """
+
+    def __init__(self, maxinflightentries=None, queuetimetarget=None, queuetimeinterval=0.1):
+        """
+        :param maxinflightentries: Maximum number of uncommitted entries in the log of the proposer.
+        :param queuetimetarget: Queue time in seconds above which commands are rejected after the interval.
+        :param queuetimeinterval: Time in seconds the queue time has to stay above the target before rejecting.
+        """
+        self.max_in_flight_entries = maxinflightentries
+        self.queue_time_target = queuetimetarget
+        self.queue_time_interval = queuetimeinterval
+        self.above_target_since = None  # Time the queue time went above the target, None if it is below
+        self.rejected_commands = 0
+
+    def is_enabled(self):
+        return self.max_in_flight_entries is not None or self.queue_time_target is not None
+
+    def admit(self, in_flight_entries, queue_time, now):
+        """
+        :param in_flight_entries: Number of entries appended to the log but not committed yet.
+        :param queue_time: Time in seconds the command waited before the proposer handles it.
+        :param now: Current time.
+        :return: None if the command is admitted, the reason of the rejection otherwise.
+        """
+        reason = None
+        if self.queue_time_target is not None:
+            if queue_time <= self.queue_time_target:
+                self.above_target_since = None
+            elif self.above_target_since is None:
+                self.above_target_since = now
+            elif now - self.above_target_since >= self.queue_time_interval:
+                reason = "queue_time"
+        if reason is None and self.max_in_flight_entries is not None and \
+                in_flight_entries >= self.max_in_flight_entries:
+            reason = "in_flight"
+        if reason is not None:
+            self.rejected_commands += 1
+        return reason
+
+    def reset(self):
+        """
+        Called when the node becomes the proposer, the queue time of the previous term is not relevant anymore.
+        """
+        self.above_target_since = None
+
+
+def busy_backoff(attempt, base, maximum):
+    """
+    Exponential backoff with full jitter, so that clients rejected at the same time do not come back at the same time.
+    :param attempt: Number of busy responses received in a row for the command, from 1.
+    :param base: Backoff in seconds after the first busy response.
+    :param maximum: Maximum backoff in seconds.
+    :return: Time in seconds to wait before sending the command again.
+    """
+    return random.uniform(0, min(maximum, base * 2 ** (attempt - 1)))
@@ -0,0 +1,476 @@
+"""
+Benchmarks of the Paxos implementation. Each benchmark builds a cluster of Paxos nodes with a client and a heartbeat
+node (but no sleep trigger), runs it for a fixed duration under different settings and reports the commit latency and
+throughput observed by the client.
+
+Run a benchmark with ``python -m paxos.benchmark <benchmark name>``.
+"""
+import multiprocessing
+import os
+import sys
+import tempfile
+import time
+
+from adhoccomputing.GenericModel import GenericModel
+from adhoccomputing.Generics import *
+
+from paxos.checkpoint import ClusterCheckpoint
+from paxos.client_node import ClientNode
+from paxos.faults import FaultScenario, FaultInjector
+from paxos.heartbeat_node import HeartbeatNode
+from paxos.network import NetworkTopology, NetworkEmulator
+from paxos.parameters import ExperimentParameters
+from paxos.paxos_node import PaxosNode
+from paxos.sharding import ShardedNode
+from paxos.statistics import Statistics, distribution_summary
+from paxos.profiling import Profiler
+from paxos.tracing import Tracer
+from paxos.utils import NUMBER_OF_PAXOS_NODES, NUMBER_OF_SHARD_KEYS, CHECKPOINT_TIMEOUT_IN_SECS, CommandTypes
+
+BENCHMARK_DURATION_IN_SECS = 10
+SLOW_NODE_DELAY_IN_MS = 30
+APPLY_DELAY_IN_MS = 0.5
+
+
+class SlowPaxosNode(PaxosNode):
+    """
+    A Paxos node that handles every proposal addressed to it after an artificial delay, to inject overloaded or
+    distant nodes into benchmarks, and applies every client command after another delay, to emulate a costly state
+    machine. The delays sleep, i.e. release the interpreter lock like the I/O or native code of a real state machine.
+    """
+
+    def __init__(self, componentname, componentinstancenumber, numberofnodes, timeout, processingdelay,
+                 applydelay=0.0, **kwargs):
+        super().__init__(componentname, componentinstancenumber, numberofnodes, timeout, **kwargs)
+        self.processing_delay = processingdelay
+        self.apply_delay = applydelay
+
+    def on_propose(self, eventobj: Event):
+        if self.processing_delay and eventobj.eventcontent.header.messageto == self.node_id and \
+                eventobj.eventcontent.payload['entries']:
+            time.sleep(self.processing_delay)
+        super().on_propose(eventobj)
+
+    def apply_command(self, command):
+        if self.apply_delay and command.type != CommandTypes.CONFIGURATION.value:
+            time.sleep(self.apply_delay)
+        super().apply_command(command)
+
+
+class BenchmarkNode(GenericModel):
+    """
+    Composite node of a benchmark. It is configured by the configurationparameters dictionary which may contain
+    number_of_nodes, phase_1_quorum_size, phase_2_quorum_size, thrifty, slow_node_count and slow_node_delay_in_ms,
+    and experiment parameters such as the admission control ones, which are passed on to the nodes. The first
+    slow_node_count nodes are slow, the last node starts as the leader.
+    """
+
+    def on_init(self, eventobj: Event):
+        pass
+
+    def __init__(self, componentname, componentinstancenumber, context=None, configurationparameters=None,
+                 num_worker_threads=1, topology=None):
+        super().__init__(componentname, componentinstancenumber, context, configurationparameters, num_worker_threads,
+                         topology)
+        parameters = configurationparameters or {}
+        experiment_parameters = ExperimentParameters.of_known(parameters)
+        self.number_of_nodes = parameters.get('number_of_nodes', NUMBER_OF_PAXOS_NODES)
+        slow_node_count = parameters.get('slow_node_count', 0)
+        slow_node_delay = parameters.get('slow_node_delay_in_ms', SLOW_NODE_DELAY_IN_MS) / 1000.0
+        timeout = experiment_parameters.timeout_in_ms / 1000.0
+
+        for i in range(self.number_of_nodes):
+            node_parameters = {
+                'timeoutjitter': experiment_parameters.election_timeout_jitter_in_ms / 1000.0,
+                'prevote': experiment_parameters.pre_vote_enabled,
+                'phase1quorum': experiment_parameters.phase_1_quorum_size,
+                'phase2quorum': experiment_parameters.phase_2_quorum_size,
+                'thrifty': parameters.get('thrifty', experiment_parameters.thrifty_replication),
+                'configurationparameters': experiment_parameters
+            }
+            if i < slow_node_count:
+                paxos_node = SlowPaxosNode("PaxosNode", i + 1, self.number_of_nodes, timeout, slow_node_delay,
+                                           **node_parameters)
+            else:
+                paxos_node = PaxosNode("PaxosNode", i + 1, self.number_of_nodes, timeout, **node_parameters)
+            self.components.append(paxos_node)
+        self.paxos_nodes = self.components[:self.number_of_nodes]
+        for i in range(self.number_of_nodes):
+            for j in range(self.number_of_nodes):
+                if i != j:
+                    self.components[i].connect_me_to_component(ConnectorTypes.PEER, self.components[j])
+
+        self.client = ClientNode("ClientNode", 0, parameters.get('client_request_interval_in_ms', 0),
+                                 configurationparameters=experiment_parameters)
+        self.heartbeat = HeartbeatNode("HeartbeatNode", 0, configurationparameters=experiment_parameters)
+        for bottom_component in (self.client, self.heartbeat):
+            self.components.append(bottom_component)
+            for i in range(self.number_of_nodes):
+                bottom_component.connect_me_to_component(ConnectorTypes.UP, self.components[i])
+                self.components[i].connect_me_to_component(ConnectorTypes.DOWN, bottom_component)
+
+
+class ShardedBenchmarkNode(ShardedNode):
+    """
+    Sharded composite node of a benchmark. It is configured by the configurationparameters dictionary which may contain
+    number_of_groups, hosted_groups, number_of_nodes (hosts), number_of_keys, client_request_interval_in_ms and
+    apply_delay_in_ms, and experiment parameters such as the admission control ones, which are passed on to the nodes.
+    """
+
+    def __init__(self, componentname, componentinstancenumber, context=None, configurationparameters=None,
+                 num_worker_threads=1, topology=None):
+        parameters = configurationparameters or {}
+        self.apply_delay = parameters.get('apply_delay_in_ms', 0) / 1000.0
+        super().__init__(componentname, componentinstancenumber, parameters.get('number_of_groups', 1),
+                         parameters.get('number_of_nodes', NUMBER_OF_PAXOS_NODES),
+                         parameters.get('number_of_keys', NUMBER_OF_SHARD_KEYS),
+                         parameters.get('client_request_interval_in_ms', 0), parameters.get('hosted_groups'),
+                         context, ExperimentParameters.of_known(parameters), num_worker_threads, topology)
+
+    def create_paxos_node(self, group_name, host_number, initial_proposer):
+        if not self.apply_delay:
+            return super().create_paxos_node(group_name, host_number, initial_proposer)
+        parameters = self.parameters
+        return SlowPaxosNode(group_name, host_number, self.number_of_hosts, parameters.timeout_in_ms / 1000.0, 0.0,
+                             self.apply_delay, timeoutjitter=parameters.election_timeout_jitter_in_ms / 1000.0,
+                             prevote=parameters.pre_vote_enabled, phase1quorum=parameters.phase_1_quorum_size,
+                             phase2quorum=parameters.phase_2_quorum_size, thrifty=parameters.thrifty_replication,
+                             initialproposer=initial_proposer, configurationparameters=parameters)
+
+
+def run_benchmark(configurationparameters, duration_in_secs=BENCHMARK_DURATION_IN_SECS, nodeclass=BenchmarkNode):
+    """
+    Runs a single benchmark node with the given configuration.
+    :param nodeclass: Class of the composite node, BenchmarkNode or ShardedBenchmarkNode.
+    :return: Dictionary of the configuration together with throughput (commands per second), latency summary, number of
+    messages sent by leaders, per second and per command, and bytes of the entries proposed by leaders, per second and
+    per command. If the configuration has a fault_scenario, the
+    scenario is run on the Paxos nodes and the numbers of messages affected by faults are reported too. If it has a
+    network_topology, messages between Paxos nodes cross the links of the topology and the network delays are reported.
+    If it has a trace_file, commands are traced as given by trace_sample_rate and trace_slow_command_in_ms and the trace
+    is written to the file. If it has profiling_enabled, the handlers and queue depths of all nodes are profiled, the
+    profile is logged and written to the profiling_file if it has one. If it has a restore_checkpoint_file, the cluster
+    starts from the checkpoint in the file. If it has a checkpoint_file, the cluster is checkpointed to the file at the
+    end and the checkpoint duration, size and numbers of log entries and messages in transit are reported.
+    """
+    Statistics.reset()
+    slow_command_in_ms = configurationparameters.get('trace_slow_command_in_ms')
+    Tracer.configure(configurationparameters.get('trace_sample_rate', 0.0),
+                     slow_command_in_ms / 1000.0 if slow_command_in_ms is not None else None)
+    Profiler.configure(configurationparameters.get('profiling_enabled', False),
+                       configurationparameters.get('profiling_sample_interval_in_ms', 10) / 1000.0,
+                       configurationparameters.get('profiling_report_interval_in_secs'))
+    benchmark_node = nodeclass("BenchmarkNode", 0, configurationparameters=configurationparameters)
+    for component in benchmark_node.components:
+        Profiler.instrument(component)
+    if configurationparameters.get('restore_checkpoint_file') is not None:
+        ClusterCheckpoint.read(configurationparameters['restore_checkpoint_file']).restore(
+            benchmark_node.paxos_nodes, [benchmark_node.client])
+    network_emulator = None
+    if configurationparameters.get('network_topology') is not None:
+        network_emulator = NetworkEmulator(benchmark_node.paxos_nodes,
+                                           NetworkTopology.load(configurationparameters['network_topology']))
+    fault_injector = None
+    if configurationparameters.get('fault_scenario') is not None:
+        scenario = FaultScenario.load(configurationparameters['fault_scenario'])
+        fault_injector = FaultInjector(benchmark_node.paxos_nodes, scenario.seed)
+    if network_emulator is not None:
+        network_emulator.start()
+    Profiler.start()
+    benchmark_node.initiate_process()
+    if fault_injector is not None:
+        fault_injector.start(scenario)
+    time.sleep(duration_in_secs)
+    if fault_injector is not None:
+        fault_injector.stop()
+    checkpoint = None
+    if configurationparameters.get('checkpoint_file') is not None:
+        checkpoint = ClusterCheckpoint.take(benchmark_node.paxos_nodes,
+                                            configurationparameters.get('checkpoint_timeout_in_secs',
+                                                                        CHECKPOINT_TIMEOUT_IN_SECS))
+        checkpoint_bytes = checkpoint.write(configurationparameters['checkpoint_file'])
+    if network_emulator is not None:
+        network_emulator.stop()
+    benchmark_node.exit_process()
+    Profiler.stop()
+    latency_summary = Statistics.command_latency_summary()
+    result = dict(configurationparameters)
+    result['throughput'] = latency_summary['count'] / duration_in_secs
+    leader_message_count = sum(node.sent_message_count_as_proposer for node in benchmark_node.paxos_nodes)
+    result['leader_message_rate'] = leader_message_count / duration_in_secs
+    result['leader_messages_per_command'] = leader_message_count / max(latency_summary['count'], 1)
+    leader_entry_bytes = sum(node.sent_entry_bytes_as_proposer for node in benchmark_node.paxos_nodes)
+    result['leader_entry_byte_rate'] = leader_entry_bytes / duration_in_secs
+    result['leader_entry_bytes_per_command'] = leader_entry_bytes / max(latency_summary['count'], 1)
+    for key in ('mean', 'p50', 'p99'):
+        result[f'latency_{key}'] = latency_summary.get(key)
+    result['busy_responses'] = Statistics.busy_responses
+    if fault_injector is not None:
+        result['leader_changes'] = Statistics.number_of_leader_changes
+        result.update(fault_injector.summary())
+    if network_emulator is not None:
+        result.update(network_emulator.summary())
+    if checkpoint is not None:
+        result.update(checkpoint.summary())
+        result['checkpoint_bytes'] = checkpoint_bytes
+    if configurationparameters.get('trace_file') is not None:
+        Tracer.export(configurationparameters['trace_file'])
+    if configurationparameters.get('profiling_file') is not None:
+        Profiler.dump(configurationparameters['profiling_file'])
+    return result
+
+
+def run_sharded_benchmark(configurationparameters, duration_in_secs=BENCHMARK_DURATION_IN_SECS):
+    """
+    Runs a sharded benchmark node with each of its groups in a process of its own, together with the client sessions of
+    the keys of the group, so that groups do not share an interpreter and throughput grows with the number of cores.
+    :return: Dictionary of the configuration together with throughput (commands per second) and latency summary of the
+    commands of all groups, and number of messages sent and bytes of the entries proposed by leaders of all groups, per
+    second and per command.
+    """
+    number_of_groups = configurationparameters.get('number_of_groups', 1)
+    runs = [(dict(configurationparameters, hosted_groups=[group_number]), duration_in_secs)
+            for group_number in range(number_of_groups)]
+    # Each run gets a fresh process, since the statistics are collected in class attributes
+    with multiprocessing.Pool(number_of_groups, maxtasksperchild=1) as pool:
+        group_results = pool.starmap(run_group_in_worker, runs)
+    latency_summary = distribution_summary([latency for _, latencies in group_results for latency in latencies])
+    command_count = max(latency_summary['count'], 1)
+    result = dict(configurationparameters)
+    result['throughput'] = latency_summary['count'] / duration_in_secs
+    result['leader_message_rate'] = sum(group_result['leader_message_rate'] for group_result, _ in group_results)
+    result['leader_messages_per_command'] = result['leader_message_rate'] * duration_in_secs / command_count
+    result['leader_entry_byte_rate'] = sum(group_result['leader_entry_byte_rate'] for group_result, _ in group_results)
+    result['leader_entry_bytes_per_command'] = result['leader_entry_byte_rate'] * duration_in_secs / command_count
+    for key in ('mean', 'p50', 'p99'):
+        result[f'latency_{key}'] = latency_summary.get(key)
+    result['busy_responses'] = sum(group_result['busy_responses'] for group_result, _ in group_results)
+    return result
+
+
+def run_group_in_worker(configurationparameters, duration_in_secs):
+    setAHCLogLevel(CRITICAL)
+    result = run_benchmark(configurationparameters, duration_in_secs, ShardedBenchmarkNode)
+    return result, Statistics.command_latencies
+
+
+def print_results(results):
+    columns = list(results[0].keys())
+    print(" | ".join(columns))
+    for result in results:
+        print(" | ".join(f"{result[column]:.4f}" if isinstance(result[column], float) else str(result[column])
+                         for column in columns))
+
+
+def benchmark_quorums():
+    """
+    Compares phase 1 / phase 2 quorum sizes while slightly more than half of the followers are slow. A majority
+    phase 2 quorum has to wait for a slow node, smaller phase 2 quorums can commit with the fast nodes only.
+    """
+    number_of_nodes = NUMBER_OF_PAXOS_NODES
+    slow_node_count = number_of_nodes // 2 + 1
+    quorum_settings = [(None, None)]
+    phase_2_quorum_size = number_of_nodes // 2
+    while phase_2_quorum_size >= 2:
+        quorum_settings.append((number_of_nodes - phase_2_quorum_size + 1, phase_2_quorum_size))
+        phase_2_quorum_size -= 2
+    results = []
+    for phase_1_quorum_size, phase_2_quorum_size in quorum_settings:
+        results.append(run_benchmark({
+            'number_of_nodes': number_of_nodes,
+            'phase_1_quorum_size': phase_1_quorum_size,
+            'phase_2_quorum_size': phase_2_quorum_size,
+            'slow_node_count': slow_node_count
+        }))
+    print_results(results)
+
+
+def benchmark_thrifty():
+    """
+    Compares sending every proposal to all peers with thrifty replication, with and without slow nodes.
+    """
+    results = []
+    for slow_node_count in (0, NUMBER_OF_PAXOS_NODES // 4):
+        for thrifty in (False, True):
+            results.append(run_benchmark({
+                'number_of_nodes': NUMBER_OF_PAXOS_NODES,
+                'thrifty': thrifty,
+                'slow_node_count': slow_node_count
+            }))
+    print_results(results)
+
+
+def benchmark_sharding():
+    """
+    Compares the throughput of a single Paxos group with several groups hosted on the same nodes, under the same number
+    of concurrent client sessions. Each group runs in a process of its own, so the gain is bounded by the number of
+    cores.
+    """
+    results = []
+    for number_of_groups in (1, 2, 4, 8):
+        results.append(run_sharded_benchmark({
+            'number_of_groups': number_of_groups,
+            'number_of_nodes': 5,
+            'number_of_keys': NUMBER_OF_SHARD_KEYS
+        }))
+    print_results(results)
+
+
+def benchmark_faults():
+    """
+    Runs every fault scenario of paxos/scenarios on a cluster of 5 nodes, for the duration given by the scenario. The
+    random decisions of the fault injector are seeded by the scenario, so that runs are comparable.
+    """
+    results = []
+    for scenario_name in FaultScenario.available_names():
+        scenario = FaultScenario.load(scenario_name)
+        results.append(run_benchmark({
+            'fault_scenario': scenario_name,
+            'number_of_nodes': 5
+        }, scenario.duration or BENCHMARK_DURATION_IN_SECS))
+    print_results(results)
+
+
+def benchmark_network():
+    """
+    Runs a cluster of 5 nodes on every network topology of paxos/topologies, with majority quorums and with thrifty
+    replication, to compare how replication choices cope with latency, limited bandwidth and loss.
+    """
+    results = []
+    for topology_name in NetworkTopology.available_names():
+        for thrifty in (False, True):
+            results.append(run_benchmark({
+                'network_topology': topology_name,
+                'number_of_nodes': 5,
+                'thrifty': thrifty
+            }))
+    print_results(results)
+
+
+def benchmark_admission():
+    """
+    Overloads the leader of a single group with many concurrent client sessions, without admission control, with a
+    bounded in-flight window and with a queue time target. Without admission control, the input queue of the leader
+    grows and so does the latency. With it, the excess commands get busy responses and the latency stays bounded.
+    """
+    results = []
+    for max_in_flight_entries, queue_time_target_in_ms in ((None, None), (32, None), (None, 5)):
+        results.append(run_benchmark({
+            'number_of_groups': 1,
+            'number_of_nodes': 5,
+            'number_of_keys': 256,
+            'admission_max_in_flight_entries': max_in_flight_entries,
+            'admission_queue_time_target_in_ms': queue_time_target_in_ms
+        }, nodeclass=ShardedBenchmarkNode))
+    print_results(results)
+
+
+def benchmark_fast_path():
+    """
+    Runs a single group of 5 nodes on the three_regions topology with 16 client sessions, on the classic path and on the
+    fast path, with commuting commands only and with a fraction of non-commuting ones. On the fast path, commuting
+    commands are committed after a single round trip from the client to the closest majority instead of two, while each
+    non-commuting command waits for an epoch barrier.
+    """
+    results = []
+    for non_commuting_command_ratio in (0.0, 0.1):
+        for fast_path_enabled in (False, True):
+            results.append(run_benchmark({
+                'network_topology': "three_regions",
+                'number_of_groups': 1,
+                'number_of_nodes': 5,
+                'number_of_keys': 16,
+                'fast_path_enabled': fast_path_enabled,
+                'client_non_commuting_command_ratio': non_commuting_command_ratio
+            }, nodeclass=ShardedBenchmarkNode))
+    print_results(results)
+
+
+def benchmark_pipeline():
+    """
+    Runs a single group of 5 nodes with 64 client sessions, with and without the pipeline, with a free state machine
+    and with one taking APPLY_DELAY_IN_MS per command. Without the pipeline, each node applies the committed entries
+    before it handles the next message, so the cost of applying adds up with the cost of replicating. With it, the
+    apply stage runs while the handlers go on replicating, which needs a state machine releasing the interpreter lock,
+    as the delays do, to run on another core.
+    """
+    results = []
+    for apply_delay_in_ms in (0, APPLY_DELAY_IN_MS):
+        for pipeline_enabled in (False, True):
+            results.append(run_benchmark({
+                'number_of_groups': 1,
+                'number_of_nodes': 5,
+                'number_of_keys': 64,
+                'apply_delay_in_ms': apply_delay_in_ms,
+                'pipeline_enabled': pipeline_enabled
+            }, nodeclass=ShardedBenchmarkNode))
+    print_results(results)
+
+
+def benchmark_erasure_coding():
+    """
+    Runs a single group of 5 nodes with 16 client sessions sending commands with large payloads, with full and with
+    erasure coded replication, in memory and on the bandwidth_limited topology of 100 Mbps links. Erasure coding
+    divides the bytes of the entries proposed by the leader by up to k, at the cost of a larger phase 2 quorum, which
+    pays off once the links are the bottleneck.
+    """
+    results = []
+    for network_topology in (None, "bandwidth_limited"):
+        for payload_size in (16 * 1024, 64 * 1024):
+            for erasure_coding_enabled in (False, True):
+                results.append(run_benchmark({
+                    'network_topology': network_topology,
+                    'number_of_groups': 1,
+                    'number_of_nodes': 5,
+                    'number_of_keys': 16,
+                    'client_command_payload_size_in_bytes': payload_size,
+                    'erasure_coding_enabled': erasure_coding_enabled
+                }, nodeclass=ShardedBenchmarkNode))
+    print_results(results)
+
+
+def benchmark_checkpoint():
+    """
+    Runs a single group of 5 nodes with 16 client sessions and snapshots of the state every 100000 entries, so that the
+    log grows large, and checkpoints the cluster at the end. A second run starts from the checkpoint, with the log of
+    the first run and without the startup election, and checkpoints it again.
+    """
+    checkpoint_file = os.path.join(tempfile.mkdtemp(), "checkpoint")
+    results = []
+    for restore_checkpoint_file in (None, checkpoint_file):
+        results.append(run_benchmark({
+            'number_of_groups': 1,
+            'number_of_nodes': 5,
+            'number_of_keys': 16,
+            'snapshot_interval_in_entries': 100000,
+            'restore_checkpoint_file': restore_checkpoint_file,
+            'checkpoint_file': checkpoint_file
+        }, nodeclass=ShardedBenchmarkNode))
+    os.remove(checkpoint_file)
+    print_results(results)
+
+
+BENCHMARKS = {
+    'quorums': benchmark_quorums,
+    'thrifty': benchmark_thrifty,
+    'sharding': benchmark_sharding,
+    'faults': benchmark_faults,
+    'network': benchmark_network,
+    'admission': benchmark_admission,
+    'fast_path': benchmark_fast_path,
+    'pipeline': benchmark_pipeline,
+    'erasure_coding': benchmark_erasure_coding,
+    'checkpoint': benchmark_checkpoint
+}
+
+
+def main():
+    setAHCLogLevel(CRITICAL)
+    names = sys.argv[1:] or list(BENCHMARKS.keys())
+    for name in names:
+        logger.critical(f"Running benchmark: {name}")
+        BENCHMARKS[name]()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,239 @@
+"""
+Consistent checkpoints of a whole cluster of Paxos nodes, taken with the Chandy-Lamport algorithm of the Snapshot
+package while the cluster runs, and restored into a new cluster so that an experiment starts from a warm state, e.g.
+a large log, without replaying it from an empty log or waiting for the startup election.
+
+Every node records its state once it starts the checkpoint or receives the first marker of it: its log, terms, role,
+commit and apply indexes, snapshot, the state resulting from the applied entries and the commands it fast accepted,
+which may be committed without being in any log yet. It then sends a marker to each
+peer. The messages a node receives from a peer after recording its state and before the marker of the peer are the
+messages in transit on the channel from the peer, they are recorded too. The node reports its checkpoint once it has
+received the marker of every peer. The recorded states are consistent as long as the messages of a peer arrive in the
+order they are sent, i.e. links of the network emulator do not reorder messages and the fault injector neither drops
+nor duplicates them. Commands of clients are not part of the checkpoint, clients send them again.
+
+A restored node skips the startup election, the leader of the checkpoint takes over as proposer right away and the
+messages in transit are delivered again.
+"""
+import pickle
+import time
+from enum import Enum
+from threading import Event as ThreadingEvent, Lock
+
+from adhoccomputing.Generics import Event
+
+from paxos.utils import PaxosEventTypes, CommandTypes, CHECKPOINT_TIMEOUT_IN_SECS, CHECKPOINT_ENTRIES_PER_RECORD
+
+CHECKPOINT_FORMAT_VERSION = 1
+
+
+class CheckpointRecordTypes(Enum):
+    HEADER = "HEADER"
+    NODE = "NODE"  # State of a node
+    ENTRIES = "ENTRIES"  # Consecutive entries of the log of a node
+    MESSAGES = "MESSAGES"  # Messages in transit to a node on the channel from a peer
+    END = "END"
+
+
+def detached_event(eventobj: Event):
+    """
+    :return: Copy of the event without its source component, which cannot be serialized. The source is still known by
+    its component name and instance number, and by the header of the message.
+    """
+    return Event(None, eventobj.event, eventobj.eventcontent, eventobj.fromchannel, eventobj.eventid,
+                 eventobj.eventsource_componentname, eventobj.eventsource_componentinstancenumber)
+
+
+class NodeCheckpoint:
+    """
+    State of a node in a checkpoint of the cluster, together with the messages in transit to it on the channel from each
+    peer.
+    """
+
+    def __init__(self, node_id, state, logsnapshotindex, logentries, snapshot, channelmessages=None):
+        """
+        :param state: Dictionary of the terms, role, commit and apply indexes of the node, the state resulting from its
+        applied entries and its fast accepted commands, see PaxosNode.capture_checkpoint_state.
+        :param logsnapshotindex: Index of the first entry of the log, the last compacted one.
+        :param logentries: Entries of the log from that index on.
+        :param snapshot: Latest snapshot of the node, or None.
+        :param channelmessages: Dictionary of the messages in transit by peer id, filled once the checkpoint of the node
+        is complete.
+        """
+        self.node_id = node_id
+        self.state = state
+        self.log_snapshot_index = logsnapshotindex
+        self.log_entries = logentries
+        self.snapshot = snapshot
+        self.channel_messages = channelmessages if channelmessages is not None else {}
+
+    def log_length(self):
+        return self.log_snapshot_index + len(self.log_entries)
+
+    def channel_message_count(self):
+        return sum(len(events) for events in self.channel_messages.values())
+
+    def __str__(self):
+        return f"NodeCheckpoint(node={self.node_id}, status={self.state['status'].value}, " \
+               f"term={self.state['current_term']}, log_length={self.log_length()}, " \
+               f"commit_index={self.state['commit_index']}, channel_messages={self.channel_message_count()})"
+
+
+class ClusterCheckpoint:
+    """
+    Checkpoint of a cluster, i.e. the NodeCheckpoint of each of its nodes by node id. Checkpoints are taken with take,
+    nodes report their checkpoints to the pending checkpoint of the class with report.
+    """
+    lock = Lock()
+    pending = {}  # ClusterCheckpoint being taken by checkpoint id
+    sequence = 0
+
+    def __init__(self, checkpoint_id, node_ids):
+        self.checkpoint_id = checkpoint_id
+        self.node_ids = list(node_ids)
+        self.node_checkpoints = {}
+        self.completed = ThreadingEvent()
+        self.duration = None  # Seconds between the start of the checkpoint and its completion, if it is taken here
+
+    @classmethod
+    def take(cls, nodes, timeout=CHECKPOINT_TIMEOUT_IN_SECS):
+        """
+        Takes a checkpoint of the running nodes, which must include every node they are connected to as peers. Every
+        node starts the checkpoint, so that it completes after a single round of markers, and nodes of distinct Paxos
+        groups are checkpointed together.
+        :param timeout: Seconds to wait for the checkpoints of all nodes.
+        :return: The ClusterCheckpoint.
+        :raises TimeoutError: If some node, e.g. a crashed one, has not completed its checkpoint in time.
+        """
+        with cls.lock:
+            cls.sequence += 1
+            checkpoint = cls(cls.sequence, [node.node_id for node in nodes])
+            cls.pending[checkpoint.checkpoint_id] = checkpoint
+        start_time = time.time()
+        for node in nodes:
+            node.trigger_event(Event(None, PaxosEventTypes.TAKE_CHECKPOINT, checkpoint.checkpoint_id))
+        completed = checkpoint.completed.wait(timeout)
+        with cls.lock:
+            del cls.pending[checkpoint.checkpoint_id]
+        if not completed:
+            missing_node_ids = [node_id for node_id in checkpoint.node_ids if node_id not in checkpoint.node_checkpoints]
+            raise TimeoutError(f"Checkpoint {checkpoint.checkpoint_id} is not completed in {timeout} seconds by "
+                               f"{missing_node_ids}")
+        checkpoint.duration = time.time() - start_time
+        return checkpoint
+
+    @classmethod
+    def report(cls, checkpoint_id, node_checkpoint: NodeCheckpoint):
+        with cls.lock:
+            checkpoint = cls.pending.get(checkpoint_id)
+            if checkpoint is None:
+                return
+            checkpoint.node_checkpoints[node_checkpoint.node_id] = node_checkpoint
+            if len(checkpoint.node_checkpoints) == len(checkpoint.node_ids):
+                checkpoint.completed.set()
+
+    @classmethod
+    def is_pending(cls, checkpoint_id):
+        with cls.lock:
+            return checkpoint_id in cls.pending
+
+    def last_command_ids(self):
+        """
+        :return: Dictionary of the highest command id of each command key, applied, in the log of any node or fast
+        accepted by any node.
+        """
+        command_ids = {}
+        for node_checkpoint in self.node_checkpoints.values():
+            for key, command_id in node_checkpoint.state['applied_command_ids'].items():
+                command_ids[key] = max(command_id, command_ids.get(key, 0))
+            for entry in node_checkpoint.log_entries:
+                if entry.command.type != CommandTypes.CONFIGURATION.value:
+                    key = entry.command.key
+                    command_ids[key] = max(entry.command.id, command_ids.get(key, 0))
+            for key, command_id in node_checkpoint.state['fast_accepted']:
+                command_ids[key] = max(command_id, command_ids.get(key, 0))
+        return command_ids
+
+    def restore(self, nodes, clients=()):
+        """
+        Restores the checkpoint of each node into a new node with the same node id, before the nodes start. The nodes
+        must be connected as the nodes of the checkpoint were.
+        :param clients: Client nodes, their commands follow the commands of the checkpoint.
+        :raises ValueError: If the node ids differ from the node ids of the checkpoint.
+        """
+        nodes_by_id = {node.node_id: node for node in nodes}
+        if set(nodes_by_id) != set(self.node_checkpoints):
+            raise ValueError(f"Checkpoint of {sorted(self.node_checkpoints)} cannot be restored into {sorted(nodes_by_id)}")
+        for node_id, node_checkpoint in self.node_checkpoints.items():
+            nodes_by_id[node_id].restore_checkpoint(node_checkpoint)
+        command_ids = self.last_command_ids()
+        for client in clients:
+            client.continue_command_ids(command_ids)
+
+    def write(self, path, entries_per_record=CHECKPOINT_ENTRIES_PER_RECORD):
+        """
+        Writes the checkpoint to the file as a stream of records, so that neither writing nor reading it serializes the
+        whole cluster at once: a header, then for each node its state, its log entries entries_per_record at a time and
+        the messages in transit to it on each channel, and an end record.
+        :return: Number of bytes written.
+        """
+        with open(path, 'wb') as file:
+            write_record(file, CheckpointRecordTypes.HEADER,
+                         {'version': CHECKPOINT_FORMAT_VERSION, 'checkpointId': self.checkpoint_id,
+                          'nodeIds': self.node_ids})
+            for node_id, node_checkpoint in self.node_checkpoints.items():
+                write_record(file, CheckpointRecordTypes.NODE, node_id, node_checkpoint.state,
+                             node_checkpoint.log_snapshot_index, node_checkpoint.snapshot)
+                for start in range(0, len(node_checkpoint.log_entries), entries_per_record):
+                    write_record(file, CheckpointRecordTypes.ENTRIES, node_id,
+                                 node_checkpoint.log_entries[start:start + entries_per_record])
+                for peer_id, events in node_checkpoint.channel_messages.items():
+                    write_record(file, CheckpointRecordTypes.MESSAGES, node_id, peer_id, events)
+            write_record(file, CheckpointRecordTypes.END)
+            return file.tell()
+
+    @classmethod
+    def read(cls, path):
+        """
+        :return: The checkpoint written to the file.
+        :raises ValueError: If the file is not a checkpoint of this version or is truncated.
+        """
+        with open(path, 'rb') as file:
+            record = read_record(file, path)
+            if record[0] != CheckpointRecordTypes.HEADER or record[1]['version'] != CHECKPOINT_FORMAT_VERSION:
+                raise ValueError(f"{path} is not a checkpoint of version {CHECKPOINT_FORMAT_VERSION}")
+            checkpoint = cls(record[1]['checkpointId'], record[1]['nodeIds'])
+            while (record := read_record(file, path))[0] != CheckpointRecordTypes.END:
+                record_type, node_id = record[0], record[1]
+                if record_type == CheckpointRecordTypes.NODE:
+                    state, log_snapshot_index, snapshot = record[2:]
+                    checkpoint.node_checkpoints[node_id] = NodeCheckpoint(node_id, state, log_snapshot_index, [],
+                                                                          snapshot)
+                elif record_type == CheckpointRecordTypes.ENTRIES:
+                    checkpoint.node_checkpoints[node_id].log_entries.extend(record[2])
+                elif record_type == CheckpointRecordTypes.MESSAGES:
+                    checkpoint.node_checkpoints[node_id].channel_messages[record[2]] = record[3]
+        return checkpoint
+
+    def summary(self):
+        return {
+            'checkpoint_duration': self.duration,
+            'checkpoint_log_entries': sum(len(node_checkpoint.log_entries)
+                                          for node_checkpoint in self.node_checkpoints.values()),
+            'checkpoint_channel_messages': sum(node_checkpoint.channel_message_count()
+                                               for node_checkpoint in self.node_checkpoints.values())
+        }
+
+    def __str__(self):
+        return f"ClusterCheckpoint(id={self.checkpoint_id}, nodes={sorted(self.node_checkpoints)})"
+
+
+def write_record(file, record_type, *fields):
+    pickle.dump((record_type,) + fields, file, protocol=pickle.HIGHEST_PROTOCOL)
+
+
+def read_record(file, path):
+    try:
+        return pickle.load(file)
+    except EOFError:
+        raise ValueError(f"Checkpoint file {path} is truncated")
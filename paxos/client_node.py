@@ -1,57 +1,135 @@
+import os
 import random
 import time
+from threading import Timer
 
 from adhoccomputing.GenericModel import GenericModel
 from adhoccomputing.Generics import Event, logger
 
-from paxos.utils import NodeStatus, PaxosEventTypes, CommandTypes, Command, CLIENT_REQUEST_INTERVAL_IN_MS
+from paxos.admission import busy_backoff
+from paxos.parameters import ExperimentParameters
+from paxos.statistics import Statistics
+from paxos.tracing import Tracer
+from paxos.utils import NodeStatus, PaxosEventTypes, CommandTypes, Command, COMMAND_OPERATORS
 
 
 class ClientNode(GenericModel):
     """
     Client node sends requests to the cluster. It generates random commands and sends them to upper layer
     involving Paxos or Raft nodes. It waits for the response and if the response is successful, it sends another request.
-    CLIENT_REQUEST_INTERVAL_IN_MS constant is used to define the interval between requests.
+    The client_request_interval_in_ms parameter of the ExperimentParameters given as configurationparameters is used to
+    define the interval between requests by default. If read replicas are given, the client also reads from one of
+    them, in turn, after each successful request. A command rejected by a busy leader is sent again after an
+    exponential backoff. On the fast path, a command is also committed once a fast quorum of members accepted it in the
+    same term and epoch.
     """
 
-    def __init__(self, componentname, componentinstancenumber, context=None, configurationparameters=None,
-                 num_worker_threads=1, topology=None):
+    def __init__(self, componentname, componentinstancenumber, requestintervalinms=None, readnodeids=None, context=None,
+                 configurationparameters=None, num_worker_threads=1, topology=None):
         super().__init__(componentname, componentinstancenumber, context, configurationparameters,
                          num_worker_threads, topology)
+        parameters = ExperimentParameters.of(configurationparameters)
         self.expected_state_machine_value = 0
         self.state = NodeStatus.CLIENT
+        if requestintervalinms is None:
+            requestintervalinms = parameters.client_request_interval_in_ms
+        self.request_interval_in_ms = requestintervalinms
+        self.busy_backoff = parameters.client_busy_backoff_in_ms / 1000.0
+        self.max_busy_backoff = parameters.client_max_busy_backoff_in_ms / 1000.0
+        self.busy_attempts = 0  # Busy responses received in a row for the last command
+        self.non_commuting_command_ratio = parameters.client_non_commuting_command_ratio
+        self.command_payload_size = parameters.client_command_payload_size_in_bytes
+        self.fast_accepts = {}  # for each (term, epoch), members that fast accepted the last command
+        self.fast_committed_command = None  # Last command committed on the fast path, the leader still responds to it
         self.last_command = None
+        self.last_command_sent_time = None  # Time the last command is first sent, used to measure commit latency
         self.node_id = componentname + '_' + str(componentinstancenumber)
+        self.read_node_ids = list(readnodeids or [])  # Node ids of read replicas
+        self.read_count = 0
+        # for each command key, the command id that the first command follows, see continue_command_ids
+        self.first_command_ids = {}
 
         self.eventhandlers[PaxosEventTypes.CLIENT_RESPONSE] = self.on_client_response
         self.eventhandlers[PaxosEventTypes.CLIENT_REQUEST] = self.on_client_request
+        self.eventhandlers[PaxosEventTypes.READ_RESPONSE] = self.on_read_response
 
     def on_init(self, eventobj: Event):
-        first_command = Command(1, CommandTypes.ADD, 33)
+        first_command = Command(self.first_command_ids.get(None, 0) + 1, CommandTypes.ADD, 33,
+                                command_payload=self.create_payload())
         self.last_command = first_command
+        self.last_command_sent_time = time.time()
+        if Tracer.enabled:
+            Tracer.begin_command(self.node_id, first_command)
         first_client_request_event = Event(self, PaxosEventTypes.CLIENT_REQUEST, self.last_command)
         self.send_self(first_client_request_event)
 
+    def continue_command_ids(self, command_ids):
+        """
+        Makes the first command of each key follow the given command id of the key, e.g. the highest one in the
+        checkpoint the cluster is restored from, so that it is not taken for a command the cluster already has.
+        """
+        self.first_command_ids = dict(command_ids)
+
     def on_client_response(self, eventobj: Event):
         print(f"Client {self.node_id} received response: {eventobj.eventcontent.payload}")
         print(f"Last command: {self.last_command}")
+        if eventobj.eventcontent.payload.get('busy'):
+            if eventobj.eventcontent.payload['command'] == self.last_command:
+                self.busy_attempts += 1
+                Timer(busy_backoff(self.busy_attempts, self.busy_backoff, self.max_busy_backoff), self.send_up,
+                      [Event(self, PaxosEventTypes.CLIENT_REQUEST, self.last_command)]).start()
+            return
+        if eventobj.eventcontent.payload.get('fast'):
+            if eventobj.eventcontent.payload['command'] != self.last_command or \
+                    not self.count_fast_accept(eventobj, self.fast_accepts):
+                return
+            self.fast_committed_command = self.last_command
+        elif eventobj.eventcontent.payload['command'] == self.fast_committed_command:
+            return
         if eventobj.eventcontent.payload['success'] and eventobj.eventcontent.payload['command'] == self.last_command:
+            self.busy_attempts = 0
+            self.fast_accepts = {}
+            Statistics.record_command_latency(time.time() - self.last_command_sent_time)
+            if Tracer.enabled:
+                Tracer.end_command(self.node_id, self.last_command)
             self.apply_command(self.last_command)
-            time.sleep(CLIENT_REQUEST_INTERVAL_IN_MS / 1000.0)
+            self.send_read_request()
+            time.sleep(self.request_interval_in_ms / 1000.0)
             self.last_command = self.generate_command()
+            self.last_command_sent_time = time.time()
+            if Tracer.enabled:
+                Tracer.begin_command(self.node_id, self.last_command)
             client_request_event = Event(self, PaxosEventTypes.CLIENT_REQUEST, self.last_command)
             self.send_up(client_request_event)
-        else:
+        elif not self.fast_accepts:
+            # Members that fast accepted the last command report it to the leader, it does not need to be sent again
             logger.critical(
                 f"Client {self.node_id} received REPEATED response: for command id: {eventobj.eventcontent.payload['command'].id}")
             client_request_event = Event(self, PaxosEventTypes.CLIENT_REQUEST, self.last_command)
             self.send_up(client_request_event)
 
-    # Choose random number to add, between -100 and 100
+    @staticmethod
+    def count_fast_accept(eventobj, fast_accepts):
+        """
+        Counts the fast accept of the waiting command in fast_accepts, its acceptors by term and epoch.
+        :return: Whether a fast quorum has accepted the command in the same term and epoch.
+        """
+        payload = eventobj.eventcontent.payload
+        acceptors = fast_accepts.setdefault((payload['term'], payload['epoch']), set())
+        acceptors.add(eventobj.eventcontent.header.messagefrom)
+        return len(acceptors) >= payload['fastQuorumSize']
+
+    # Choose random number to add, between -100 and 100, or negate the value with non_commuting_command_ratio
     def generate_command(self):
+        if random.random() < self.non_commuting_command_ratio:
+            return Command(self.last_command.id + 1, CommandTypes.MULTIPLY, -1, command_payload=self.create_payload())
         value = random.randint(-100, 100)
         command_type = CommandTypes.ADD if value > 0 else CommandTypes.SUBTRACT
-        return Command(self.last_command.id + 1, command_type, abs(value))
+        return Command(self.last_command.id + 1, command_type, abs(value), command_payload=self.create_payload())
+
+    # Random bytes of client_command_payload_size_in_bytes, so that payloads cannot be compressed, or None
+    def create_payload(self):
+        return os.urandom(self.command_payload_size) if self.command_payload_size > 0 else None
 
     def apply_command(self, command):
         old_state_machine_value = self.expected_state_machine_value
@@ -59,9 +137,26 @@ class ClientNode(GenericModel):
             self.expected_state_machine_value += command.value
         elif command.type == CommandTypes.SUBTRACT.value:
             self.expected_state_machine_value -= command.value
+        elif command.type == CommandTypes.MULTIPLY.value:
+            self.expected_state_machine_value *= command.value
+        elif command.type == CommandTypes.DIVIDE.value and command.value != 0:
+            self.expected_state_machine_value //= command.value
         logger.error(
             f"{self.node_id} APPLIED COMMAND id: {command.id}\n"
-            f"{old_state_machine_value} {command.type == CommandTypes.ADD.value and '+' or '-'} {command.value} = {self.expected_state_machine_value}")
+            f"{old_state_machine_value} {COMMAND_OPERATORS.get(command.type)} {command.value} = {self.expected_state_machine_value}")
+
+    def send_read_request(self):
+        if not self.read_node_ids:
+            return
+        read_node_id = self.read_node_ids[self.read_count % len(self.read_node_ids)]
+        self.read_count += 1
+        self.send_up(Event(self, PaxosEventTypes.READ_REQUEST, {'node_id': read_node_id}))
+
+    def on_read_response(self, eventobj: Event):
+        logger.error(
+            f"Client {self.node_id} read {eventobj.eventcontent.payload['value']} from "
+            f"{eventobj.eventcontent.header.messagefrom} at index {eventobj.eventcontent.payload['appliedIndex']}, "
+            f"expected {self.expected_state_machine_value}")
 
     def on_client_request(self, eventobj: Event):
         logger.error(f"Client {self.node_id} sending command to upper layer")
@@ -0,0 +1,200 @@
+"""
+Erasure coding of the payloads of commands, used by the erasure coded replication mode of the Paxos nodes in the manner
+of RS-Paxos and CRaft. The leader splits the payload of a large command into k data fragments and n - k parity fragments
+with a systematic Reed-Solomon code over GF(256), n being the number of voting members, and sends each follower only
+its own fragment instead of the whole payload. Any k fragments rebuild the payload.
+
+A new leader has to rebuild the uncommitted entries it collects from the promises of a phase 1 quorum. An entry
+committed by a phase 2 quorum is rebuilt if every phase 1 quorum shares at least k members with every phase 2 quorum,
+so the phase 2 quorum is raised to n - phase 1 quorum + k, see PaxosNode.phase_2_quorum_for.
+
+Bytes are multiplied by a constant of GF(256) with bytes.translate and added with the exclusive or of integers, so that
+fragments are computed without a Python loop over their bytes.
+"""
+from functools import lru_cache
+
+GF_PRIMITIVE_POLYNOMIAL = 0x11d
+
+
+def create_gf_tables():
+    exponentials = [0] * 512
+    logarithms = [0] * 256
+    value = 1
+    for exponent in range(255):
+        exponentials[exponent] = value
+        logarithms[value] = exponent
+        value <<= 1
+        if value & 0x100:
+            value ^= GF_PRIMITIVE_POLYNOMIAL
+    for exponent in range(255, 512):
+        exponentials[exponent] = exponentials[exponent - 255]
+    return exponentials, logarithms
+
+
+GF_EXPONENTIALS, GF_LOGARITHMS = create_gf_tables()
+
+
+def gf_multiply(a, b):
+    if a == 0 or b == 0:
+        return 0
+    return GF_EXPONENTIALS[GF_LOGARITHMS[a] + GF_LOGARITHMS[b]]
+
+
+def gf_inverse(a):
+    if a == 0:
+        raise ZeroDivisionError("0 has no inverse in GF(256)")
+    return GF_EXPONENTIALS[255 - GF_LOGARITHMS[a]]
+
+
+@lru_cache(maxsize=256)
+def multiplication_table(coefficient):
+    """
+    :return: Translation table multiplying every byte by the coefficient.
+    """
+    return bytes(gf_multiply(coefficient, value) for value in range(256))
+
+
+def multiply_bytes(data, coefficient):
+    if coefficient == 1:
+        return data
+    return data.translate(multiplication_table(coefficient))
+
+
+def add_bytes(a, b):
+    return (int.from_bytes(a, 'little') ^ int.from_bytes(b, 'little')).to_bytes(len(a), 'little')
+
+
+def linear_combination(coefficients, fragments):
+    """
+    :return: Sum of the fragments multiplied by the coefficients, all fragments having the same size.
+    """
+    result = None
+    for coefficient, fragment in zip(coefficients, fragments):
+        if coefficient == 0:
+            continue
+        product = multiply_bytes(fragment, coefficient)
+        result = product if result is None else add_bytes(result, product)
+    return result if result is not None else bytes(len(fragments[0]))
+
+
+def invert_matrix(matrix):
+    """
+    Inverts a square matrix over GF(256) by Gauss-Jordan elimination.
+    :raises ValueError: If the matrix is singular.
+    """
+    size = len(matrix)
+    rows = [list(row) + [1 if column == row_number else 0 for column in range(size)]
+            for row_number, row in enumerate(matrix)]
+    for column in range(size):
+        pivot_row = next((row for row in range(column, size) if rows[row][column]), None)
+        if pivot_row is None:
+            raise ValueError("Singular matrix")
+        rows[column], rows[pivot_row] = rows[pivot_row], rows[column]
+        pivot_inverse = gf_inverse(rows[column][column])
+        rows[column] = [gf_multiply(pivot_inverse, value) for value in rows[column]]
+        for row in range(size):
+            factor = rows[row][column]
+            if row != column and factor:
+                rows[row] = [value ^ gf_multiply(factor, pivot_value)
+                             for value, pivot_value in zip(rows[row], rows[column])]
+    return [row[size:] for row in rows]
+
+
+class ReedSolomonCode:
+    """
+    Systematic Reed-Solomon code with k data fragments out of n fragments. The first k fragments are the data split in
+    k parts, the others are parity fragments computed with a Cauchy matrix, so that any k fragments are independent.
+    """
+
+    def __init__(self, datafragments, totalfragments):
+        """
+        :param datafragments: Number of fragments needed to rebuild the data, k.
+        :param totalfragments: Number of fragments, n.
+        :raises ValueError: If 1 <= k <= n <= 256 does not hold.
+        """
+        if not 1 <= datafragments <= totalfragments <= 256:
+            raise ValueError(f"Invalid Reed-Solomon code with {datafragments} data fragments out of {totalfragments}")
+        self.data_fragments = datafragments
+        self.total_fragments = totalfragments
+        # Row i of the parity matrix is 1 / (x_i + y_j) with x_i = k + i and y_j = j, which are all distinct
+        self.parity_matrix = [[gf_inverse((datafragments + row) ^ column) for column in range(datafragments)]
+                              for row in range(totalfragments - datafragments)]
+
+    @classmethod
+    @lru_cache(maxsize=64)
+    def of(cls, datafragments, totalfragments):
+        return cls(datafragments, totalfragments)
+
+    def fragment_size(self, length):
+        return max(-(-length // self.data_fragments), 1)
+
+    def encode(self, data):
+        """
+        :return: The n fragments of the data, of fragment_size(len(data)) bytes each.
+        """
+        fragment_size = self.fragment_size(len(data))
+        data = data.ljust(fragment_size * self.data_fragments, b'\0')
+        data_fragments = [data[start:start + fragment_size] for start in range(0, len(data), fragment_size)]
+        return data_fragments + [linear_combination(row, data_fragments) for row in self.parity_matrix]
+
+    def decode(self, fragments, length):
+        """
+        :param fragments: Dictionary of fragment number to fragment, at least k of them.
+        :param length: Length of the encoded data.
+        :return: The encoded data.
+        :raises ValueError: If there are less than k fragments.
+        """
+        if len(fragments) < self.data_fragments:
+            raise ValueError(f"{len(fragments)} fragments cannot rebuild data of {self.data_fragments} fragments")
+        if all(number in fragments for number in range(self.data_fragments)):
+            return b''.join(fragments[number] for number in range(self.data_fragments))[:length]
+        numbers = sorted(fragments)[:self.data_fragments]
+        matrix = [self.generator_row(number) for number in numbers]
+        inverse = invert_matrix(matrix)
+        received = [fragments[number] for number in numbers]
+        return b''.join(linear_combination(row, received) for row in inverse)[:length]
+
+    def generator_row(self, number):
+        if number < self.data_fragments:
+            return [1 if column == number else 0 for column in range(self.data_fragments)]
+        return self.parity_matrix[number - self.data_fragments]
+
+
+class Fragment:
+    """
+    Fragment of the payload of a command, carried by a log entry instead of the payload.
+    """
+
+    def __init__(self, number, data, datafragments, totalfragments, payloadsize):
+        self.number = number
+        self.data = data
+        self.data_fragments = datafragments
+        self.total_fragments = totalfragments
+        self.payload_size = payloadsize
+
+    def __str__(self):
+        return f"Fragment({self.number} of {self.total_fragments}, size={len(self.data)})"
+
+
+def encode_payload(payload, datafragments, totalfragments):
+    """
+    :return: The n fragments of the payload.
+    """
+    code = ReedSolomonCode.of(datafragments, totalfragments)
+    return [Fragment(number, data, datafragments, totalfragments, len(payload))
+            for number, data in enumerate(code.encode(payload))]
+
+
+def decode_payload(fragments):
+    """
+    :param fragments: Fragments of the same payload, possibly encoded with different codes if the configuration changed.
+    :return: The payload, or None if there are less than k distinct fragments of the same code.
+    """
+    fragments_by_code = {}
+    for fragment in fragments:
+        code_parameters = (fragment.data_fragments, fragment.total_fragments, fragment.payload_size)
+        fragments_by_code.setdefault(code_parameters, {})[fragment.number] = fragment.data
+    for (data_fragments, total_fragments, payload_size), fragment_data in fragments_by_code.items():
+        if len(fragment_data) >= data_fragments:
+            return ReedSolomonCode.of(data_fragments, total_fragments).decode(fragment_data, payload_size)
+    return None
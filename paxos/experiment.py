@@ -1,76 +1,229 @@
-from adhoccomputing.Experimentation.Topology import Topology
 from adhoccomputing.GenericModel import GenericModel
 from adhoccomputing.Generics import *
 
+from paxos.checkpoint import ClusterCheckpoint
 from paxos.client_node import ClientNode
+from paxos.faults import FaultScenario, FaultInjector
 from paxos.heartbeat_node import HeartbeatNode
+from paxos.network import NetworkTopology, NetworkEmulator
+from paxos.parameters import ExperimentParameters
 from paxos.paxos_node import PaxosNode
+from paxos.profiling import Profiler
 from paxos.sleep_trigger_node import SleepTriggerNode
-from paxos.utils import EXPERIMENT_EXECUTION_IN_SECS, NUMBER_OF_PAXOS_NODES, TIMEOUT_IN_MS
+from paxos.statistics import Statistics
+from paxos.tracing import Tracer
+from paxos.utils import NodeStatus, PaxosEventTypes
 
 
 class Node(GenericModel):
     """
     This class is the main class of the experiment. It creates Paxos or Raft nodes and connects them as peers. It also creates
     a client, a heartbeat node and a sleep trigger node at the bottom of the topology in order to send client requests,
-    simulate timeouts, and manage experiment by implementing sleep trigger mechanism.
+    simulate timeouts, and manage experiment by implementing sleep trigger mechanism. The node is configured by the
+    ExperimentParameters (or a dictionary of them) given as configurationparameters, which are passed on to every node it
+    creates.
     """
 
     def get_name(self):
         return self.name
 
     def on_init(self, eventobj: Event):
-        pass
+        if self.network_emulator is not None:
+            self.network_emulator.start()
+        if self.fault_injector is not None:
+            self.fault_injector.start(FaultScenario.load(self.parameters.fault_scenario))
 
     def __init__(self, componentname, componentinstancenumber, context=None, configurationparameters=None,
                  num_worker_threads=1, topology=None):
         super().__init__(componentname, componentinstancenumber, context, configurationparameters, num_worker_threads,
                          topology)
         self.name = componentname + str(componentinstancenumber)
-        self.number_of_nodes = NUMBER_OF_PAXOS_NODES
+        self.parameters = ExperimentParameters.of(configurationparameters)
+        self.number_of_nodes = self.parameters.number_of_paxos_nodes
 
         # Create Paxos Nodes and connect them as peers
         for i in range(self.number_of_nodes):
-            self.components.append(PaxosNode("PaxosNode", i + 1, self.number_of_nodes, TIMEOUT_IN_MS / 1000.0))
+            self.components.append(self.create_paxos_node(i + 1))
+        self.paxos_nodes = self.components[:self.number_of_nodes]
         for i in range(self.number_of_nodes):
             for j in range(self.number_of_nodes):
                 if i != j:
                     self.components[i].connect_me_to_component(ConnectorTypes.PEER, self.components[j])
 
+        # Create read replicas, each fed by a different follower, and connect them as peers to the Paxos nodes
+        self.read_replicas = []
+        for i in range(self.parameters.number_of_read_replicas):
+            read_replica = self.create_read_replica(i + 1, self.paxos_nodes[i % self.number_of_nodes].node_id)
+            for paxos_node in self.paxos_nodes:
+                read_replica.connect_me_to_component(ConnectorTypes.PEER, paxos_node)
+                paxos_node.connect_me_to_component(ConnectorTypes.PEER, read_replica)
+            self.read_replicas.append(read_replica)
+            self.components.append(read_replica)
+
         # Create a client at bottom
-        self.client = ClientNode("ClientNode", 0)
+        self.client = ClientNode("ClientNode", 0, readnodeids=[replica.node_id for replica in self.read_replicas],
+                                 configurationparameters=self.parameters)
         self.components.append(self.client)
-        for i in range(self.number_of_nodes):
-            self.client.connect_me_to_component(ConnectorTypes.UP, self.components[i])
-            self.components[i].connect_me_to_component(ConnectorTypes.DOWN, self.client)
+        for node in self.paxos_nodes + self.read_replicas:
+            self.client.connect_me_to_component(ConnectorTypes.UP, node)
+            node.connect_me_to_component(ConnectorTypes.DOWN, self.client)
 
         # Create a heartbeat node at bottom
-        self.heartbeat = HeartbeatNode("HeartbeatNode", 0)
+        self.heartbeat = HeartbeatNode("HeartbeatNode", 0, configurationparameters=self.parameters)
         self.components.append(self.heartbeat)
-        for i in range(self.number_of_nodes):
-            self.heartbeat.connect_me_to_component(ConnectorTypes.UP, self.components[i])
-            self.components[i].connect_me_to_component(ConnectorTypes.DOWN, self.heartbeat)
+        for node in self.paxos_nodes + self.read_replicas:
+            self.heartbeat.connect_me_to_component(ConnectorTypes.UP, node)
+            node.connect_me_to_component(ConnectorTypes.DOWN, self.heartbeat)
 
         # Create a sleep trigger node at bottom
-        self.sleep_trigger = SleepTriggerNode("SleepTriggerNode", 0, self.number_of_nodes)
+        self.sleep_trigger = SleepTriggerNode("SleepTriggerNode", 0, self.number_of_nodes,
+                                              configurationparameters=self.parameters)
         self.components.append(self.sleep_trigger)
         for i in range(self.number_of_nodes):
             self.sleep_trigger.connect_me_to_component(ConnectorTypes.UP, self.components[i])
             self.components[i].connect_me_to_component(ConnectorTypes.DOWN, self.sleep_trigger)
 
+        # Emulate the links of the network topology between Paxos nodes and read replicas, if any
+        self.network_emulator = None
+        if self.parameters.network_topology is not None:
+            self.network_emulator = NetworkEmulator(self.paxos_nodes + self.read_replicas,
+                                                    NetworkTopology.load(self.parameters.network_topology))
+
+        # Inject the faults of the scenario, if any, in addition to the sleep trigger
+        self.fault_injector = None
+        if self.parameters.fault_scenario is not None:
+            self.fault_injector = FaultInjector(self.paxos_nodes + self.read_replicas,
+                                                FaultScenario.load(self.parameters.fault_scenario).seed)
+
+        for component in self.components:
+            Profiler.instrument(component)
+
         # self.client.connect_me_to_component(ConnectorTypes.DOWN, self)
         # self.connect_me_to_component(ConnectorTypes.UP, self.client)
 
+    def create_paxos_node(self, instance_number, members=None):
+        parameters = self.parameters
+        return PaxosNode("PaxosNode", instance_number, self.number_of_nodes, parameters.timeout_in_ms / 1000.0,
+                         parameters.election_timeout_jitter_in_ms / 1000.0, parameters.pre_vote_enabled,
+                         parameters.phase_1_quorum_size, parameters.phase_2_quorum_size,
+                         parameters.thrifty_replication, members, configurationparameters=parameters)
+
+    def create_read_replica(self, instance_number, feeder):
+        members = [paxos_node.node_id for paxos_node in self.paxos_nodes]
+        return PaxosNode("PaxosReadReplica", instance_number, self.number_of_nodes,
+                         self.parameters.timeout_in_ms / 1000.0, members=members, feeder=feeder,
+                         configurationparameters=self.parameters)
+
+    def add_paxos_node(self):
+        """
+        Creates a new Paxos node while the cluster is running, connects it to the other Paxos nodes and to the bottom
+        nodes, and asks the leader to add it to the configuration. The new node joins as a learner and becomes a
+        voting member after catching up.
+        :return: The new Paxos node.
+        """
+        current_members = self.current_configuration_holder().members
+        new_node = self.create_paxos_node(len(self.paxos_nodes) + 1, current_members)
+        for paxos_node in self.paxos_nodes:
+            new_node.connect_me_to_component(ConnectorTypes.PEER, paxos_node)
+            paxos_node.connect_me_to_component(ConnectorTypes.PEER, new_node)
+        for read_replica in self.read_replicas:
+            new_node.connect_me_to_component(ConnectorTypes.PEER, read_replica)
+            read_replica.connect_me_to_component(ConnectorTypes.PEER, new_node)
+        for bottom_node in (self.client, self.heartbeat, self.sleep_trigger):
+            bottom_node.connect_me_to_component(ConnectorTypes.UP, new_node)
+            new_node.connect_me_to_component(ConnectorTypes.DOWN, bottom_node)
+        self.paxos_nodes.append(new_node)
+        self.components.append(new_node)
+        if self.network_emulator is not None:
+            self.network_emulator.add_node(new_node)
+        Profiler.instrument(new_node)
+        self.sleep_trigger.number_of_nodes = len(self.paxos_nodes)
+        new_node.initiate_process()
+        self.request_reconfiguration({'add_node_id': new_node.node_id})
+        return new_node
+
+    def remove_paxos_node(self, node_id):
+        """
+        Asks the leader to remove the node from the voting members. The removed node stays connected but idle.
+        """
+        self.request_reconfiguration({'remove_node_id': node_id})
+
+    def request_reconfiguration(self, request):
+        for paxos_node in self.paxos_nodes:
+            paxos_node.trigger_event(Event(self, PaxosEventTypes.RECONFIGURE, request))
+
+    # The leader knows the latest configuration, any node is used if there is no leader
+    def current_configuration_holder(self):
+        for paxos_node in self.paxos_nodes:
+            if paxos_node.state == NodeStatus.PROPOSER:
+                return paxos_node
+        return self.paxos_nodes[0]
+
+
+def run_experiment(parameters=None):
+    """
+    Runs the experiment node for experiment_execution_in_secs seconds.
+    :param parameters: ExperimentParameters, a dictionary of parameters or None for the defaults.
+    :return: Dictionary of the parameters together with throughput (commands per second), latency summary, number of
+    leader changes, election duration summary, number of bytes sent to catch up lagging peers and number of busy
+    responses of the admission controller. If a trace file is
+    given, the traced commands are written to it. If profiling is enabled, the handler and queue depth profile is
+    logged and written to the profiling file if it is given. If a checkpoint file to restore is given, the Paxos nodes and
+    read replicas start from the checkpoint in it. If a checkpoint file is given, they are checkpointed to it at the
+    end.
+    """
+    parameters = ExperimentParameters.of(parameters)
+    Statistics.reset()
+    slow_command_in_ms = parameters.trace_slow_command_in_ms
+    Tracer.configure(parameters.trace_sample_rate, slow_command_in_ms / 1000.0 if slow_command_in_ms is not None else None)
+    Profiler.configure(parameters.profiling_enabled, parameters.profiling_sample_interval_in_ms / 1000.0,
+                       parameters.profiling_report_interval_in_secs)
+    node = Node("Node", 0, configurationparameters=parameters)
+    if parameters.restore_checkpoint_file is not None:
+        ClusterCheckpoint.read(parameters.restore_checkpoint_file).restore(node.paxos_nodes + node.read_replicas,
+                                                                          [node.client])
+    Profiler.start()
+    node.initiate_process()
+    logger.applog("Experiment started")
+    time.sleep(parameters.experiment_execution_in_secs)
+    logger.applog("Experiment stopped")
+    if node.fault_injector is not None:
+        node.fault_injector.stop()
+    checkpoint = None
+    if parameters.checkpoint_file is not None:
+        checkpoint = ClusterCheckpoint.take(node.paxos_nodes + node.read_replicas,
+                                            parameters.checkpoint_timeout_in_secs)
+        checkpoint_bytes = checkpoint.write(parameters.checkpoint_file)
+    if node.network_emulator is not None:
+        node.network_emulator.stop()
+    node.exit_process()
+    Profiler.stop()
+
+    result = parameters.as_dict()
+    latency_summary = Statistics.command_latency_summary()
+    result['throughput'] = latency_summary['count'] / parameters.experiment_execution_in_secs
+    for key in ('mean', 'p50', 'p90', 'p99'):
+        result[f'latency_{key}'] = latency_summary.get(key)
+    election_summary = Statistics.election_duration_summary()
+    result['leader_changes'] = Statistics.number_of_leader_changes
+    for key in ('mean', 'max'):
+        result[f'election_duration_{key}'] = election_summary.get(key)
+    result['catch_up_bytes'] = Statistics.catch_up_bytes
+    result['busy_responses'] = Statistics.busy_responses
+    if checkpoint is not None:
+        result.update(checkpoint.summary())
+        result['checkpoint_bytes'] = checkpoint_bytes
+    if parameters.trace_file is not None:
+        Tracer.export(parameters.trace_file)
+    if parameters.profiling_file is not None:
+        Profiler.dump(parameters.profiling_file)
+    return result
+
 
 def main():
     setAHCLogLevel(INFO)
-    topo = Topology()
-    topo.construct_single_node(Node, 0)
-    topo.start()
-    logger.applog("Topology started")
-    time.sleep(EXPERIMENT_EXECUTION_IN_SECS)
-    logger.applog("Topology stopped")
-    topo.exit()
+    run_experiment()
+    Statistics.log_summary()
 
 
 if __name__ == "__main__":
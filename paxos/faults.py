@@ -0,0 +1,345 @@
+"""
+Fault injection for Paxos experiments and benchmarks. A FaultInjector is attached to Paxos nodes and intercepts every
+event delivered to them, so that faults are applied where messages enter a node rather than inside its handlers: link
+faults drop, delay or duplicate messages between nodes, and node faults crash, restart, pause or skew the clock of
+nodes. Faults are scheduled from declarative scenario files, see the JSON files in the scenarios directory.
+
+A scenario is a JSON object with a name, an optional seed for the random decisions of the injector, an optional duration
+in seconds and a list of faults. Each fault has a type, the time it starts at in seconds and an optional duration after
+which it is reverted. Nodes are selected by node id, "leader" for the current proposers, "random:<count>" for randomly
+chosen running nodes or "*" for all nodes. The fault types and their parameters are:
+
+* crash (nodes): the nodes lose every event until they restart, which they do when the fault is reverted.
+* restart (nodes): crashed nodes restart as followers, keeping their log.
+* pause (nodes): the nodes keep the events they receive without handling them until the fault is reverted.
+* partition (groups): messages between nodes of different groups are lost, nodes not listed form one more group.
+* loss (from, to, probability): messages from the first to the second set of nodes are lost with the probability.
+* delay (from, to, min_ms, max_ms, reorder): messages are delayed by a uniformly distributed duration. Messages of a
+  link still arrive in the order they are sent, unless reorder is true.
+* duplicate (from, to, probability): messages are delivered twice with the probability, the copy right after the
+  message.
+* clock_skew (nodes, offset_ms, drift): clocks of the nodes are shifted and drift by the given seconds per second.
+* heal: every link fault and partition ends.
+
+Link faults without "from" or "to" apply to messages from or to any node. Links are FIFO: a message is not delivered
+before the messages sent earlier on its link, even once the delay that held them back is reverted.
+"""
+import heapq
+import json
+import os
+import random
+import time
+from threading import Thread, Condition, Lock
+
+from adhoccomputing.Generics import *
+
+from paxos.utils import NodeStatus
+
+FAULT_SCENARIO_DIRECTORY = os.path.join(os.path.dirname(os.path.abspath(__file__)), "scenarios")
+FAULT_TYPES = ("crash", "restart", "pause", "partition", "loss", "delay", "duplicate", "clock_skew", "heal")
+LINK_FAULT_TYPES = ("loss", "delay", "duplicate")
+
+
+class FaultScenario:
+    """
+    Declarative list of faults, loaded from a JSON file.
+    """
+
+    def __init__(self, name, faults, seed=None, duration=None):
+        for fault in faults:
+            if fault.get('type') not in FAULT_TYPES:
+                raise ValueError(f"Unknown fault type {fault.get('type')} in scenario {name}")
+        self.name = name
+        self.faults = sorted(faults, key=lambda fault: fault.get('at', 0))
+        self.seed = seed
+        self.duration = duration
+
+    @classmethod
+    def load(cls, path):
+        """
+        :param path: Path of a scenario file, or name of a scenario in FAULT_SCENARIO_DIRECTORY without extension.
+        """
+        if not os.path.exists(path):
+            path = os.path.join(FAULT_SCENARIO_DIRECTORY, path + ".json")
+        with open(path) as scenario_file:
+            description = json.load(scenario_file)
+        name = description.get('name', os.path.splitext(os.path.basename(path))[0])
+        return cls(name, description.get('faults', []), description.get('seed'), description.get('duration'))
+
+    @staticmethod
+    def available_names():
+        return sorted(os.path.splitext(file_name)[0] for file_name in os.listdir(FAULT_SCENARIO_DIRECTORY)
+                      if file_name.endswith(".json"))
+
+
+class LinkFault:
+    """
+    Loss, delay or duplication of messages sent from a set of nodes to another, None meaning any node.
+    """
+
+    def __init__(self, fault_type, source_ids=None, destination_ids=None, probability=1.0, min_delay=0.0,
+                 max_delay=0.0, reorder=False):
+        """
+        :param reorder: Whether delayed messages may overtake each other.
+        """
+        self.type = fault_type
+        self.source_ids = source_ids
+        self.destination_ids = destination_ids
+        self.probability = probability
+        self.min_delay = min_delay
+        self.max_delay = max_delay
+        self.reorder = reorder
+
+    def matches(self, source_id, destination_id):
+        return (self.source_ids is None or source_id in self.source_ids) and \
+            (self.destination_ids is None or destination_id in self.destination_ids)
+
+
+class Scheduler:
+    """
+    Calls functions at given times from a single thread, so that delays never block the handler thread of a node.
+    Functions scheduled for the same time are called in the order they are scheduled.
+    """
+
+    def __init__(self):
+        self.scheduled = []  # heap of (time, sequence number, function, arguments)
+        self.sequence_number = 0
+        self.condition = Condition()
+        self.running = False
+
+    def start(self):
+        self.running = True
+        scheduler_thread = Thread(target=self.run, daemon=True)
+        scheduler_thread.start()
+
+    def stop(self):
+        """
+        Stops the thread, functions that are not called yet are dropped.
+        """
+        with self.condition:
+            self.running = False
+            self.scheduled = []
+            self.condition.notify()
+
+    def schedule(self, at_time, function, *args):
+        with self.condition:
+            heapq.heappush(self.scheduled, (at_time, self.sequence_number, function, args))
+            self.sequence_number += 1
+            self.condition.notify()
+
+    def run(self):
+        while True:
+            with self.condition:
+                if not self.running:
+                    return
+                if not self.scheduled:
+                    self.condition.wait()
+                    continue
+                wait_time = self.scheduled[0][0] - time.time()
+                if wait_time > 0:
+                    self.condition.wait(wait_time)
+                    continue
+                _, _, function, args = heapq.heappop(self.scheduled)
+            function(*args)
+
+
+class FaultInjector:
+    """
+    Applies faults to the messages exchanged by the given nodes and to the nodes themselves. Faults are started and
+    reverted, and delayed messages are delivered, by a Scheduler, so that no handler thread of a node is ever blocked.
+    Random decisions use a generator seeded by the scenario, which makes runs repeatable as far as thread scheduling
+    allows.
+    """
+
+    def __init__(self, nodes, seed=None):
+        self.nodes = {node.node_id: node for node in nodes}
+        self.random = random.Random(seed)
+        self.link_faults = []
+        self.partition = None  # for each node id in a partition, the number of its group
+        self.scheduler = Scheduler()
+        self.lock = Lock()
+        self.scenario = None
+        self.last_delivery_times = {}  # for each (source id, destination id) link, delivery time of its last message
+        self.pending_messages = {}  # for each link, number of its messages waiting for the scheduler
+        self.dropped_messages = 0
+        self.delayed_messages = 0
+        self.duplicated_messages = 0
+        for node in nodes:
+            node.fault_injector = self
+
+    def start(self, scenario=None):
+        """
+        Starts the scheduler thread and schedules the faults of the scenario, relative to now.
+        """
+        self.scheduler.start()
+        if scenario is not None:
+            self.scenario = scenario
+            if scenario.seed is not None:
+                self.random.seed(scenario.seed)
+            start_time = time.time()
+            for fault in scenario.faults:
+                self.scheduler.schedule(start_time + fault.get('at', 0), self.start_fault, fault)
+
+    def stop(self):
+        """
+        Stops the scheduler and detaches the injector. Crashed and paused nodes are left as they are.
+        """
+        self.scheduler.stop()
+        for node in self.nodes.values():
+            node.fault_injector = None
+
+    def on_event(self, node, eventobj: Event):
+        """
+        Called by a node for every event delivered to it. Events from the node itself or from the bottom layer are
+        delivered directly, messages from other nodes are subject to the link faults.
+        """
+        source_id = self.source_of(eventobj)
+        if source_id is None or source_id == node.node_id or source_id not in self.nodes:
+            node.deliver_event(eventobj)
+            return
+        with self.lock:
+            if self.partition is not None and self.partition.get(source_id, -1) != self.partition.get(node.node_id, -1):
+                self.dropped_messages += 1
+                return
+            delay = 0.0
+            reorder = False
+            copies = 1
+            for link_fault in self.link_faults:
+                if not link_fault.matches(source_id, node.node_id):
+                    continue
+                if link_fault.type == "loss" and self.random.random() < link_fault.probability:
+                    self.dropped_messages += 1
+                    return
+                elif link_fault.type == "delay":
+                    delay += self.random.uniform(link_fault.min_delay, link_fault.max_delay)
+                    reorder = reorder or link_fault.reorder
+                elif link_fault.type == "duplicate" and self.random.random() < link_fault.probability:
+                    copies = 2
+            if delay > 0:
+                self.delayed_messages += 1
+            self.duplicated_messages += copies - 1
+            link = (source_id, node.node_id)
+            delivery_time = time.time() + delay
+            if not reorder:
+                # Not before the messages sent earlier on the link
+                delivery_time = max(delivery_time, self.last_delivery_times.get(link, 0.0))
+                self.last_delivery_times[link] = delivery_time
+            scheduled = delay > 0 or self.pending_messages.get(link, 0) > 0
+            if scheduled:
+                self.pending_messages[link] = self.pending_messages.get(link, 0) + copies
+        for _ in range(copies):
+            if scheduled:
+                # Messages scheduled at the same time are delivered in the order they are scheduled
+                self.scheduler.schedule(delivery_time, self.deliver_delayed, node, link, eventobj)
+            else:
+                node.deliver_event(eventobj)
+
+    def deliver_delayed(self, node, link, eventobj: Event):
+        node.deliver_event(eventobj)
+        with self.lock:
+            self.pending_messages[link] -= 1
+
+    @staticmethod
+    def source_of(eventobj: Event):
+        header = getattr(eventobj.eventcontent, 'header', None)
+        if header is not None:
+            return header.messagefrom
+        return getattr(eventobj.eventsource, 'node_id', None)
+
+    def select_nodes(self, selector):
+        """
+        :param selector: Node id, "leader", "random:<count>", "*" or a list of them.
+        :return: List of the selected nodes.
+        """
+        if selector is None or selector == "*":
+            return list(self.nodes.values())
+        if isinstance(selector, str):
+            selector = [selector]
+        selected = []
+        for name in selector:
+            if name == "*":
+                candidates = list(self.nodes.values())
+            elif name == "leader":
+                candidates = [node for node in self.nodes.values() if node.state == NodeStatus.PROPOSER]
+            elif name.startswith("random:"):
+                running_nodes = [node for node in self.nodes.values() if not node.crashed and node not in selected]
+                candidates = self.random.sample(running_nodes, min(int(name.split(":", 1)[1]), len(running_nodes)))
+            elif name in self.nodes:
+                candidates = [self.nodes[name]]
+            else:
+                raise ValueError(f"Unknown node {name} in fault scenario")
+            selected.extend(node for node in candidates if node not in selected)
+        return selected
+
+    def select_node_ids(self, selector):
+        if selector is None:
+            return None
+        return {node.node_id for node in self.select_nodes(selector)}
+
+    def start_fault(self, fault):
+        """
+        Applies the fault and schedules its revert if it has a duration. Nodes are selected when the fault starts, and
+        the same nodes are used to revert it.
+        """
+        fault_type = fault['type']
+        logger.critical(f"Fault injector starts {fault}")
+        revert = None
+        if fault_type in ("crash", "restart", "pause", "clock_skew"):
+            nodes = self.select_nodes(fault.get('nodes'))
+            if fault_type == "crash":
+                for node in nodes:
+                    node.crash()
+                revert = lambda: [node.restart() for node in nodes]
+            elif fault_type == "restart":
+                for node in nodes:
+                    node.restart()
+            elif fault_type == "pause":
+                for node in nodes:
+                    node.pause()
+                revert = lambda: [node.resume() for node in nodes]
+            else:
+                for node in nodes:
+                    node.set_clock_skew(fault.get('offset_ms', 0) / 1000.0, fault.get('drift', 0.0))
+                revert = lambda: [node.set_clock_skew(0.0) for node in nodes]
+        elif fault_type == "partition":
+            partition = {}
+            for group_number, group in enumerate(fault['groups']):
+                for node in self.select_nodes(group):
+                    partition[node.node_id] = group_number
+            with self.lock:
+                self.partition = partition
+            revert = self.heal_partition
+        elif fault_type in LINK_FAULT_TYPES:
+            link_fault = LinkFault(fault_type, self.select_node_ids(fault.get('from')),
+                                   self.select_node_ids(fault.get('to')), fault.get('probability', 1.0),
+                                   fault.get('min_ms', 0) / 1000.0, fault.get('max_ms', 0) / 1000.0,
+                                   fault.get('reorder', False))
+            with self.lock:
+                self.link_faults.append(link_fault)
+            revert = lambda: self.remove_link_fault(link_fault)
+        elif fault_type == "heal":
+            with self.lock:
+                self.link_faults = []
+                self.partition = None
+        if revert is not None and fault.get('duration') is not None:
+            self.scheduler.schedule(time.time() + fault['duration'], self.revert_fault, fault, revert)
+
+    def revert_fault(self, fault, revert):
+        logger.critical(f"Fault injector reverts {fault}")
+        revert()
+
+    def heal_partition(self):
+        with self.lock:
+            self.partition = None
+
+    def remove_link_fault(self, link_fault):
+        with self.lock:
+            if link_fault in self.link_faults:
+                self.link_faults.remove(link_fault)
+
+    def summary(self):
+        return {
+            'dropped_messages': self.dropped_messages,
+            'delayed_messages': self.delayed_messages,
+            'duplicated_messages': self.duplicated_messages
+        }
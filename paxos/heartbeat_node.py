@@ -1,16 +1,19 @@
 import time
+from threading import Thread
 
 from adhoccomputing.GenericModel import GenericModel
 from adhoccomputing.Generics import Event
 
-from paxos.utils import NodeStatus, PaxosEventTypes, HEARTBEAT_IN_MS
+from paxos.parameters import ExperimentParameters
+from paxos.utils import NodeStatus, PaxosEventTypes
 
 
 class HeartbeatNode(GenericModel):
     """
     Heartbeat node sends heartbeat events to the cluster. It sends heartbeat events to upper layer so that
     Paxos or Raft nodes can check time passed since the last time they heard from the leader or can follow
-    timeout durations before transitioning to another state.
+    timeout durations before transitioning to another state. Heartbeats are sent every heartbeat_in_ms milliseconds of the
+    ExperimentParameters given as configurationparameters.
     """
 
     def __init__(self, componentname, componentinstancenumber, context=None, configurationparameters=None,
@@ -20,9 +23,15 @@ class HeartbeatNode(GenericModel):
         self.expected_state_machine_value = 0
         self.state = NodeStatus.HEARTBEAT
         self.node_id = componentname + '_' + str(componentinstancenumber)
+        self.heartbeat_interval = ExperimentParameters.of(configurationparameters).heartbeat_in_ms / 1000.0
 
     def on_init(self, eventobj: Event):
+        # Heartbeats are sent from a separate thread, so that the node can still handle the exit event
+        heartbeat_thread = Thread(target=self.send_heartbeats, daemon=True)
+        heartbeat_thread.start()
+
+    def send_heartbeats(self):
         heartbeat_event = Event(self, PaxosEventTypes.HEARTBEAT, None)
-        while True:
+        while not self.terminated:
             self.send_up(heartbeat_event)
-            time.sleep(HEARTBEAT_IN_MS / 1000.0)
+            time.sleep(self.heartbeat_interval)
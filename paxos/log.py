@@ -1,31 +1,109 @@
+import pickle
+
 from paxos.utils import Command, CommandTypes
 
 
 class LogEntry:
-    def __init__(self, term, command: Command, creator_id, index=None):
+    def __init__(self, term, command: Command, creator_id, index=None, fragment=None):
+        """
+        :param fragment: Fragment of the payload of the command with erasure coded replication, the command has no
+        payload then, see paxos/erasure.py.
+        """
         self.term = term
         self.command = command
         self.creator_id = creator_id
         self.index = index
+        self.fragment = fragment
+        self.fragment_entries = None  # Leader only, members and entries with the fragment of each member
+        self.serialized_size = None
+
+    def size(self):
+        """
+        Size of the entry in bytes when it is sent to another process, computed once since commands do not change.
+        """
+        if self.serialized_size is None:
+            self.serialized_size = len(pickle.dumps(self))
+        return self.serialized_size
+
+    def without_fragment(self):
+        return LogEntry(self.term, self.command, self.creator_id, self.index)
+
+    def __getstate__(self):
+        # Cached values are not sent
+        state = dict(self.__dict__)
+        state['fragment_entries'] = None
+        state['serialized_size'] = None
+        return state
 
     def __eq__(self, other):
         return self.term == other.term and self.command == other.command and self.creator_id == other.creator_id
 
     def __str__(self):
-        return f"LogEntry(term={self.term}, command={self.command}, creator_id={self.creator_id}, index={self.index})"
+        fragment = f", fragment={self.fragment}" if self.fragment is not None else ""
+        return f"LogEntry(term={self.term}, command={self.command}, creator_id={self.creator_id}, index={self.index}" \
+               f"{fragment})"
 
 
 class PaxosLog:
+    """
+    Log of a Paxos node, indexed by the position of entries in the whole log. Entries covered by a snapshot can be
+    compacted, i.e. dropped from memory. The last compacted entry is kept as the first entry, so that its term can still
+    be compared with proposals, but it is not sent to peers anymore. Length of the log is the index of its last entry
+    plus one, as if no entry was compacted.
+    """
+
     def __init__(self):
         self.entries = []
         self.entries.append(LogEntry(0, Command(0, CommandTypes.NOOP, 0), None))
+        self.snapshot_index = 0  # Index of the first kept entry, entries before it are compacted
+
+    def __len__(self):
+        return self.snapshot_index + len(self.entries)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            start = self.snapshot_index if index.start is None else max(index.start, self.snapshot_index)
+            stop = len(self) if index.stop is None else index.stop
+            return self.entries[start - self.snapshot_index:max(stop - self.snapshot_index, 0)]
+        if index < 0:
+            return self.entries[index]
+        if index < self.snapshot_index:
+            raise IndexError(f"Log entry {index} is compacted, the log starts at {self.snapshot_index}")
+        return self.entries[index - self.snapshot_index]
+
+    def __setitem__(self, index, log_entry: LogEntry):
+        self.entries[index - self.snapshot_index] = log_entry
 
     def append_entry(self, log_entry: LogEntry):
         self.entries.append(log_entry)
 
     # Remove all log entries coming after given index
     def truncate(self, index):
-        self.entries = self.entries[:index]
+        self.entries = self.entries[:max(index - self.snapshot_index, 1)]
+
+    def compact(self, index):
+        """
+        Drops the entries before the given index, which must be covered by a snapshot.
+        """
+        if index > self.snapshot_index:
+            self.entries = self.entries[index - self.snapshot_index:]
+            self.snapshot_index = index
+
+    def reset(self, index, term):
+        """
+        Drops all entries, the log restarts after a snapshot installed from another node, which covers the entries up
+        to the given index whose last entry has the given term.
+        """
+        self.entries = [LogEntry(term, Command(0, CommandTypes.NOOP, 0), None, index)]
+        self.snapshot_index = index
 
     def append_entries(self, entries):
         self.entries.extend(entries)
+
+    def restore(self, snapshot_index, entries):
+        """
+        Replaces the log with the entries recorded in a checkpoint of the cluster, the first one being the last compacted
+        entry at the given index.
+        """
+        self.entries = list(entries)
+        self.snapshot_index = snapshot_index
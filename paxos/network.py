@@ -0,0 +1,322 @@
+"""
+Link emulation for Paxos experiments and benchmarks. Peers of the same process exchange messages instantly in memory,
+a NetworkEmulator attached to the Paxos nodes delays every message between them as if it crossed a real link instead:
+it waits for the link to transmit the queued messages before it at the bandwidth of the link, then for a latency drawn
+from the latency distribution of the link. Messages may also be lost, dropped because the queue of the link is full, or
+reordered. Links are set up from declarative topology files, see the JSON files in the topologies directory.
+
+A topology is a JSON object with a name, an optional seed for the random decisions of the emulator, a list of regions
+and a list of links. Nodes are placed in the regions in turn, in the order they are given to the emulator, unless the
+topology has a "placement" object mapping node ids to regions. Each link has "from" and "to" regions, which may be the
+same for the links inside a region, and applies in both directions. Links between regions without a link use the
+"default_link" of the topology, or deliver instantly if there is none. A link has the following optional parameters:
+
+* latency: one-way latency distribution, an object with a "distribution" and its parameters in milliseconds:
+
+  * constant: value_ms
+  * uniform: min_ms, max_ms
+  * normal: mean_ms, stddev_ms
+  * lognormal: median_ms, sigma
+  * pareto: min_ms, alpha (heavy tailed)
+
+  Any distribution may have a max_ms at which latencies are capped.
+* bandwidth_mbps: bandwidth in megabits per second, unlimited if missing.
+* queue_limit_kb: size of the queue of the link, messages arriving at a full queue are dropped. Unlimited if missing.
+* loss: probability that a message is lost.
+* reorder: probability that a message is held back by up to reorder_ms, so that later messages overtake it. Other
+  messages are delivered in the order they are sent.
+"""
+import json
+import math
+import os
+import random
+import time
+from threading import Lock
+
+from adhoccomputing.Generics import *
+
+from paxos.faults import Scheduler
+
+NETWORK_TOPOLOGY_DIRECTORY = os.path.join(os.path.dirname(os.path.abspath(__file__)), "topologies")
+LATENCY_DISTRIBUTIONS = ("constant", "uniform", "normal", "lognormal", "pareto")
+MESSAGE_HEADER_SIZE_IN_BYTES = 128  # Estimated size of a message without its entries or snapshot data
+
+
+class LatencyDistribution:
+    """
+    Distribution of the one-way latency of a link, sampled in seconds.
+    """
+
+    def __init__(self, distribution="constant", parameters=None):
+        if distribution not in LATENCY_DISTRIBUTIONS:
+            raise ValueError(f"Unknown latency distribution {distribution}")
+        self.distribution = distribution
+        self.parameters = {key: value / 1000.0 if key.endswith("_ms") else value
+                           for key, value in (parameters or {}).items()}
+
+    @classmethod
+    def from_description(cls, description):
+        if description is None:
+            return cls("constant", {'value_ms': 0})
+        parameters = dict(description)
+        return cls(parameters.pop('distribution', "constant"), parameters)
+
+    def sample(self, generator):
+        parameters = self.parameters
+        if self.distribution == "constant":
+            latency = parameters.get('value_ms', 0.0)
+        elif self.distribution == "uniform":
+            latency = generator.uniform(parameters['min_ms'], parameters['max_ms'])
+        elif self.distribution == "normal":
+            latency = generator.gauss(parameters['mean_ms'], parameters.get('stddev_ms', 0.0))
+        elif self.distribution == "lognormal":
+            latency = parameters['median_ms'] * math.exp(generator.gauss(0.0, parameters.get('sigma', 0.0)))
+        else:
+            latency = parameters['min_ms'] * generator.paretovariate(parameters['alpha'])
+        return min(max(latency, 0.0), parameters.get('max_ms', math.inf))
+
+
+class LinkModel:
+    """
+    Parameters of the links between two regions, see the module documentation.
+    """
+
+    def __init__(self, latency=None, bandwidth=None, queue_limit=None, loss=0.0, reorder=0.0, reorder_delay=0.0):
+        """
+        :param latency: LatencyDistribution of the one-way latency.
+        :param bandwidth: Bandwidth in bytes per second, None means unlimited.
+        :param queue_limit: Size of the queue in bytes, None means unlimited.
+        :param loss: Probability that a message is lost.
+        :param reorder: Probability that a message is held back by up to reorder_delay seconds.
+        """
+        self.latency = latency or LatencyDistribution()
+        self.bandwidth = bandwidth
+        self.queue_limit = queue_limit
+        self.loss = loss
+        self.reorder = reorder
+        self.reorder_delay = reorder_delay
+
+    @classmethod
+    def from_description(cls, description):
+        bandwidth = description.get('bandwidth_mbps')
+        queue_limit = description.get('queue_limit_kb')
+        return cls(LatencyDistribution.from_description(description.get('latency')),
+                   bandwidth * 1000 * 1000 / 8 if bandwidth is not None else None,
+                   queue_limit * 1024 if queue_limit is not None else None,
+                   description.get('loss', 0.0), description.get('reorder', 0.0),
+                   description.get('reorder_ms', 0) / 1000.0)
+
+
+class Link:
+    """
+    Directed link between two nodes. The link transmits one message at a time, so a message waits until the link has
+    transmitted the messages queued before it.
+    """
+
+    def __init__(self, model: LinkModel):
+        self.model = model
+        self.busy_until = 0.0  # Time the link finishes transmitting the queued messages
+        self.last_delivery_time = 0.0  # Delivery time of the last message that is not reordered
+
+    def queued_bytes(self, now):
+        if self.model.bandwidth is None:
+            return 0
+        return max(self.busy_until - now, 0.0) * self.model.bandwidth
+
+
+class NetworkTopology:
+    """
+    Regions of the nodes and models of the links between them, loaded from a JSON file.
+    """
+
+    def __init__(self, name, regions, links, default_link=None, placement=None, seed=None):
+        """
+        :param regions: List of region names.
+        :param links: Dictionary of LinkModel by (region, region) pair, in both orders.
+        :param default_link: LinkModel of the pairs of regions without a link, None means instant delivery.
+        :param placement: Dictionary of region by node id, for the nodes which are not placed in turn.
+        """
+        self.name = name
+        self.regions = regions
+        self.links = links
+        self.default_link = default_link
+        self.placement = placement or {}
+        self.seed = seed
+
+    @classmethod
+    def load(cls, path):
+        """
+        :param path: Path of a topology file, or name of a topology in NETWORK_TOPOLOGY_DIRECTORY without extension.
+        """
+        if not os.path.exists(path):
+            path = os.path.join(NETWORK_TOPOLOGY_DIRECTORY, path + ".json")
+        with open(path) as topology_file:
+            description = json.load(topology_file)
+        name = description.get('name', os.path.splitext(os.path.basename(path))[0])
+        regions = description['regions']
+        links = {}
+        for link_description in description.get('links', []):
+            for region in (link_description['from'], link_description['to']):
+                if region not in regions:
+                    raise ValueError(f"Unknown region {region} in topology {name}")
+            link_model = LinkModel.from_description(link_description)
+            links[(link_description['from'], link_description['to'])] = link_model
+            links[(link_description['to'], link_description['from'])] = link_model
+        default_link = None
+        if description.get('default_link') is not None:
+            default_link = LinkModel.from_description(description['default_link'])
+        return cls(name, regions, links, default_link, description.get('placement'), description.get('seed'))
+
+    @staticmethod
+    def available_names():
+        return sorted(os.path.splitext(file_name)[0] for file_name in os.listdir(NETWORK_TOPOLOGY_DIRECTORY)
+                      if file_name.endswith(".json"))
+
+    def place(self, node_ids):
+        """
+        :return: Dictionary of region by node id.
+        """
+        regions = {}
+        for node_number, node_id in enumerate(node_ids):
+            regions[node_id] = self.placement.get(node_id, self.regions[node_number % len(self.regions)])
+        return regions
+
+    def link_model(self, source_region, destination_region):
+        return self.links.get((source_region, destination_region), self.default_link)
+
+
+class NetworkEmulator:
+    """
+    Delays the messages exchanged by the given nodes as if they crossed the links of the topology. Messages are handed
+    to the nodes by a Scheduler when they arrive, so that no handler thread of a node is ever blocked. Events which
+    are not messages of another emulated node, such as heartbeats and client requests, are delivered immediately.
+    Messages leaving the network pass through the fault injector of the node, if any.
+    """
+
+    def __init__(self, nodes, topology: NetworkTopology):
+        self.nodes = {node.node_id: node for node in nodes}
+        self.topology = topology
+        self.random = random.Random(topology.seed)
+        self.regions = topology.place(list(self.nodes.keys()))
+        self.links = {}  # Link by (source node id, destination node id), created on first use
+        self.scheduler = Scheduler()
+        self.lock = Lock()
+        self.delivered_messages = 0
+        self.lost_messages = 0
+        self.queue_dropped_messages = 0
+        self.reordered_messages = 0
+        self.total_delay = 0.0
+        self.total_queueing_delay = 0.0
+        for node in nodes:
+            node.network = self
+
+    def start(self):
+        self.scheduler.start()
+
+    def stop(self):
+        """
+        Stops the scheduler and detaches the emulator. Messages still in flight are lost.
+        """
+        self.scheduler.stop()
+        for node in self.nodes.values():
+            node.network = None
+
+    def add_node(self, node):
+        """
+        Attaches a node created after the emulator, it is placed in the next region in turn.
+        """
+        with self.lock:
+            self.nodes[node.node_id] = node
+            self.regions = self.topology.place(list(self.nodes.keys()))
+        node.network = self
+
+    def region_of(self, node_id):
+        return self.regions.get(node_id)
+
+    def link(self, source_id, destination_id):
+        link = self.links.get((source_id, destination_id))
+        if link is None:
+            link_model = self.topology.link_model(self.regions[source_id], self.regions[destination_id])
+            if link_model is None:
+                return None
+            link = self.links[(source_id, destination_id)] = Link(link_model)
+        return link
+
+    def on_event(self, node, eventobj: Event):
+        """
+        Called by a node for every event delivered to it. Messages of other emulated nodes addressed to the node are
+        sent over the link between them, other events are delivered directly. Messages addressed to other nodes are
+        not emulated either, they reach the node only because peers share their connectors and are ignored anyway.
+        """
+        header = getattr(eventobj.eventcontent, 'header', None)
+        source_id = header.messagefrom if header is not None else None
+        if source_id is None or source_id == node.node_id or source_id not in self.nodes or \
+                header.messageto not in (None, node.node_id):
+            node.receive_from_network(eventobj)
+            return
+        with self.lock:
+            link = self.link(source_id, node.node_id)
+            if link is not None:
+                delivery_time = self.transmit(link, message_size(eventobj.eventcontent))
+        if link is None:
+            node.receive_from_network(eventobj)
+        elif delivery_time is not None:
+            self.scheduler.schedule(delivery_time, node.receive_from_network, eventobj)
+
+    def transmit(self, link: Link, size):
+        """
+        Queues the message on the link.
+        :return: Time the message arrives, or None if it is lost or dropped.
+        """
+        model = link.model
+        now = time.time()
+        if model.loss > 0 and self.random.random() < model.loss:
+            self.lost_messages += 1
+            return None
+        if model.queue_limit is not None and link.queued_bytes(now) + size > model.queue_limit:
+            self.queue_dropped_messages += 1
+            return None
+        sent_time = now
+        if model.bandwidth is not None:
+            transmission_start_time = max(now, link.busy_until)
+            self.total_queueing_delay += transmission_start_time - now
+            sent_time = link.busy_until = transmission_start_time + size / model.bandwidth
+        delivery_time = sent_time + model.latency.sample(self.random)
+        if model.reorder > 0 and self.random.random() < model.reorder:
+            delivery_time += self.random.uniform(0, model.reorder_delay)
+            self.reordered_messages += 1
+        else:
+            # Messages of a link arrive in order unless they are reordered on purpose
+            delivery_time = max(delivery_time, link.last_delivery_time)
+            link.last_delivery_time = delivery_time
+        self.delivered_messages += 1
+        self.total_delay += delivery_time - now
+        return delivery_time
+
+    def summary(self):
+        delivered_messages = max(self.delivered_messages, 1)
+        return {
+            'delivered_messages': self.delivered_messages,
+            'lost_messages': self.lost_messages,
+            'queue_dropped_messages': self.queue_dropped_messages,
+            'reordered_messages': self.reordered_messages,
+            'network_delay_mean': self.total_delay / delivered_messages,
+            'queueing_delay_mean': self.total_queueing_delay / delivered_messages
+        }
+
+
+def message_size(message):
+    """
+    Estimates the size of a message in bytes from the size of the entries and snapshot data it carries, so that
+    messages are not serialized only to be measured.
+    """
+    size = MESSAGE_HEADER_SIZE_IN_BYTES
+    payload = getattr(message, 'payload', None)
+    if isinstance(payload, dict):
+        for entry in payload.get('entries') or ():
+            size += entry.size() if hasattr(entry, 'size') else MESSAGE_HEADER_SIZE_IN_BYTES
+        if isinstance(payload.get('data'), bytes):
+            size += len(payload['data'])
+        if payload.get('snapshot') is not None:
+            size += payload['snapshot'].size()
+    return size
@@ -0,0 +1,143 @@
+from paxos.utils import EXPERIMENT_EXECUTION_IN_SECS, NUMBER_OF_PAXOS_NODES, TIMEOUT_IN_MS, ELECTION_TIMEOUT_JITTER_IN_MS, \
+    PRE_VOTE_ENABLED, HEARTBEAT_IN_MS, CLIENT_REQUEST_INTERVAL_IN_MS, ALLOW_LEADER_IN_NODES_TO_SLEEP, \
+    NUMBER_OF_NODES_TO_SLEEP, SLEEP_TRIGGER_INTERVAL, SLEEP_TIME, ALWAYS_SLEEP_LEADER, TRANSFER_LEADERSHIP_BEFORE_SLEEP, \
+    PHASE_1_QUORUM_SIZE, PHASE_2_QUORUM_SIZE, THRIFTY_REPLICATION, ACCEPT_TIMEOUT_IN_MS, CATCH_UP_INTERVAL_IN_MS, \
+    MAX_ENTRIES_PER_PROPOSE, MAX_BYTES_PER_PROPOSE, CATCH_UP_RATE_LIMIT_IN_BYTES_PER_SEC, SNAPSHOT_INTERVAL_IN_ENTRIES, \
+    ADMISSION_MAX_IN_FLIGHT_ENTRIES, ADMISSION_QUEUE_TIME_TARGET_IN_MS, ADMISSION_QUEUE_TIME_INTERVAL_IN_MS, \
+    CLIENT_BUSY_BACKOFF_IN_MS, CLIENT_MAX_BUSY_BACKOFF_IN_MS, FAST_PATH_ENABLED, FAST_PATH_REPORT_INTERVAL_IN_MS, \
+    FAST_PATH_MAX_PENDING_COMMANDS, CLIENT_NON_COMMUTING_COMMAND_RATIO, PIPELINE_ENABLED, PIPELINE_SEND_QUEUE_SIZE, \
+    PIPELINE_APPLY_QUEUE_SIZE, ERASURE_CODING_ENABLED, ERASURE_CODING_DATA_FRAGMENTS, \
+    ERASURE_CODING_MIN_PAYLOAD_SIZE_IN_BYTES, CLIENT_COMMAND_PAYLOAD_SIZE_IN_BYTES, \
+    SNAPSHOT_RETAINED_ENTRIES, SNAPSHOT_MEMORY_LIMIT_IN_BYTES, NUMBER_OF_READ_REPLICAS, PAUSED_EVENT_BUFFER_SIZE, \
+    FAULT_SCENARIO, NETWORK_TOPOLOGY, TRACE_SAMPLE_RATE, TRACE_SLOW_COMMAND_IN_MS, TRACE_FILE, \
+    PROFILING_ENABLED, PROFILING_SAMPLE_INTERVAL_IN_MS, PROFILING_REPORT_INTERVAL_IN_SECS, PROFILING_FILE, \
+    CHECKPOINT_FILE, RESTORE_CHECKPOINT_FILE, CHECKPOINT_TIMEOUT_IN_SECS
+
+
+class ExperimentParameters:
+    """
+    Parameters of an experiment, passed as configurationparameters to the experiment node which passes them on to every
+    node it creates. Each parameter is named after the constant of paxos/utils.py giving its default value, in lower
+    case, see the comments there.
+    """
+
+    def __init__(self, **parameters):
+        """
+        :param parameters: Values of the parameters that differ from the defaults.
+        :raises ValueError: If a parameter does not exist.
+        """
+        self.experiment_execution_in_secs = EXPERIMENT_EXECUTION_IN_SECS
+        self.number_of_paxos_nodes = NUMBER_OF_PAXOS_NODES
+        self.number_of_read_replicas = NUMBER_OF_READ_REPLICAS
+
+        # Elections
+        self.timeout_in_ms = TIMEOUT_IN_MS
+        self.election_timeout_jitter_in_ms = ELECTION_TIMEOUT_JITTER_IN_MS
+        self.pre_vote_enabled = PRE_VOTE_ENABLED
+        self.heartbeat_in_ms = HEARTBEAT_IN_MS
+        self.phase_1_quorum_size = PHASE_1_QUORUM_SIZE
+        self.phase_2_quorum_size = PHASE_2_QUORUM_SIZE
+
+        # Replication
+        self.thrifty_replication = THRIFTY_REPLICATION
+        self.accept_timeout_in_ms = ACCEPT_TIMEOUT_IN_MS
+        self.catch_up_interval_in_ms = CATCH_UP_INTERVAL_IN_MS
+        self.max_entries_per_propose = MAX_ENTRIES_PER_PROPOSE
+        self.max_bytes_per_propose = MAX_BYTES_PER_PROPOSE
+        self.catch_up_rate_limit_in_bytes_per_sec = CATCH_UP_RATE_LIMIT_IN_BYTES_PER_SEC
+        self.snapshot_interval_in_entries = SNAPSHOT_INTERVAL_IN_ENTRIES
+        self.snapshot_retained_entries = SNAPSHOT_RETAINED_ENTRIES
+        self.snapshot_memory_limit_in_bytes = SNAPSHOT_MEMORY_LIMIT_IN_BYTES
+
+        # Admission control
+        self.admission_max_in_flight_entries = ADMISSION_MAX_IN_FLIGHT_ENTRIES
+        self.admission_queue_time_target_in_ms = ADMISSION_QUEUE_TIME_TARGET_IN_MS
+        self.admission_queue_time_interval_in_ms = ADMISSION_QUEUE_TIME_INTERVAL_IN_MS
+
+        # Fast path of commuting commands
+        self.fast_path_enabled = FAST_PATH_ENABLED
+        self.fast_path_report_interval_in_ms = FAST_PATH_REPORT_INTERVAL_IN_MS
+        self.fast_path_max_pending_commands = FAST_PATH_MAX_PENDING_COMMANDS
+
+        # Pipeline
+        self.pipeline_enabled = PIPELINE_ENABLED
+        self.pipeline_send_queue_size = PIPELINE_SEND_QUEUE_SIZE
+        self.pipeline_apply_queue_size = PIPELINE_APPLY_QUEUE_SIZE
+
+        # Erasure coded replication
+        self.erasure_coding_enabled = ERASURE_CODING_ENABLED
+        self.erasure_coding_data_fragments = ERASURE_CODING_DATA_FRAGMENTS
+        self.erasure_coding_min_payload_size_in_bytes = ERASURE_CODING_MIN_PAYLOAD_SIZE_IN_BYTES
+
+        # Client
+        self.client_request_interval_in_ms = CLIENT_REQUEST_INTERVAL_IN_MS
+        self.client_busy_backoff_in_ms = CLIENT_BUSY_BACKOFF_IN_MS
+        self.client_max_busy_backoff_in_ms = CLIENT_MAX_BUSY_BACKOFF_IN_MS
+        self.client_non_commuting_command_ratio = CLIENT_NON_COMMUTING_COMMAND_RATIO
+        self.client_command_payload_size_in_bytes = CLIENT_COMMAND_PAYLOAD_SIZE_IN_BYTES
+
+        # Sleep trigger and faults
+        self.allow_leader_in_nodes_to_sleep = ALLOW_LEADER_IN_NODES_TO_SLEEP
+        self.number_of_nodes_to_sleep = NUMBER_OF_NODES_TO_SLEEP
+        self.sleep_trigger_interval = SLEEP_TRIGGER_INTERVAL
+        self.sleep_time = SLEEP_TIME
+        self.always_sleep_leader = ALWAYS_SLEEP_LEADER
+        self.transfer_leadership_before_sleep = TRANSFER_LEADERSHIP_BEFORE_SLEEP
+        self.paused_event_buffer_size = PAUSED_EVENT_BUFFER_SIZE
+        self.fault_scenario = FAULT_SCENARIO
+        self.network_topology = NETWORK_TOPOLOGY
+
+        # Tracing
+        self.trace_sample_rate = TRACE_SAMPLE_RATE
+        self.trace_slow_command_in_ms = TRACE_SLOW_COMMAND_IN_MS
+        self.trace_file = TRACE_FILE
+
+        # Profiling
+        self.profiling_enabled = PROFILING_ENABLED
+        self.profiling_sample_interval_in_ms = PROFILING_SAMPLE_INTERVAL_IN_MS
+        self.profiling_report_interval_in_secs = PROFILING_REPORT_INTERVAL_IN_SECS
+        self.profiling_file = PROFILING_FILE
+
+        # Checkpoints
+        self.checkpoint_file = CHECKPOINT_FILE
+        self.restore_checkpoint_file = RESTORE_CHECKPOINT_FILE
+        self.checkpoint_timeout_in_secs = CHECKPOINT_TIMEOUT_IN_SECS
+
+        for name, value in parameters.items():
+            if not hasattr(self, name):
+                raise ValueError(f"Unknown experiment parameter {name}")
+            setattr(self, name, value)
+
+    @classmethod
+    def of(cls, configurationparameters):
+        """
+        :param configurationparameters: ExperimentParameters, a dictionary of parameters or None for the defaults.
+        """
+        if configurationparameters is None:
+            return cls()
+        if isinstance(configurationparameters, cls):
+            return configurationparameters
+        return cls(**configurationparameters)
+
+    @classmethod
+    def of_known(cls, dictionary):
+        """
+        :return: Parameters made of the entries of the dictionary that are experiment parameters, others are ignored.
+        """
+        names = vars(cls())
+        return cls(**{name: value for name, value in dictionary.items() if name in names})
+
+    def replace(self, **parameters):
+        """
+        :return: A copy of the parameters with the given ones changed.
+        """
+        return ExperimentParameters(**{**self.as_dict(), **parameters})
+
+    def as_dict(self):
+        return dict(vars(self))
+
+    def __eq__(self, other):
+        return isinstance(other, ExperimentParameters) and self.as_dict() == other.as_dict()
+
+    def __str__(self):
+        return f"ExperimentParameters({', '.join(f'{name}={value}' for name, value in self.as_dict().items())})"
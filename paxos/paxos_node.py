@@ -1,11 +1,22 @@
+import queue
 import random
+from collections import deque
+from threading import Thread, Timer, Lock, RLock
 
 from adhoccomputing.Generics import *
 from adhoccomputing.GenericModel import GenericModel, GenericMessage
+from paxos.admission import AdmissionController
+from paxos.checkpoint import NodeCheckpoint, ClusterCheckpoint, detached_event
+from paxos.erasure import encode_payload, decode_payload
 from paxos.statistics import Statistics
 from paxos.utils import NodeStatus, PaxosEventTypes, PaxosMessageHeader, PaxosMessageTypes, CommandTypes, Command, \
-    ALWAYS_SLEEP_LEADER
+    majority, validate_quorum_sizes, COMMUTING_COMMAND_TYPES, COMMAND_OPERATORS
 from paxos.log import PaxosLog, LogEntry
+from paxos.parameters import ExperimentParameters
+from paxos.pipeline import PipelineStage
+from paxos.snapshot import Snapshot, SnapshotReceiver
+from paxos.tracing import Tracer
+from Snapshot.ChandyLamportSnapshot import ChandyLamportInstance
 
 
 class PaxosNode(GenericModel):
@@ -13,19 +24,41 @@ class PaxosNode(GenericModel):
     The PaxosNode class represents a node in the Paxos consensus algorithm. It inherits from the GenericModel
     class and includes methods for handling required events in the Paxos algorithm. Paxos Nodes are connected to
     each other as peers and can send messages to each other. They can also receive messages from clients and
-    send responses back to them. They can be in one of three states: FOLLOWER, CANDIDATE, or PROPOSER.
+    send responses back to them. They can be in one of three states: FOLLOWER, CANDIDATE, or PROPOSER. Nodes that are
+    not voting members of the current configuration are LEARNERs. A read replica is a LEARNER that never joins the
+    configuration, it is fed with committed entries by a follower and serves reads.
     """
 
-    def __init__(self, componentname, componentinstancenumber, numberofnodes, timeout, context=None,
-                 configurationparameters=None,
+    def __init__(self, componentname, componentinstancenumber, numberofnodes, timeout, timeoutjitter=0.0,
+                 prevote=False, phase1quorum=None, phase2quorum=None, thrifty=False, members=None,
+                 initialproposer=None, feeder=None, context=None, configurationparameters=None,
                  num_worker_threads=1, topology=None):
         """
         Initializes a PaxosNode object with the given parameters.
         :param numberofnodes: The number of Paxos nodes in the system.
+        :param members: Node ids of the initial voting members. By default, numberofnodes nodes with the same component
+        name. A node joining a running cluster is given the current members, which do not include itself.
+        :param initialproposer: Node id of the member that starts the election at startup, the last member if None.
+        :param feeder: Node id of the member that initially streams committed entries to this node, given only for read
+        replicas. Read replicas take no part in elections and quorums, they switch to another member if the feeder
+        stops answering.
         :param timeout: The timeout value for the Paxos node, in milliseconds.
+        :param timeoutjitter: Upper bound of the random amount added to the timeout for each election, in seconds.
+        :param prevote: Whether the node runs a pre-vote round before increasing its term and sending prepares.
+        :param phase1quorum: Number of promises needed to become proposer, majority if None.
+        :param phase2quorum: Number of accepts (including the proposer) needed to commit an entry, majority if None.
+        :param thrifty: Whether the proposer sends proposals only to the fastest phase 2 quorum of its peers.
+        :param configurationparameters: ExperimentParameters giving the replication, snapshot and sleep settings, the
+        defaults if None.
         """
         super().__init__(componentname, componentinstancenumber, context, configurationparameters,
                          num_worker_threads, topology)
+        self.parameters = ExperimentParameters.of(configurationparameters)
+        # Local clock, all timers of the node use it so that a clock skew can be injected
+        self.clock_offset = 0.0
+        self.clock_drift = 0.0
+        self.clock_reference = time.time()
+
         self.state_machine_value = 0
         self.state = NodeStatus.FOLLOWER
         self.current_term = 0  # latest term node has seen (initialized to instance number and increases as factors)
@@ -35,37 +68,224 @@ class PaxosNode(GenericModel):
         self.log = PaxosLog()
         self.commit_index = 0
         self.last_applied = 0
-        self.number_of_nodes = numberofnodes
+        self.last_applied_term = 0
+        self.last_client_command = self.log[0].command  # Last applied command that is not internal
+        self.applied_command_ids = {}  # for each command key, the highest applied command id
+        self.appended_command_ids = {}  # for each command key, the highest command id in the log, used by leader
+
+        # Configuration, changed only by committed CONFIGURATION entries
+        if members is None:
+            members = [f'{componentname}_{i}' for i in range(1, numberofnodes + 1)]
+        self.members = list(members)  # Voting members
+        self.learners = []  # Non-voting members, replicated by the leader until they are promoted
+        # Configuration of the last applied entry, recorded by snapshots. With the pipeline, the configuration of the
+        # handlers may be ahead of it, since configuration entries are applied in the handlers once committed
+        self.applied_configuration = {'members': list(self.members), 'learners': []}
+        self.number_of_nodes = len(self.members)
+        self.initial_proposer = initialproposer if initialproposer is not None else self.members[-1]
+        # Term of the election run at startup, i.e. instance number of the initial proposer
+        self.startup_term = int(self.initial_proposer.rsplit('_', 1)[1])
+        self.phase_1_quorum_size = phase1quorum
+        self.phase_2_quorum_size = phase2quorum
+        validate_quorum_sizes(self.number_of_nodes, self.phase_1_quorum(), self.phase_2_quorum())
 
         # Last timer reset time, is used by followers and candidates to detect timeout
-        self.last_timer_reset_time = time.time()
-        self.timeout = timeout
+        self.last_timer_reset_time = self.clock()
+        self.base_timeout = timeout
+        self.timeout_jitter = timeoutjitter
+        self.timeout = self.randomized_timeout()
+        self.pre_vote = prevote
+        self.last_leader_contact_time = 0  # Last time a message from a leader is received, used by pre-vote
 
         # Following two are for leader and reinitialized after election
         self.next_index = {}  # for each node, index of the next log entry to send to that server (initialized to leader last log index + 1)
         self.match_index = {}  # for each node, index of highest log entry known to be replicated on server (initialized to 0, increases monotonically)
+        self.transfer_target = None  # Peer that leadership is being handed over to, client requests are rejected meanwhile
+        self.transfer_start_time = None
+        self.pending_sleep_time = None  # Sleep postponed until the leadership transfer completes
+
+        # Thrifty replication, used by leader
+        self.thrifty = thrifty
+        self.thrifty_quorum = []  # Peers that new proposals are sent to
+        self.response_times = {}  # for each node, moving average of the time between a propose and its accept
+        self.propose_send_times = {}  # for each node, send time of the oldest propose that is not answered yet
+        self.last_catch_up_time = 0
+
+        # Catch-up of peers lagging behind the commit index, used by leader
+        self.catch_up_sessions = {}  # for each lagging peer, time and next index when its catch-up started
+        self.catch_up_in_flight = {}  # for each lagging peer, send time of its unanswered catch-up chunk
+        # Bytes that can be sent as catch-up now, refilled over time
+        self.catch_up_budget = self.parameters.max_bytes_per_propose
+        self.catch_up_budget_time = self.clock()
+
+        # Admission control of client commands, used by leader
+        queue_time_target_in_ms = self.parameters.admission_queue_time_target_in_ms
+        self.admission_controller = AdmissionController(
+            self.parameters.admission_max_in_flight_entries,
+            queue_time_target_in_ms / 1000.0 if queue_time_target_in_ms is not None else None,
+            self.parameters.admission_queue_time_interval_in_ms / 1000.0)
+
+        # Fast path of commuting commands, see fast_accept
+        # for each (key, id) of a fast accepted command not applied yet, [command, last report time or None if the
+        # command is in the log received from the leader]
+        self.fast_accepted = {}
+        self.fast_epoch = 0  # Epoch of the leader, increased by the leader before each non-commuting command
+        self.fast_epoch_term = None  # Term of the leader the epoch is received from, fast accepts are made in it only
+        self.leader_id = None  # Leader the last propose is received from
+        self.waiting_fast_commands = {}  # for each key, commands waiting for the previous command of the key, by id
+        self.barrier_commands = []  # Non-commuting commands waiting for the members to report their fast accepts
+        self.next_barrier_commands = []  # Non-commuting commands received after the current epoch started
+        self.barrier_acks = set()  # Members that reported all of their fast accepts in the current epoch
+
+        # Pipeline, the handlers hand messages to peers over to the send stage and committed entries over to the apply
+        # stage, see paxos/pipeline.py. The stages are None if the pipeline is disabled.
+        self.send_stage = None
+        self.apply_stage = None
+        if self.parameters.pipeline_enabled:
+            self.send_stage = PipelineStage(f"{self.node_id}.send", self.parameters.pipeline_send_queue_size)
+            self.apply_stage = PipelineStage(f"{self.node_id}.apply", self.parameters.pipeline_apply_queue_size)
+        self.pipeline_stages = [stage for stage in (self.send_stage, self.apply_stage) if stage is not None]
+
+        # Snapshots and log compaction
+        self.snapshot = None  # Latest snapshot, the log is compacted up to snapshot_retained_entries before its index
+        self.snapshot_in_progress = False
+        self.snapshot_transfers = {}  # for each peer receiving a snapshot from the leader, the snapshot and next offset
+        self.snapshot_receiver = None  # Snapshot being received from the leader
+
+        # Read replicas
+        self.feeder = feeder  # Member streaming committed entries to this node, None unless it is a read replica
+        self.learn_request_pending = False  # Whether the feeder has not answered the last learn request yet
+        self.read_replicas = {}  # for each read replica fed by this node, index of the next entry to send
+
+        # Link emulation and fault injection, every event delivered to the node passes through trigger_event
+        self.network = None  # Set by NetworkEmulator, it delays the messages of peers as if they crossed real links
+        self.fault_injector = None  # Set by FaultInjector, it may drop, delay or duplicate the messages of peers
+        self.crashed = False
+        self.paused = False
+        self.paused_events = deque(maxlen=self.parameters.paused_event_buffer_size)
+        self.fault_lock = Lock()
+        self.handler_lock = RLock()  # Held while a handler runs, so that a crash waits for the handler in progress
+
+        self.peer_components = {}  # Peer components by node id, filled on first use
+        self.sent_message_count = 0
+        self.sent_message_count_as_proposer = 0
+        self.sent_entry_bytes_as_proposer = 0  # Bytes of the entries sent in proposals while being proposer
 
         # Reinitialized after transitioning to candidate
         self.promises_received = set()
+        self.pre_promises_received = set()
         self.promoted_entries = []
+        self.promoted_entries_by_index = {}  # Highest term entry of each index from promises
+        # With erasure coded replication, for each (index, key, id) of a command with a payload, its fragments and its
+        # payload from promises, to rebuild the payload of the promoted entries
+        self.promoted_fragments = {}
+        self.promoted_payloads = {}
+
+        # Checkpoints of the cluster, see paxos/checkpoint.py
+        self.checkpoints = {}  # ChandyLamportInstance of each checkpoint in progress, its state is the NodeCheckpoint
+        self.restored_checkpoint = None  # NodeCheckpoint the node is restored from, until it starts
 
         self.eventhandlers[PaxosEventTypes.PROPOSE] = self.on_propose
         self.eventhandlers[PaxosEventTypes.ACCEPT] = self.on_accept
         self.eventhandlers[PaxosEventTypes.PREPARE] = self.on_prepare
         self.eventhandlers[PaxosEventTypes.PROMISE] = self.on_promise
+        self.eventhandlers[PaxosEventTypes.PRE_PREPARE] = self.on_pre_prepare
+        self.eventhandlers[PaxosEventTypes.PRE_PROMISE] = self.on_pre_promise
         self.eventhandlers[PaxosEventTypes.CLIENT_REQUEST] = self.on_client_request
         self.eventhandlers[PaxosEventTypes.HEARTBEAT] = self.on_heartbeat
         self.eventhandlers[PaxosEventTypes.SLEEP_TRIGGER] = self.on_sleep_trigger
+        self.eventhandlers[PaxosEventTypes.TRANSFER_LEADERSHIP] = self.on_transfer_leadership
+        self.eventhandlers[PaxosEventTypes.TIMEOUT_NOW] = self.on_timeout_now
+        self.eventhandlers[PaxosEventTypes.FAST_REPORT] = self.on_fast_report
+        self.eventhandlers[PaxosEventTypes.RECONFIGURE] = self.on_reconfigure
+        self.eventhandlers[PaxosEventTypes.LEARN] = self.on_learn
+        self.eventhandlers[PaxosEventTypes.LEARN_REQUEST] = self.on_learn_request
+        self.eventhandlers[PaxosEventTypes.READ_REQUEST] = self.on_read_request
+        self.eventhandlers[PaxosEventTypes.INSTALL_SNAPSHOT] = self.on_install_snapshot
+        self.eventhandlers[PaxosEventTypes.SNAPSHOT_ACK] = self.on_snapshot_ack
+        self.eventhandlers[PaxosEventTypes.SNAPSHOT_CREATED] = self.on_snapshot_created
+        self.eventhandlers[PaxosEventTypes.RESUME] = self.on_resume
+        self.eventhandlers[PaxosEventTypes.RESTART] = self.on_restart
+        self.eventhandlers[PaxosEventTypes.TAKE_CHECKPOINT] = self.on_take_checkpoint
+        self.eventhandlers[PaxosEventTypes.CHECKPOINT_MARKER] = self.on_checkpoint_marker
 
     def on_init(self, eventobj: Event):
         """
-        Initializes the Paxos node object. First node is initialized as proposer, others as followers.
+        Initializes the Paxos node object. First node is initialized as proposer, others as followers. A node restored
+        from a checkpoint resumes instead.
         """
         self.reset_timer()
-        if self.componentinstancenumber == self.number_of_nodes:
+        if self.restored_checkpoint is not None:
+            self.resume_from_checkpoint()
+        elif self.feeder is not None:
+            self.state = NodeStatus.LEARNER
+            self.send_learn_request()
+        elif not self.is_voter():
+            self.state = NodeStatus.LEARNER
+        elif self.node_id == self.initial_proposer:
             self.transition_to_candidate()
             self.send_prepare_to_peers()
 
+    def on_exit(self, eventobj: Event):
+        for stage in self.pipeline_stages:
+            stage.stop()
+        super().on_exit(eventobj)
+
+    # PRE-VOTE (PRE_PREPARE - PRE_PROMISE) EVENTS
+    def send_pre_prepare_to_peers(self):
+        """
+        Sends the pre-prepare message to all peers of the node. Pre-prepare asks peers whether they would promise to
+        the term the node is about to use, without changing the term of anyone. The node only increases its term and
+        sends the real prepare message once a phase 1 quorum answers positively, so that a node which cannot win an
+        election (e.g. a node waking up from sleep while a healthy leader exists) does not force others to a higher
+        term.
+        """
+        self.reset_timer()
+        self.timeout = self.randomized_timeout()
+        self.pre_promises_received = {self.node_id}
+        message = {
+            'term': self.current_term + self.node_number,
+            'proposerId': self.node_id
+        }
+        header = PaxosMessageHeader(PaxosMessageTypes.PRE_PREPARE, self.node_id, None)
+        self.send_peer(Event(self, PaxosEventTypes.PRE_PREPARE, GenericMessage(header, message)))
+
+    def on_pre_prepare(self, eventobj: Event):
+        """
+        Handles the pre-prepare message received by the node. The vote is granted if the node has not heard from a
+        leader for at least the minimum election timeout and the prospective term is greater than any term the node
+        has seen or promised. Granting a pre-vote does not change the state of the node.
+        """
+        if self.feeder is not None:
+            return  # Read replicas do not take part in elections
+        given_term = eventobj.eventcontent.payload['term']
+        leader_is_alive = self.state == NodeStatus.PROPOSER or \
+            self.clock() - self.last_leader_contact_time <= self.base_timeout
+        vote_granted = self.is_voter() and not leader_is_alive and \
+            given_term > self.current_term and given_term > self.promised_term
+
+        pre_promise_header = PaxosMessageHeader(PaxosMessageTypes.PRE_PROMISE, self.node_id,
+                                                eventobj.eventcontent.header.messagefrom)
+        pre_promise_payload = {
+            'voteGranted': vote_granted,
+            'term': self.current_term
+        }
+        self.send_to_peer(eventobj.eventcontent.header.messagefrom,
+                          Event(self, PaxosEventTypes.PRE_PROMISE, GenericMessage(pre_promise_header, pre_promise_payload)))
+
+    def on_pre_promise(self, eventobj: Event):
+        """
+        Handles the pre-promise message received by the node. Once a phase 1 quorum of the nodes grants the pre-vote,
+        the node starts the actual election by sending prepare messages with an increased term.
+        """
+        if eventobj.eventcontent.header.messageto != self.node_id or NodeStatus.CANDIDATE != self.state:
+            return
+        if eventobj.eventcontent.payload['voteGranted'] and eventobj.eventcontent.header.messagefrom in self.members:
+            self.pre_promises_received.add(eventobj.eventcontent.header.messagefrom)
+            if len(self.pre_promises_received) >= self.phase_1_quorum():
+                self.pre_promises_received = set()
+                self.send_prepare_to_peers()
+
     # PHASE 1 (PREPARE - PROMISE) EVENTS
     def create_prepare_payload(self):
         """
@@ -89,16 +309,21 @@ class PaxosNode(GenericModel):
         :param eventobj: The event object containing the prepare message.
         :return: Response payload including voteGranted boolean result, current term, and entries to be promoted.
         """
+        if self.feeder is not None:
+            return  # Read replicas do not take part in elections
         given_term = eventobj.eventcontent.payload['term']
+        # Entries before the start of the log are compacted and cannot be sent to a candidate lagging behind them
+        candidate_is_up_to_date = eventobj.eventcontent.payload['proposerCommitIndex'] >= self.log.snapshot_index
 
         vote_granted = False
-        if given_term > self.current_term and given_term > self.promised_term:
+        if self.is_voter() and candidate_is_up_to_date and given_term > self.current_term and \
+                given_term > self.promised_term:
             self.transition_to_acceptor(given_term)
             vote_granted = True
 
         entries_to_send = []
-        if vote_granted and len(self.log.entries) > eventobj.eventcontent.payload['proposerCommitIndex']:
-            entries_to_send = self.log.entries[eventobj.eventcontent.payload['proposerCommitIndex'] + 1:]
+        if vote_granted and len(self.log) > eventobj.eventcontent.payload['proposerCommitIndex']:
+            entries_to_send = self.log[eventobj.eventcontent.payload['proposerCommitIndex'] + 1:]
 
         prepare_response_payload = {
             'voteGranted': vote_granted,
@@ -109,79 +334,94 @@ class PaxosNode(GenericModel):
         request_vote_response_header = PaxosMessageHeader(PaxosMessageTypes.PROMISE, self.node_id,
                                                           eventobj.eventcontent.header.messagefrom)
         response_message = GenericMessage(request_vote_response_header, prepare_response_payload)
-        self.send_peer(Event(self, PaxosEventTypes.PROMISE, response_message))
+        self.send_to_peer(eventobj.eventcontent.header.messagefrom, Event(self, PaxosEventTypes.PROMISE, response_message))
 
     def on_promise(self, eventobj: Event):
         """
         Handles the promise message received by the node. If the response is positive, the node adds the respondent to
-        the set of nodes that have promised to vote for it. If the number of promises received reaches majority, the
-        node transitions to proposer (leader) state. For each promise, voter also sends the entries that are not yet
-        committed by the proposer. These entries are merged with the already promoted entries obtained from other nodes.
+        the set of nodes that have promised to vote for it. If the number of promises received reaches the phase 1
+        quorum, the node transitions to proposer (leader) state. For each promise, voter also sends the entries that are
+        not yet committed by the proposer. These entries are merged with the already promoted entries obtained from
+        other nodes.
         :param eventobj: The event object containing the promise message.
         """
         if eventobj.eventcontent.header.messageto != self.node_id or NodeStatus.CANDIDATE != self.state:
             return
         respondent_id = eventobj.eventcontent.header.messagefrom
-        if eventobj.eventcontent.payload['voteGranted']:
+        if eventobj.eventcontent.payload['voteGranted'] and respondent_id in self.members:
             self.promises_received.add(respondent_id)
             self.merge_promoted_entries(eventobj.eventcontent.payload['entries'])
-            if len(self.promises_received) > self.number_of_nodes / 2:
+            if len(self.promises_received) >= self.phase_1_quorum():
                 self.transition_to_proposer()
 
-    # For each new entry, compares with already obtained entities to be promoted.
-    # Promoted entries are updated with current, proposed term.
-    # Gaps are filled with no-op entries.
     def merge_promoted_entries(self, newEntries):
         """
-        Helper method to merge the new entries with the already promoted entries. For each new entry, compares with
-        already obtained entities to be promoted, and those with higher term overwrite the lower term if a conflict
-        occurs in the same index. Gaps are filled with no-op entries when there is a gap between the indexes of the
-        merged promoted entries list. These promoted entries are updated with the current, proposed term before being
-        sent by the proposer.
-        """
-        merged_entries = self.promoted_entries + newEntries
-        merged_entries.sort(key=lambda promoted_entry: promoted_entry.index)
-
-        merged_list = []  # Handled index conflicts
-        prev_index = None
-        for entry in merged_entries:
-            if entry.index == prev_index:
-                # Higher term overwrites lower term in same index
-                valid_command = entry.command if merged_list[-1].term < entry.term else merged_list[-1].command
-                merged_list[-1] = LogEntry(max(merged_list[-1].term, entry.term), valid_command, self.node_id,
-                                           entry.index)
+        Helper method to merge the entries of a promise with the already promoted entries, which are kept by index. An
+        entry with a higher term overwrites the entry with a lower term at the same index, so each promise costs only
+        the number of its entries. Gaps are filled once, when the node becomes proposer. Fragments and payloads of the
+        commands are collected too, since the entry with the highest term may carry only a fragment of its payload.
+        """
+        for entry in newEntries:
+            promoted_entry = self.promoted_entries_by_index.get(entry.index)
+            if promoted_entry is None or promoted_entry.term < entry.term:
+                self.promoted_entries_by_index[entry.index] = entry
+            if entry.fragment is not None:
+                self.promoted_fragments.setdefault((entry.index, entry.command.key, entry.command.id),
+                                                   []).append(entry.fragment)
+            elif entry.command.payload is not None:
+                self.promoted_payloads[(entry.index, entry.command.key, entry.command.id)] = entry.command.payload
+
+    def fill_promoted_entries(self):
+        """
+        Writes the promoted entries to the log after the commit index, filling gaps between them with no-op entries.
+        These promoted entries are updated with the current, proposed term before being sent by the proposer.
+        """
+        last_index = max(self.promoted_entries_by_index, default=self.commit_index)
+        self.promoted_entries = []
+        for index in range(self.commit_index + 1, last_index + 1):
+            entry = self.promoted_entries_by_index.get(index)
+            if entry is not None and entry.fragment is not None:
+                entry = self.rebuild_promoted_entry(entry)
+            if entry is None:
+                entry = LogEntry(0, Command(0, CommandTypes.NOOP, 0), self.node_id, index)
+            if index < len(self.log):
+                self.log[index] = entry
             else:
-                merged_list.append(entry)
-                prev_index = entry.index
-
-        final_list = []  # Filled with no-op entries
-        prev_index = None
-        for entry in merged_list:
-            if prev_index is not None and entry.index - prev_index > 1:
-                filler_index = prev_index + 1
-                while filler_index < entry.index:
-                    no_op_command = Command(0, CommandTypes.NOOP, 0)
-                    filler_entry = LogEntry(0, no_op_command, self.node_id, filler_index)
-                    final_list.append(filler_entry)
-                    filler_index += 1
-            final_list.append(entry)
-            prev_index = entry.index
-
-        # Update log entries with the list to promote, by copying them
-        for entry in final_list:
-            self.log.entries[entry.index] = entry
-
-        self.promoted_entries = final_list
+                self.log.append_entry(entry)
+            self.promoted_entries.append(entry)
+        self.promoted_entries_by_index = {}
+        self.promoted_fragments = {}
+        self.promoted_payloads = {}
+
+    def rebuild_promoted_entry(self, entry):
+        """
+        Rebuilds the payload of a promoted entry carrying only a fragment of it, from the fragments of the promises or
+        from a promise with the whole payload. An entry with less than k fragments in a phase 1 quorum of promises is not
+        committed, since the phase 2 quorum is raised for erasure coded replication.
+        :return: The entry with its payload, or None if it cannot be rebuilt.
+        """
+        command_index = (entry.index, entry.command.key, entry.command.id)
+        payload = self.promoted_payloads.get(command_index)
+        if payload is None:
+            payload = decode_payload(self.promoted_fragments.get(command_index, []))
+        if payload is None:
+            logger.error(f"{self.node_id} cannot rebuild the payload of uncommitted {entry}, it is replaced by a no-op")
+            return None
+        return LogEntry(entry.term, entry.command.with_payload(payload), entry.creator_id, entry.index)
 
     def send_prepare_to_peers(self):
         """
         Sends the prepare message to all peers of the node.
         """
         self.reset_timer()
+        self.timeout = self.randomized_timeout()
         self.current_term += self.node_number
         self.promised_term = self.current_term
         self.promises_received = {self.node_id}
-        self.promoted_entries = self.log.entries[self.commit_index + 1:]
+        self.promoted_entries_by_index = {}
+        self.promoted_fragments = {}
+        self.promoted_payloads = {}
+        self.merge_promoted_entries(self.log[self.commit_index + 1:])
         message = self.create_prepare_payload()
         header = PaxosMessageHeader(PaxosMessageTypes.PREPARE, self.node_id, None)
         self.send_peer(Event(self, PaxosEventTypes.PREPARE, GenericMessage(header, message)))
@@ -189,18 +429,81 @@ class PaxosNode(GenericModel):
     # PHASE 2 (PROPOSE-ACCEPT) EVENTS
     def send_propose_to_peers(self):
         """
-        Sends the propose message to all peers of the node.
+        Sends the propose message to all peers of the node, or only to the peers of the thrifty quorum in thrifty mode.
         """
-        for peer_id in self.get_peer_ids():
+        start_time = time.time()
+        peer_ids = self.thrifty_quorum if self.thrifty else self.get_peer_ids()
+        for peer_id in peer_ids:
             self.send_propose_to_peer(peer_id)
+        if Tracer.enabled:
+            Tracer.record(self.node_id, "propose", [entry.command for entry in self.log[self.commit_index + 1:]],
+                          start_time)
 
     def send_propose_to_peer(self, peer_id):
         """
-        Helper method to send the propose message to a specific peer.
+        Helper method to send the propose message to a specific peer. A propose of entries that are already committed is
+        catch-up traffic for a lagging peer. Such a peer has at most one catch-up chunk in flight and chunks are sent only
+        within the catch-up rate limit, the rest is sent by continue_catch_up on the following heartbeats.
         """
+        if peer_id in self.catch_up_in_flight:
+            return
+        if self.next_index[peer_id] <= self.log.snapshot_index:
+            self.send_snapshot_chunk(peer_id)
+            return
         message = self.create_propose_payload(peer_id)
+        if message['entries'] and message['prevLogIndex'] < self.commit_index:
+            if peer_id not in self.catch_up_sessions:
+                self.catch_up_sessions[peer_id] = (self.clock(), self.next_index[peer_id])
+            chunk_size = sum(entry.size() for entry in message['entries'])
+            if not self.take_catch_up_budget(chunk_size):
+                return
+            self.catch_up_in_flight[peer_id] = self.clock()
+            Statistics.record_catch_up_chunk(len(message['entries']), chunk_size)
+        if self.state == NodeStatus.PROPOSER:
+            self.sent_entry_bytes_as_proposer += sum(entry.size() for entry in message['entries'])
         header = PaxosMessageHeader(PaxosMessageTypes.PROPOSE, self.node_id, peer_id)
-        self.send_peer(Event(self, PaxosEventTypes.PROPOSE, GenericMessage(header, message)))
+        self.propose_send_times.setdefault(peer_id, self.clock())
+        self.send_to_peer(peer_id, Event(self, PaxosEventTypes.PROPOSE, GenericMessage(header, message)))
+
+    def choose_thrifty_quorum(self):
+        """
+        Chooses the peers with the smallest average response times, as many as needed to complete a phase 2 quorum
+        together with the proposer. Peers with a propose waiting longer than the accept timeout are chosen last.
+        """
+        now = self.clock()
+
+        def expected_response_time(peer_id):
+            waiting_time = now - self.propose_send_times.get(peer_id, now)
+            return max(self.response_times.get(peer_id, 0), waiting_time)
+
+        peer_ids = sorted(self.get_voting_peer_ids(), key=expected_response_time)
+        self.thrifty_quorum = peer_ids[:self.phase_2_quorum() - 1]
+
+    def update_thrifty_replication(self):
+        """
+        Called by the leader on every heartbeat in thrifty mode. If a quorum peer does not accept within the accept
+        timeout, it is replaced immediately by the next fastest peer, which the pending entries are proposed to. Peers
+        outside the quorum, including the replaced ones, are caught up periodically, which also refreshes their
+        measured response times.
+        """
+        now = self.clock()
+        for peer_id in list(self.thrifty_quorum):
+            send_time = self.propose_send_times.get(peer_id)
+            if send_time is not None and now - send_time > self.parameters.accept_timeout_in_ms / 1000.0:
+                self.response_times[peer_id] = max(self.response_times.get(peer_id, 0), now - send_time)
+                spare_peer_ids = [peer for peer in self.get_voting_peer_ids()
+                                  if peer not in self.thrifty_quorum and peer not in self.propose_send_times]
+                if spare_peer_ids:
+                    spare_peer_id = min(spare_peer_ids, key=lambda peer: self.response_times.get(peer, 0))
+                    # Replaced rather than widened, so that the slow peer does not add a spare on every heartbeat
+                    self.thrifty_quorum[self.thrifty_quorum.index(peer_id)] = spare_peer_id
+                    self.send_propose_to_peer(spare_peer_id)
+        if now - self.last_catch_up_time > self.parameters.catch_up_interval_in_ms / 1000.0:
+            self.last_catch_up_time = now
+            for peer_id in self.get_peer_ids():
+                if peer_id not in self.propose_send_times and self.next_index[peer_id] < len(self.log):
+                    self.send_propose_to_peer(peer_id)
+            self.choose_thrifty_quorum()
 
     def create_propose_payload(self, peer_id):
         """
@@ -211,16 +514,113 @@ class PaxosNode(GenericModel):
         new entries to be sent, and the commit index of the leader.
         """
         next_index_to_send = self.next_index[peer_id]
-        for entry in self.log.entries[next_index_to_send:]:
+        for entry in self.log[next_index_to_send:]:
             entry.term = self.current_term
         return {
             'term': self.current_term,
             'prevLogIndex': next_index_to_send - 1,
-            'prevLogTerm': self.log.entries[next_index_to_send - 1].term,
-            'entries': self.log.entries[next_index_to_send:],
-            'leaderCommit': self.commit_index
+            'prevLogTerm': self.log[next_index_to_send - 1].term,
+            'entries': self.create_chunk(next_index_to_send, peer_id),
+            'leaderCommit': self.commit_index,
+            'fastEpoch': self.fast_epoch
         }
 
+    def create_chunk(self, start_index, peer_id):
+        """
+        Entries for the peer starting from the given index, at most max_entries_per_propose entries and
+        max_bytes_per_propose bytes. The chunk has at least one entry if there is any entry to send.
+        """
+        chunk = []
+        chunk_size = 0
+        for entry in self.log[start_index:start_index + self.parameters.max_entries_per_propose]:
+            entry = self.entry_for_peer(entry, peer_id)
+            if chunk and chunk_size + entry.size() > self.parameters.max_bytes_per_propose:
+                break
+            chunk.append(entry)
+            chunk_size += entry.size()
+        return chunk
+
+    def entry_for_peer(self, entry, peer_id):
+        """
+        With erasure coded replication, a voting member receives the entries of large commands with its own fragment of
+        the payload instead of the payload. Fragments are computed once for each entry and configuration. An entry that
+        the node holds only a fragment of, i.e. committed under a previous leader, is sent without its payload.
+        """
+        if not self.parameters.erasure_coding_enabled:
+            return entry
+        if entry.fragment is not None:
+            return entry.without_fragment()
+        payload = entry.command.payload
+        if payload is None or len(payload) < self.parameters.erasure_coding_min_payload_size_in_bytes or \
+                peer_id not in self.members:
+            return entry
+        if entry.fragment_entries is None or entry.fragment_entries[0] != self.members:
+            number_of_nodes = len(self.members)
+            fragments = encode_payload(payload, self.erasure_coding_data_fragments(number_of_nodes), number_of_nodes)
+            command = entry.command.without_payload()
+            entry.fragment_entries = (list(self.members), [LogEntry(entry.term, command, entry.creator_id, entry.index,
+                                                                    fragment) for fragment in fragments])
+        fragment_entries = entry.fragment_entries[1]
+        fragment_number = self.members.index(peer_id)
+        if fragment_entries[fragment_number].term != entry.term:
+            # Sent entries may be shared with the peer, the proposed term is set on a new one
+            fragment_entry = fragment_entries[fragment_number]
+            fragment_entries[fragment_number] = LogEntry(entry.term, fragment_entry.command, entry.creator_id,
+                                                         entry.index, fragment_entry.fragment)
+        return fragment_entries[fragment_number]
+
+    def take_catch_up_budget(self, number_of_bytes):
+        """
+        Token bucket limiting the catch-up traffic of the leader to catch_up_rate_limit_in_bytes_per_sec, so that it does
+        not starve the proposals of new client commands. The bucket holds at most one chunk worth of bytes and may go
+        negative for a single large chunk, which delays the following chunks accordingly.
+        :return: Whether the chunk can be sent now.
+        """
+        now = self.clock()
+        refill = (now - self.catch_up_budget_time) * self.parameters.catch_up_rate_limit_in_bytes_per_sec
+        self.catch_up_budget = min(self.parameters.max_bytes_per_propose, self.catch_up_budget + refill)
+        self.catch_up_budget_time = now
+        if self.catch_up_budget <= 0:
+            return False
+        self.catch_up_budget -= number_of_bytes
+        return True
+
+    def continue_catch_up(self):
+        """
+        Called by the leader on every heartbeat. Sends the next chunk to lagging peers that have no chunk in flight,
+        e.g. since the rate limit delayed it, and sends again chunks that are not answered within the timeout.
+        """
+        now = self.clock()
+        for peer_id, send_time in list(self.catch_up_in_flight.items()):
+            if now - send_time > self.base_timeout:
+                del self.catch_up_in_flight[peer_id]
+        for peer_id in list(self.catch_up_sessions):
+            if peer_id not in self.next_index:
+                del self.catch_up_sessions[peer_id]  # Removed from the configuration
+            elif peer_id not in self.catch_up_in_flight:
+                self.send_propose_to_peer(peer_id)
+
+    def finish_catch_up(self, peer_id):
+        """
+        Ends the catch-up session of the peer if it has reached the commit index.
+        """
+        if peer_id in self.catch_up_sessions and self.match_index[peer_id] >= self.commit_index:
+            start_time, start_index = self.catch_up_sessions.pop(peer_id)
+            Statistics.record_catch_up_duration(self.clock() - start_time)
+            logger.info(f"{self.node_id} caught up {peer_id} from index {start_index} to "
+                        f"{self.match_index[peer_id]} in {self.clock() - start_time:.3f} s")
+
+    def catch_up_progress(self):
+        """
+        :return: For each peer being caught up by the leader, the ratio of the entries it has received since its
+        catch-up started to the entries it had to receive to reach the current commit index.
+        """
+        progress = {}
+        for peer_id, (start_time, start_index) in self.catch_up_sessions.items():
+            to_receive = max(self.commit_index - start_index + 1, 1)
+            progress[peer_id] = min(max(self.match_index.get(peer_id, 0) - start_index + 1, 0) / to_receive, 1.0)
+        return progress
+
     def on_propose(self, eventobj: Event):
         """
         Handles the propose message received by the node. If the message is a heartbeat, it simply resets timer and
@@ -232,6 +632,8 @@ class PaxosNode(GenericModel):
         """
         if eventobj.eventcontent.header.messageto != self.node_id:
             return
+        start_time = time.time()
+        self.last_leader_contact_time = self.clock()
         # Handle periodic heartbeats
         if eventobj.eventcontent.payload['entries'] is None:
             self.handle_heartbeat_from_leader(eventobj.eventcontent.payload)
@@ -245,7 +647,13 @@ class PaxosNode(GenericModel):
             accept_header = PaxosMessageHeader(PaxosMessageTypes.ACCEPT, self.node_id,
                                                eventobj.eventcontent.header.messagefrom)
             accept_message = GenericMessage(accept_header, accept_payload)
-            self.send_peer(Event(self, PaxosEventTypes.ACCEPT, accept_message))
+            self.send_to_peer(eventobj.eventcontent.header.messagefrom,
+                              Event(self, PaxosEventTypes.ACCEPT, accept_message))
+            if Tracer.enabled:
+                proposed_commands = [entry.command for entry in eventobj.eventcontent.payload['entries']]
+                Tracer.record(self.node_id, "handle_propose", proposed_commands, start_time, eventobj)
+        if self.parameters.fast_path_enabled:
+            self.update_fast_epoch(eventobj.eventcontent.header.messagefrom, eventobj.eventcontent.payload)
 
     def send_heartbeat_to_peers(self):
         """
@@ -257,11 +665,12 @@ class PaxosNode(GenericModel):
             'prevLogIndex': None,
             'prevLogTerm': None,
             'entries': None,
-            'leaderCommit': self.commit_index
+            'leaderCommit': self.commit_index,
+            'fastEpoch': self.fast_epoch
         }
         for peer_id in self.get_peer_ids():
             header = PaxosMessageHeader(PaxosMessageTypes.PROPOSE, self.node_id, peer_id)
-            self.send_peer(Event(self, PaxosEventTypes.PROPOSE, GenericMessage(header, message)))
+            self.send_to_peer(peer_id, Event(self, PaxosEventTypes.PROPOSE, GenericMessage(header, message)))
 
     def handle_heartbeat_from_leader(self, payload):
         """
@@ -273,6 +682,9 @@ class PaxosNode(GenericModel):
             self.current_term = given_term
             self.transition_to_follower()
             self.apply_new_entries_as_follower(payload['leaderCommit'])
+        elif self.state == NodeStatus.CANDIDATE and given_term >= self.promised_term:
+            # A leader with at least our term is alive, stop trying to be elected
+            self.transition_to_follower()
 
     def handle_propose(self, payload):
         """
@@ -289,18 +701,27 @@ class PaxosNode(GenericModel):
         prev_log_term = payload['prevLogTerm']
         leader_commit = payload['leaderCommit']
 
+        # Entries covered by the snapshot of the node are committed, so they match the entries of the leader
+        if prev_log_index < self.log.snapshot_index:
+            given_entries = [entry for entry in given_entries if entry.index > self.log.snapshot_index]
+            prev_log_index = self.log.snapshot_index
+            prev_log_term = self.log[prev_log_index].term
+            if not given_entries:
+                self.apply_new_entries_as_follower(leader_commit)
+                return True
+
         # TODO check if this is necessary
         if len(given_entries) == 0:
-            if prev_log_index == len(self.log.entries) - 1 and self.log.entries[prev_log_index].term == prev_log_term:
+            if prev_log_index == len(self.log) - 1 and self.log[prev_log_index].term == prev_log_term:
                 return True
             else:
                 return False
 
         # Reply false if log does not contain an entry at prevLogIndex whose term matches prevLogTerm
-        if len(self.log.entries) < prev_log_index + 1 or self.log.entries[prev_log_index].term != prev_log_term:
+        if len(self.log) < prev_log_index + 1 or self.log[prev_log_index].term != prev_log_term:
             return False
 
-        if prev_log_index + 1 < len(self.log.entries) and self.log.entries[prev_log_index + 1] is not None:
+        if prev_log_index + 1 < len(self.log) and self.log[prev_log_index + 1] is not None:
             self.log.truncate(prev_log_index + 1)
 
         # throw exception
@@ -308,6 +729,11 @@ class PaxosNode(GenericModel):
             raise Exception(f"prev_log_index + 1 is {prev_log_index + 1} but given_entries[0].index is {given_entries[0].index}")
 
         self.log.append_entries(given_entries)
+        if self.fast_accepted:
+            for entry in given_entries:
+                accepted = self.fast_accepted.get((entry.command.key, entry.command.id))
+                if accepted is not None:
+                    accepted[1] = None  # The leader has it, it is reported again only to acknowledge an epoch
         # If leaderCommit > commitIndex, apply new entries to state machine and update commitIndex
         self.apply_new_entries_as_follower(leader_commit)
         return True
@@ -318,13 +744,11 @@ class PaxosNode(GenericModel):
         updates the commit index.
         """
         if leader_commit > self.commit_index:
-            last_applicable_entry = min(leader_commit, len(self.log.entries) - 1)
-            applicable_entries = range(self.commit_index + 1, last_applicable_entry + 1)
+            last_applicable_entry = min(leader_commit, len(self.log) - 1)
+            applicable_entries = self.log[self.commit_index + 1:last_applicable_entry + 1]
             self.commit_index = last_applicable_entry
-            for index in applicable_entries:
-                if index > self.last_applied:
-                    self.apply_command(self.log.entries[index].command)
-                    self.last_applied = index
+            self.apply_entries(applicable_entries)
+            self.feed_read_replicas()
 
     def on_accept(self, eventobj: Event):
         """
@@ -334,18 +758,39 @@ class PaxosNode(GenericModel):
         """
         if eventobj.eventcontent.header.messageto != self.node_id or NodeStatus.PROPOSER != self.state:
             return
+        start_time = time.time()
         respondent_id = eventobj.eventcontent.header.messagefrom
         respondent_term = eventobj.eventcontent.payload['term']
         entry_index = eventobj.eventcontent.payload['index']
+        self.catch_up_in_flight.pop(respondent_id, None)
+        send_time = self.propose_send_times.pop(respondent_id, None)
+        if send_time is not None:
+            response_time = self.clock() - send_time
+            previous_response_time = self.response_times.get(respondent_id, response_time)
+            self.response_times[respondent_id] = 0.8 * previous_response_time + 0.2 * response_time
         if eventobj.eventcontent.payload['success']:
             # Ignore if response is for an outdated entry
             if entry_index <= self.match_index[respondent_id]:
                 return
+            previous_match_index = self.match_index[respondent_id]
             self.match_index[respondent_id] = entry_index
             self.next_index[respondent_id] = self.match_index[respondent_id] + 1
             self.commit_entries()
-            # If there are more entries to send, send them too directly
-            if self.next_index[respondent_id] < len(self.log.entries):
+            self.finish_catch_up(respondent_id)
+            if Tracer.enabled:
+                accepted_entries = self.log[max(previous_match_index, self.log.snapshot_index) + 1:entry_index + 1]
+                Tracer.record(self.node_id, "accept", [entry.command for entry in accepted_entries], start_time,
+                              eventobj)
+            if respondent_id == self.transfer_target and self.match_index[respondent_id] == len(self.log) - 1:
+                self.send_timeout_now(respondent_id)
+                return
+            if respondent_id in self.learners and self.match_index[respondent_id] >= self.commit_index:
+                self.promote_learner(respondent_id)
+            # If there are more entries to send, send them too directly. In thrifty mode, peers outside the quorum are
+            # only caught up periodically, see update_thrifty_replication
+            directly_fed = not self.thrifty or respondent_id in self.thrifty_quorum or \
+                respondent_id == self.transfer_target
+            if directly_fed and self.next_index[respondent_id] < len(self.log):
                 self.send_propose_to_peer(respondent_id)
         elif respondent_term > self.current_term:
             self.current_term = respondent_term
@@ -355,81 +800,791 @@ class PaxosNode(GenericModel):
 
     def commit_entries(self):
         """
-        Commits the entries that are replicated by majority of the nodes. After that, it applies the new commits to the
-        state machine as leader and send response to the client if needed.
+        Commits the entries that are replicated by a phase 2 quorum of the nodes. After that, it applies the new commits
+        to the state machine as leader and send response to the client if needed.
         """
-        # Finds uncommitted commands with current term that are replicated by majority
+        # Finds the last entry replicated by a phase 2 quorum, it is committed if it has the current term, which is
+        # the case of every entry after the first one with the current term in the log of the leader
         last_log_committed = self.commit_index
-        for index in range(self.commit_index + 1, len(self.log.entries)):
-            if self.log.entries[index].term == self.current_term:
-                if sum(1 for peer_id in self.get_peer_ids() if
-                       self.match_index[peer_id] >= index) + 1 > self.number_of_nodes / 2:
-                    self.commit_index = index
+        replicated_indexes = sorted((self.match_index[peer_id] for peer_id in self.get_voting_peer_ids()),
+                                    reverse=True)
+        if self.is_voter():
+            replicated_indexes.insert(0, len(self.log) - 1)
+        if len(replicated_indexes) >= self.phase_2_quorum():
+            quorum_index = replicated_indexes[self.phase_2_quorum() - 1]
+            if quorum_index > self.commit_index and self.log[quorum_index].term == self.current_term:
+                self.commit_index = quorum_index
         # Applies new commits to state machine as leader and updates last applied index
         if self.commit_index > last_log_committed:
-            for index in range(last_log_committed + 1, self.commit_index + 1):
-                self.apply_command(self.log.entries[index].command)
-                self.last_applied = index
+            start_time = time.time()
+            committed_entries = self.log[last_log_committed + 1:self.commit_index + 1]
+            self.apply_entries(committed_entries, respond=True)
             self.send_heartbeat_to_peers()
-            self.send_client_response()
+            if Tracer.enabled:
+                Tracer.record(self.node_id, "commit", [entry.command for entry in committed_entries], start_time)
             self.promoted_entries = []  # TODO keep non-applied entries for future ?
 
+    def apply_entries(self, entries, respond=False):
+        """
+        Applies the committed entries, in the handler or in the apply stage of the pipeline. Configuration entries are
+        applied in the handler in both cases, since the handlers depend on the configuration.
+        :param respond: Whether the last command of each client session is answered once applied, i.e. by the leader.
+        """
+        if self.apply_stage is None:
+            self.apply_entries_to_state_machine(entries, respond)
+            return
+        for entry in entries:
+            if entry.command.type == CommandTypes.CONFIGURATION.value and entry.index > self.last_applied:
+                self.apply_configuration(entry.command.value)
+        self.apply_stage.put(self.apply_entries_to_state_machine, entries, respond)
+
+    def apply_entries_to_state_machine(self, entries, respond):
+        """
+        Applies the entries after the last applied one, then responds to the client if asked to and snapshots the state
+        if enough entries are applied since the last snapshot.
+        """
+        responses = {}  # Last applied command of each client session
+        for entry in entries:
+            if entry.index <= self.last_applied:
+                continue
+            command = entry.command
+            if command.type != CommandTypes.CONFIGURATION.value:
+                self.apply_command(command)
+                responses[command.key] = command
+            else:
+                if self.apply_stage is None:
+                    self.apply_command(command)
+                self.applied_configuration = command.value
+            self.last_applied = entry.index
+            self.last_applied_term = entry.term
+        if respond:
+            for command in responses.values():
+                self.send_client_response(command)
+        self.maybe_create_snapshot()
+
     # CLIENT RELATED EVENTS
     def on_client_request(self, eventobj: Event):
         """
         Handles the client request received by the node. If the node is a proposer, it appends the new entry to the log
-        and sends the propose message to peers. Nodes other than proposer just ignores the request.
+        and sends the propose message to peers, unless the admission controller rejects the command, in which case the
+        client receives a busy response. Nodes other than proposer just ignores the request, except that every member
+        fast accepts commuting commands on the fast path.
         """
-        if NodeStatus.PROPOSER != self.state:
+        command = eventobj.eventcontent
+        if self.parameters.fast_path_enabled and command.type in COMMUTING_COMMAND_TYPES:
+            self.fast_accept(command, eventobj)
+        if NodeStatus.PROPOSER != self.state or self.transfer_target is not None:
             return
-        if eventobj.eventcontent.id <= self.log.entries[-1].command.id:
+        start_time = time.time()
+        if command.id <= self.applied_command_ids.get(command.key, 0):
+            # Already committed, the response to the client is probably lost
+            self.send_client_response(command)
             return
-        new_entry = LogEntry(self.current_term, eventobj.eventcontent, self.node_id,
-                             self.commit_index + len(self.promoted_entries) + 1)
-        self.promoted_entries.append(new_entry)
-        self.log.append_entry(new_entry)
-        self.send_propose_to_peers()
+        if command.id <= self.appended_command_ids.get(command.key, 0):
+            return
+        if self.admission_controller.is_enabled():
+            # Entries after the commit index are appended but not committed yet
+            rejection_reason = self.admission_controller.admit(len(self.log) - 1 - self.commit_index,
+                                                               start_time - eventobj.time.timestamp(), start_time)
+            if rejection_reason is not None:
+                self.send_busy_response(command, rejection_reason)
+                return
+        if self.parameters.fast_path_enabled and command.type not in COMMUTING_COMMAND_TYPES:
+            self.start_barrier(command)
+        elif self.parameters.fast_path_enabled:
+            if self.append_fast_command(command):
+                self.send_propose_to_peers()
+        else:
+            self.append_client_command(command)
+            self.send_propose_to_peers()
+        if Tracer.enabled:
+            Tracer.record(self.node_id, "client_request", [command], start_time, eventobj)
 
-    def send_client_response(self):
+    def append_client_command(self, command):
+        """
+        Appends an entry of the client command to the log of the leader. On the fast path, the commands of the same key
+        waiting for this one are appended after it.
+        """
+        while command is not None:
+            self.appended_command_ids[command.key] = command.id
+            # Entries of earlier client requests may still be uncommitted, the new entry goes after the log tail
+            new_entry = LogEntry(self.current_term, command, self.node_id, len(self.log))
+            self.promoted_entries.append(new_entry)
+            self.log.append_entry(new_entry)
+            waiting_commands = self.waiting_fast_commands.get(command.key)
+            command = waiting_commands.pop(command.id + 1, None) if waiting_commands else None
+
+    def send_client_response(self, command=None):
+        """
+        Sends the response of the given committed command, or of the last applied client command, to the client.
+        """
+        start_time = time.time()
         response_payload = {
             'success': True,
-            'command': self.log.entries[self.last_applied].command
+            'command': command if command is not None else self.last_client_command
         }
         response_header = PaxosMessageHeader(PaxosMessageTypes.CLIENT_RESPONSE, self.node_id, None)
         response_message = GenericMessage(response_header, response_payload)
         self.send_down(Event(self, PaxosEventTypes.CLIENT_RESPONSE, response_message))
+        if Tracer.enabled:
+            Tracer.record(self.node_id, "send_client_response", [response_payload['command']], start_time)
+
+    def send_busy_response(self, command, reason):
+        """
+        Tells the client that the command is rejected by the admission controller, the client sends it again later.
+        """
+        Statistics.record_busy_response()
+        response_payload = {
+            'success': False,
+            'busy': True,
+            'reason': reason,
+            'command': command
+        }
+        response_header = PaxosMessageHeader(PaxosMessageTypes.CLIENT_RESPONSE, self.node_id, None)
+        self.send_down(Event(self, PaxosEventTypes.CLIENT_RESPONSE, GenericMessage(response_header, response_payload)))
 
     def apply_command(self, command: Command):
+        start_time = time.time()
+        if command.type == CommandTypes.CONFIGURATION.value:
+            self.apply_configuration(command.value)
+            return
+        self.last_client_command = command
+        self.applied_command_ids[command.key] = max(command.id, self.applied_command_ids.get(command.key, 0))
+        self.fast_accepted.pop((command.key, command.id), None)
         old_state_machine_value = self.state_machine_value
         if command.type == CommandTypes.ADD.value:
             self.state_machine_value += command.value
         elif command.type == CommandTypes.SUBTRACT.value:
             self.state_machine_value -= command.value
+        elif command.type == CommandTypes.MULTIPLY.value:
+            self.state_machine_value *= command.value
+        elif command.type == CommandTypes.DIVIDE.value and command.value != 0:
+            self.state_machine_value //= command.value
         logger.error(
             f"{self.node_id} APPLIED COMMAND id: {command.id}\n"
-            f"{old_state_machine_value} {command.type == CommandTypes.ADD.value and '+' or '-'} {command.value} = {self.state_machine_value}")
+            f"{old_state_machine_value} {COMMAND_OPERATORS.get(command.type)} {command.value} = {self.state_machine_value}")
+        if Tracer.enabled:
+            Tracer.record(self.node_id, "apply", [command], start_time)
+
+    # FAST PATH OF COMMUTING COMMANDS
+    def can_fast_accept(self):
+        """
+        Members fast accept commands only while they follow, or are, the leader of their current term whose epoch they
+        know. A member promising a higher term stops, so that every command committed on the fast path of a term is
+        known by a member of any phase 1 quorum of the next terms, and reported by it to their leaders.
+        """
+        return self.is_voter() and self.state in (NodeStatus.FOLLOWER, NodeStatus.PROPOSER) and \
+            self.fast_epoch_term == self.current_term and self.promised_term <= self.current_term and \
+            len(self.fast_accepted) < self.parameters.fast_path_max_pending_commands
+
+    def fast_quorum_size(self):
+        # Commuting commands never conflict, so a majority is enough as long as it intersects every phase 1 quorum,
+        # which a phase 1 quorum smaller than a majority does not guarantee
+        number_of_members = len(self.members)
+        return max(majority(number_of_members), number_of_members - self.phase_1_quorum_for(number_of_members) + 1)
+
+    def fast_accept(self, command, eventobj):
+        """
+        Accepts the commuting command without waiting for the leader to order it, and tells the client the term and
+        epoch it is accepted in. The command is kept until it is applied, and reported to the leader if it is not in
+        the log received from the leader within fast_path_report_interval_in_ms.
+        """
+        if not self.can_fast_accept() or command.id <= self.applied_command_ids.get(command.key, 0):
+            return
+        start_time = time.time()
+        self.fast_accepted.setdefault((command.key, command.id), [command, self.clock()])
+        response_payload = {
+            'success': True,
+            'fast': True,
+            'command': command,
+            'term': self.current_term,
+            'epoch': self.fast_epoch,
+            'fastQuorumSize': self.fast_quorum_size()
+        }
+        response_header = PaxosMessageHeader(PaxosMessageTypes.CLIENT_RESPONSE, self.node_id, None)
+        self.send_down(Event(self, PaxosEventTypes.CLIENT_RESPONSE, GenericMessage(response_header, response_payload)))
+        if Tracer.enabled:
+            Tracer.record(self.node_id, "fast_accept", [command], start_time, eventobj)
+
+    def append_fast_command(self, command):
+        """
+        Leader appends a commuting command accepted on the fast path, unless it is already in the log. A client session
+        sends the next command of its key only after the previous one is committed, so a command whose previous command
+        is not in the log yet waits for it, the previous command is reported by the members that fast accepted it.
+        :return: Whether an entry is appended.
+        """
+        known_command_id = max(self.appended_command_ids.get(command.key, 0),
+                               self.applied_command_ids.get(command.key, 0))
+        if command.id <= known_command_id:
+            return False
+        if command.id > known_command_id + 1:
+            self.waiting_fast_commands.setdefault(command.key, {})[command.id] = command
+            return False
+        self.append_client_command(command)
+        return True
+
+    def start_barrier(self, command):
+        """
+        Leader starts a new epoch for a non-commuting command. The command is appended once enough members reported
+        their fast accepts in the new epoch, so that every fast quorum of the previous epochs includes one of them.
+        """
+        if command in self.barrier_commands or command in self.next_barrier_commands:
+            return
+        if self.barrier_commands:
+            # Commands committed on the fast path in the current epoch may have completed before this one is sent
+            self.next_barrier_commands.append(command)
+            return
+        self.barrier_commands = [command]
+        self.begin_epoch()
+
+    def begin_epoch(self):
+        self.fast_epoch += 1
+        self.barrier_acks = {self.node_id}
+        self.send_heartbeat_to_peers()  # Carries the new epoch
+        self.complete_barrier()
+
+    def complete_barrier(self):
+        if not self.barrier_commands or \
+                len(self.barrier_acks) < len(self.members) - self.fast_quorum_size() + 1:
+            return
+        for command in self.barrier_commands:
+            if command.id > self.appended_command_ids.get(command.key, 0):
+                self.append_client_command(command)
+        self.barrier_commands = []
+        self.send_propose_to_peers()
+        if self.next_barrier_commands:
+            self.barrier_commands, self.next_barrier_commands = self.next_barrier_commands, []
+            self.begin_epoch()
+
+    def update_fast_epoch(self, leader_id, payload):
+        """
+        Follows the epoch of the leader. Entering a new epoch, or the first epoch of a new term, the member reports all
+        of its fast accepted commands to the leader, which acknowledges the epoch.
+        """
+        if payload['term'] != self.current_term or self.state != NodeStatus.FOLLOWER:
+            return
+        self.leader_id = leader_id
+        if self.fast_epoch_term != payload['term'] or self.fast_epoch != payload['fastEpoch']:
+            self.fast_epoch_term = payload['term']
+            self.fast_epoch = payload['fastEpoch']
+            self.report_fast_commands(True)
+
+    def report_fast_commands(self, acknowledge=False):
+        """
+        Reports the fast accepted commands that are not applied to the leader, all of them if the report acknowledges
+        the epoch, otherwise only those that are neither in the log received from the leader nor reported within
+        fast_path_report_interval_in_ms.
+        """
+        if self.leader_id is None:
+            return
+        now = self.clock()
+        report_interval = self.parameters.fast_path_report_interval_in_ms / 1000.0
+        commands = []
+        for (key, command_id), accepted in list(self.fast_accepted.items()):
+            if command_id <= self.applied_command_ids.get(key, 0):
+                self.fast_accepted.pop((key, command_id), None)  # Applied, possibly from a snapshot
+            elif acknowledge or (accepted[1] is not None and now - accepted[1] >= report_interval):
+                commands.append(accepted[0])
+                if accepted[1] is not None:
+                    accepted[1] = now
+        if not commands and not acknowledge:
+            return
+        report_payload = {
+            'term': self.current_term,
+            'epoch': self.fast_epoch,
+            'commands': commands,
+            'acknowledge': acknowledge
+        }
+        report_header = PaxosMessageHeader(PaxosMessageTypes.FAST_REPORT, self.node_id, self.leader_id)
+        self.send_to_peer(self.leader_id, Event(self, PaxosEventTypes.FAST_REPORT,
+                                                GenericMessage(report_header, report_payload)))
+
+    def on_fast_report(self, eventobj: Event):
+        """
+        Leader appends the reported commands that are not in its log yet, and counts the epoch acknowledgements of
+        the pending non-commuting commands.
+        """
+        if eventobj.eventcontent.header.messageto != self.node_id or NodeStatus.PROPOSER != self.state:
+            return
+        payload = eventobj.eventcontent.payload
+        appended = False
+        for command in payload['commands']:
+            appended = self.append_fast_command(command) or appended
+        if payload['acknowledge'] and payload['term'] == self.current_term and payload['epoch'] == self.fast_epoch \
+                and eventobj.eventcontent.header.messagefrom in self.members:
+            self.barrier_acks.add(eventobj.eventcontent.header.messagefrom)
+            if self.barrier_commands:
+                self.complete_barrier()
+                return
+        if appended:
+            self.send_propose_to_peers()
+
+    # MEMBERSHIP EVENTS
+    def on_reconfigure(self, eventobj: Event):
+        """
+        Handles a membership change request. Only the proposer acts on it. A node to add, given by 'add_node_id', first
+        joins as a learner and is promoted to a voting member once it has caught up. A node to remove, given by
+        'remove_node_id', is removed from the voting members directly. Each change adds or removes a single voting
+        member, so that quorums of consecutive configurations always intersect.
+        """
+        if NodeStatus.PROPOSER != self.state:
+            return
+        members = list(self.members)
+        learners = list(self.learners)
+        add_node_id = eventobj.eventcontent.get('add_node_id')
+        remove_node_id = eventobj.eventcontent.get('remove_node_id')
+        if add_node_id is not None and add_node_id not in members and add_node_id not in learners:
+            learners.append(add_node_id)
+        elif remove_node_id is not None and remove_node_id in members:
+            members.remove(remove_node_id)
+        else:
+            logger.error(f"{self.node_id} ignores invalid reconfiguration request {eventobj.eventcontent}")
+            return
+        self.propose_configuration(members, learners)
+
+    def promote_learner(self, learner_id):
+        """
+        Makes a learner that has caught up with the commit index a voting member.
+        """
+        members = self.members + [learner_id]
+        learners = [learner for learner in self.learners if learner != learner_id]
+        self.propose_configuration(members, learners)
+
+    def propose_configuration(self, members, learners):
+        """
+        Appends a CONFIGURATION entry to the log and proposes it. The new configuration is used by every node once the
+        entry is committed. Only one configuration change can be in progress at a time.
+        """
+        if self.has_pending_configuration():
+            return
+        try:
+            validate_quorum_sizes(len(members), self.phase_1_quorum_for(len(members)),
+                                  self.phase_2_quorum_for(len(members)))
+        except ValueError as error:
+            logger.error(f"{self.node_id} rejects configuration {members}: {error}")
+            return
+        # Keeps the id of the last command so that duplicate detection of client requests is not affected
+        configuration_command = Command(self.log[-1].command.id, CommandTypes.CONFIGURATION,
+                                        {'members': members, 'learners': learners})
+        new_entry = LogEntry(self.current_term, configuration_command, self.node_id, len(self.log))
+        self.promoted_entries.append(new_entry)
+        self.log.append_entry(new_entry)
+        self.send_propose_to_peers()
+
+    def has_pending_configuration(self):
+        return any(entry.command.type == CommandTypes.CONFIGURATION.value
+                   for entry in self.log[self.commit_index + 1:])
+
+    def apply_configuration(self, configuration):
+        """
+        Switches to the configuration of a committed CONFIGURATION entry. The leader starts replicating to new peers
+        from the beginning of the log and sends a last proposal to removed peers, so that they learn about their removal
+        instead of timing out and starting elections. A leader which is no longer a voting member steps down.
+        """
+        removed_peer_ids = [peer_id for peer_id in self.get_peer_ids()
+                            if peer_id not in configuration['members'] and peer_id not in configuration['learners']]
+        self.members = list(configuration['members'])
+        self.learners = list(configuration['learners'])
+        self.number_of_nodes = len(self.members)
+        logger.error(f"{self.node_id} switched to configuration members={self.members} learners={self.learners}")
+        if self.state == NodeStatus.PROPOSER:
+            for peer_id in self.get_peer_ids():
+                if peer_id not in self.next_index:
+                    self.next_index[peer_id] = 1
+                    self.match_index[peer_id] = 0
+            for peer_id in removed_peer_ids:
+                self.send_propose_to_peer(peer_id)
+            if self.is_voter():
+                self.choose_thrifty_quorum()
+            else:
+                self.transition_to_follower()
+        elif self.state in (NodeStatus.FOLLOWER, NodeStatus.LEARNER):
+            self.transition_to_follower()
+
+    # READ REPLICA (LEARN - LEARN_REQUEST) EVENTS
+    def send_learn_request(self):
+        """
+        Asks the feeder to stream the committed entries after the last applied entry of the read replica.
+        """
+        self.learn_request_pending = True
+        self.reset_timer()
+        header = PaxosMessageHeader(PaxosMessageTypes.LEARN_REQUEST, self.node_id, self.feeder)
+        payload = {'nextIndex': self.commit_index + 1}
+        self.send_to_peer(self.feeder, Event(self, PaxosEventTypes.LEARN_REQUEST, GenericMessage(header, payload)))
+
+    def on_learn_request(self, eventobj: Event):
+        """
+        Handles the learn request of a read replica. Any node except the proposer feeds read replicas, so that the fan-out
+        of the proposer does not grow with the number of replicas. A proposer leaves the request unanswered and the
+        replica moves on to another member.
+        """
+        if eventobj.eventcontent.header.messageto != self.node_id or NodeStatus.PROPOSER == self.state:
+            return
+        replica_id = eventobj.eventcontent.header.messagefrom
+        self.read_replicas[replica_id] = eventobj.eventcontent.payload['nextIndex']
+        self.send_learn(replica_id)
+
+    def feed_read_replicas(self):
+        for replica_id in self.read_replicas:
+            if self.read_replicas[replica_id] <= self.commit_index:
+                self.send_learn(replica_id)
+
+    def send_learn(self, replica_id):
+        """
+        Sends the committed entries that the read replica has not received yet. An empty message is sent when there is no
+        such entry, so that the replica knows the feeder is alive.
+        """
+        next_index = self.read_replicas[replica_id]
+        snapshot = None
+        if next_index <= self.log.snapshot_index:
+            # Compacted entries are replaced by the snapshot, read replicas get it in a single message
+            snapshot = self.snapshot
+            next_index = snapshot.index + 1
+        payload = {
+            'snapshot': snapshot,
+            'prevLogIndex': next_index - 1,
+            'entries': self.log[next_index:self.commit_index + 1]
+        }
+        self.read_replicas[replica_id] = max(next_index, self.commit_index + 1)
+        header = PaxosMessageHeader(PaxosMessageTypes.LEARN, self.node_id, replica_id)
+        self.send_to_peer(replica_id, Event(self, PaxosEventTypes.LEARN, GenericMessage(header, payload)))
+
+    def on_learn(self, eventobj: Event):
+        """
+        Handles committed entries streamed by the feeder. Entries are applied in order, if some entries are missing the
+        replica asks the feeder to send them again.
+        """
+        if eventobj.eventcontent.header.messagefrom != self.feeder:
+            return
+        self.learn_request_pending = False
+        self.reset_timer()
+        if eventobj.eventcontent.payload['snapshot'] is not None:
+            self.install_snapshot(eventobj.eventcontent.payload['snapshot'])
+        if eventobj.eventcontent.payload['prevLogIndex'] > self.commit_index:
+            self.send_learn_request()
+            return
+        learned_entries = []
+        for entry in eventobj.eventcontent.payload['entries']:
+            if entry.index == self.commit_index + 1:
+                self.log.append_entry(entry)
+                self.commit_index = entry.index
+                learned_entries.append(entry)
+        self.apply_entries(learned_entries)
+
+    # Next voting member after the current feeder, used when the feeder does not answer
+    def next_feeder(self):
+        if self.feeder not in self.members:
+            return self.members[0]
+        return self.members[(self.members.index(self.feeder) + 1) % len(self.members)]
+
+    def on_read_request(self, eventobj: Event):
+        """
+        Handles a read request addressed to this node with 'node_id'. The node responds with the value of its state
+        machine and the index of the last applied entry, which may lag behind the commit index of the proposer. With the
+        pipeline, the read is answered by the apply stage after the entries committed before it are applied.
+        """
+        if eventobj.eventcontent['node_id'] != self.node_id:
+            return
+        if self.apply_stage is not None:
+            self.apply_stage.put(self.send_read_response)
+        else:
+            self.send_read_response()
+
+    def send_read_response(self):
+        response_payload = {
+            'success': True,
+            'value': self.state_machine_value,
+            'appliedIndex': self.last_applied
+        }
+        response_header = PaxosMessageHeader(PaxosMessageTypes.READ_RESPONSE, self.node_id, None)
+        response_message = GenericMessage(response_header, response_payload)
+        self.send_down(Event(self, PaxosEventTypes.READ_RESPONSE, response_message))
+
+    # SNAPSHOT (INSTALL_SNAPSHOT - SNAPSHOT_ACK) EVENTS
+    def maybe_create_snapshot(self):
+        """
+        Starts creating a snapshot once snapshot_interval_in_entries entries are applied after the latest snapshot. The
+        state is copied in the handler but serialized in a separate thread, so that handlers of client requests and
+        accepts are not blocked. The node receives the snapshot with a SNAPSHOT_CREATED event. It is called after
+        applying entries, by the apply stage if the pipeline is enabled.
+        """
+        snapshot_index = self.snapshot.index if self.snapshot is not None else 0
+        if self.snapshot_in_progress or self.last_applied - snapshot_index < self.parameters.snapshot_interval_in_entries:
+            return
+        self.snapshot_in_progress = True
+        snapshot_thread = Thread(target=self.create_snapshot, daemon=True,
+                                 args=(self.last_applied, self.last_applied_term, self.capture_state()))
+        snapshot_thread.start()
+
+    def create_snapshot(self, index, term, state):
+        snapshot = Snapshot.create(index, term, state)
+        self.send_self(Event(self, PaxosEventTypes.SNAPSHOT_CREATED, snapshot))
+
+    def on_snapshot_created(self, eventobj: Event):
+        """
+        Keeps the new snapshot and compacts the log, except the last snapshot_retained_entries entries it covers.
+        """
+        self.snapshot_in_progress = False
+        snapshot = eventobj.eventcontent
+        if self.snapshot is None or snapshot.index > self.snapshot.index:
+            self.snapshot = snapshot
+            self.log.compact(snapshot.index - self.parameters.snapshot_retained_entries)
+
+    def capture_state(self):
+        """
+        :return: Copy of the state resulting from the applied entries, i.e. everything a snapshot has to restore.
+        """
+        return {
+            'state_machine_value': self.state_machine_value,
+            'applied_command_ids': dict(self.applied_command_ids),
+            'last_client_command': self.last_client_command,
+            'members': list(self.applied_configuration['members']),
+            'learners': list(self.applied_configuration['learners'])
+        }
+
+    def install_snapshot(self, snapshot):
+        """
+        Replaces the state of the node with the state of a snapshot received from another node. Log entries following
+        the snapshot are kept if the log contains the last entry of the snapshot, otherwise the log restarts after it.
+        With the pipeline, the entries queued in the apply stage are applied first.
+        """
+        if self.apply_stage is not None:
+            self.apply_stage.wait_until_idle()
+        if snapshot.index <= self.last_applied:
+            return
+        state = snapshot.state()
+        if snapshot.index < len(self.log) and self.log[snapshot.index].term == snapshot.term:
+            self.log.compact(snapshot.index)
+        else:
+            self.log.reset(snapshot.index, snapshot.term)
+        self.state_machine_value = state['state_machine_value']
+        self.applied_command_ids = state['applied_command_ids']
+        self.last_client_command = state['last_client_command']
+        self.commit_index = max(self.commit_index, snapshot.index)
+        self.last_applied = snapshot.index
+        self.last_applied_term = snapshot.term
+        self.snapshot = snapshot
+        logger.error(f"{self.node_id} installed {snapshot}")
+        self.applied_configuration = {'members': state['members'], 'learners': state['learners']}
+        self.apply_configuration(self.applied_configuration)
+
+    def send_snapshot_chunk(self, peer_id):
+        """
+        Sends the next chunk of the latest snapshot to a peer lagging behind the compacted part of the log. A transfer
+        keeps the snapshot it started with, and its chunks are catch-up traffic: one chunk in flight and rate-limited.
+        """
+        if peer_id not in self.snapshot_transfers:
+            self.snapshot_transfers[peer_id] = {'snapshot': self.snapshot, 'offset': 0}
+            if peer_id not in self.catch_up_sessions:
+                self.catch_up_sessions[peer_id] = (self.clock(), self.next_index[peer_id])
+        snapshot = self.snapshot_transfers[peer_id]['snapshot']
+        offset = self.snapshot_transfers[peer_id]['offset']
+        data = snapshot.chunk(offset, self.parameters.max_bytes_per_propose)
+        if not self.take_catch_up_budget(len(data)):
+            return
+        self.catch_up_in_flight[peer_id] = self.clock()
+        Statistics.record_catch_up_chunk(0, len(data))
+        payload = {
+            'term': self.current_term,
+            'lastIncludedIndex': snapshot.index,
+            'lastIncludedTerm': snapshot.term,
+            'offset': offset,
+            'data': data,
+            'done': offset + len(data) >= snapshot.size()
+        }
+        header = PaxosMessageHeader(PaxosMessageTypes.INSTALL_SNAPSHOT, self.node_id, peer_id)
+        self.send_to_peer(peer_id, Event(self, PaxosEventTypes.INSTALL_SNAPSHOT, GenericMessage(header, payload)))
+
+    def on_install_snapshot(self, eventobj: Event):
+        """
+        Handles a chunk of a snapshot streamed by the leader. Chunks are collected by a SnapshotReceiver and the
+        snapshot is installed after the last one. The acknowledgement tells the leader the offset of the next chunk
+        expected, so that a missing chunk is sent again.
+        """
+        if eventobj.eventcontent.header.messageto != self.node_id:
+            return
+        payload = eventobj.eventcontent.payload
+        leader_id = eventobj.eventcontent.header.messagefrom
+        done = False
+        if payload['term'] >= self.current_term:
+            self.last_leader_contact_time = self.clock()
+            self.transition_to_follower()
+            if payload['offset'] == 0:
+                self.snapshot_receiver = SnapshotReceiver(payload['lastIncludedIndex'], payload['lastIncludedTerm'],
+                                                          self.parameters.snapshot_memory_limit_in_bytes)
+            receiver = self.snapshot_receiver
+            if receiver is not None and receiver.index == payload['lastIncludedIndex']:
+                receiver.write(payload['offset'], payload['data'])
+                if payload['done'] and receiver.received_bytes == payload['offset'] + len(payload['data']):
+                    self.snapshot_receiver = None
+                    self.install_snapshot(receiver.finish())
+                    done = True
+        ack_payload = {
+            'term': self.current_term,
+            'index': payload['lastIncludedIndex'],
+            'offset': self.snapshot_receiver.received_bytes if self.snapshot_receiver is not None else 0,
+            'done': done
+        }
+        header = PaxosMessageHeader(PaxosMessageTypes.SNAPSHOT_ACK, self.node_id, leader_id)
+        self.send_to_peer(leader_id, Event(self, PaxosEventTypes.SNAPSHOT_ACK, GenericMessage(header, ack_payload)))
+
+    def on_snapshot_ack(self, eventobj: Event):
+        """
+        Leader handles the acknowledgement of a snapshot chunk. It sends the next chunk, or resumes normal replication
+        after the snapshot once the peer has installed it.
+        """
+        if eventobj.eventcontent.header.messageto != self.node_id or NodeStatus.PROPOSER != self.state:
+            return
+        peer_id = eventobj.eventcontent.header.messagefrom
+        payload = eventobj.eventcontent.payload
+        self.catch_up_in_flight.pop(peer_id, None)
+        if payload['term'] > self.current_term:
+            self.current_term = payload['term']
+            self.transition_to_follower()
+            return
+        transfer = self.snapshot_transfers.get(peer_id)
+        if transfer is None or transfer['snapshot'].index != payload['index']:
+            return
+        if payload['done']:
+            del self.snapshot_transfers[peer_id]
+            self.match_index[peer_id] = max(self.match_index[peer_id], payload['index'])
+            self.next_index[peer_id] = payload['index'] + 1
+            self.finish_catch_up(peer_id)
+            if self.next_index[peer_id] < len(self.log):
+                self.send_propose_to_peer(peer_id)
+        else:
+            transfer['offset'] = payload['offset']
+            self.send_snapshot_chunk(peer_id)
+
+    # LEADERSHIP TRANSFER EVENTS
+    def on_transfer_leadership(self, eventobj: Event):
+        """
+        Handles the request to hand over leadership, e.g. before maintenance of the leader. The event content may name
+        the target node with 'target_node_id', otherwise the most up-to-date peer is chosen.
+        """
+        if NodeStatus.PROPOSER != self.state:
+            return
+        target_node_id = None
+        if eventobj.eventcontent is not None:
+            target_node_id = eventobj.eventcontent.get('target_node_id')
+        self.start_leadership_transfer(target_node_id)
+
+    def start_leadership_transfer(self, target_node_id=None, excluded_node_ids=()):
+        """
+        Starts handing over leadership to the target peer. The leader stops accepting client requests, sends the
+        missing entries to the target until its match index reaches the end of the log and then tells it to start an
+        election immediately with a TIMEOUT_NOW message. Write unavailability is then about one round trip instead of
+        a full timeout followed by an election.
+        :param target_node_id: Voting peer to hand over leadership to, the most up-to-date one if None.
+        :param excluded_node_ids: Peers that are not chosen as target, e.g. the nodes put to sleep with the leader.
+        :return: Whether the transfer started, it does not if the target is not a voting peer or no peer is left.
+        """
+        voting_peer_ids = self.get_voting_peer_ids()
+        if target_node_id is None:
+            candidate_ids = [peer_id for peer_id in voting_peer_ids if peer_id not in excluded_node_ids]
+            if not candidate_ids:
+                logger.error(f"{self.node_id} has no peer to transfer leadership to")
+                return False
+            target_node_id = max(candidate_ids, key=lambda peer_id: self.match_index[peer_id])
+        elif target_node_id not in voting_peer_ids:
+            logger.error(f"{self.node_id} cannot transfer leadership to {target_node_id}, it is not a voting peer")
+            return False
+        logger.error(f"{self.node_id} is transferring leadership to {target_node_id}")
+        Statistics.start_time_for_election()
+        self.transfer_target = target_node_id
+        self.transfer_start_time = self.clock()
+        if self.match_index[target_node_id] == len(self.log) - 1:
+            self.send_timeout_now(target_node_id)
+        else:
+            self.send_propose_to_peer(target_node_id)
+        return True
+
+    def send_timeout_now(self, peer_id):
+        """
+        Tells the up-to-date transfer target to start its prepare phase without waiting for its timeout. The leader
+        steps down at once, so that it accepts no client request until the target or another node is elected.
+        """
+        header = PaxosMessageHeader(PaxosMessageTypes.TIMEOUT_NOW, self.node_id, peer_id)
+        self.send_to_peer(peer_id, Event(self, PaxosEventTypes.TIMEOUT_NOW,
+                                         GenericMessage(header, {'term': self.current_term})))
+        self.transition_to_follower()
+        self.complete_leadership_transfer()
+
+    def complete_leadership_transfer(self):
+        """
+        Ends the leadership transfer. If the transfer is started by a sleep trigger, the postponed sleep starts now.
+        """
+        self.transfer_target = None
+        self.transfer_start_time = None
+        if self.pending_sleep_time is not None:
+            time_to_sleep = self.pending_sleep_time
+            self.pending_sleep_time = None
+            logger.debug(f"Former leader {self.node_id} is sleeping for {time_to_sleep} seconds")
+            self.pause(time_to_sleep)
+
+    def on_timeout_now(self, eventobj: Event):
+        """
+        Handles the TIMEOUT_NOW message of the leader handing over leadership. The node skips the pre-vote round since
+        the current leader is stepping down, and sends its prepare message immediately.
+        """
+        if eventobj.eventcontent.header.messageto != self.node_id:
+            return
+        if eventobj.eventcontent.payload['term'] < self.current_term or not self.is_voter():
+            return
+        self.transition_to_candidate()
+        self.send_prepare_to_peers()
 
     # STATE TRANSITIONS
     def transition_to_proposer(self):
-        if self.current_term != self.number_of_nodes:
+        if self.current_term != self.startup_term:
             Statistics.increment_leader_changes()
             Statistics.add_time_during_election()
         logger.error(f"{self.node_id} is transitioning to leader")
         self.state = NodeStatus.PROPOSER
+        self.transfer_target = None
+        self.read_replicas = {}
+        self.fill_promoted_entries()
         peer_ids = self.get_peer_ids()
         self.next_index = {peer_id: self.commit_index + 1 for peer_id in peer_ids}
         self.match_index = {peer: 0 for peer in peer_ids}
+        self.propose_send_times = {}
+        self.catch_up_sessions = {}
+        self.catch_up_in_flight = {}
+        self.snapshot_transfers = {}
+        self.admission_controller.reset()
+        self.appended_command_ids = {}
+        for entry in self.log.entries:
+            if entry.command.type != CommandTypes.CONFIGURATION.value:
+                key = entry.command.key
+                self.appended_command_ids[key] = max(entry.command.id, self.appended_command_ids.get(key, 0))
+        self.fast_epoch = 0
+        self.fast_epoch_term = self.current_term
+        self.waiting_fast_commands = {}
+        self.barrier_commands = []
+        self.next_barrier_commands = []
+        if self.apply_stage is not None:
+            # The apply stage drops applied commands from fast_accepted, they are not appended again either
+            self.apply_stage.wait_until_idle()
+        for command, _ in sorted(self.fast_accepted.values(), key=lambda accepted: accepted[0].id):
+            self.append_fast_command(command)
+        self.choose_thrifty_quorum()
         self.send_heartbeat_to_peers()
+        if self.promoted_entries:
+            # Entries recovered from promises are proposed right away, not only with the next client request
+            self.send_propose_to_peers()
         self.send_client_response()
 
     def transition_to_candidate(self):
+        # The leader has been unavailable since the last contact with it, which includes the failure detection time
+        time_since_last_contact = self.clock() - self.last_timer_reset_time
         self.state = NodeStatus.CANDIDATE
         self.reset_timer()
-        if self.current_term > self.number_of_nodes:
-            Statistics.start_time_for_election()
+        self.timeout = self.randomized_timeout()
+        if self.current_term > self.startup_term:
+            Statistics.start_time_for_election(time.time() - time_since_last_contact)
 
     def transition_to_follower(self):
-        self.state = NodeStatus.FOLLOWER
+        self.state = NodeStatus.FOLLOWER if self.is_voter() else NodeStatus.LEARNER
         self.reset_timer()
 
     def transition_to_acceptor(self, given_term):
@@ -437,20 +1592,116 @@ class PaxosNode(GenericModel):
         self.state = NodeStatus.ACCEPTOR
         self.reset_timer()
 
-    # All ids created with numbers in range self.number_of_nodes + 1 except node's id
+    # All members and learners of the configuration except node's id, the leader replicates its log to them
     def get_peer_ids(self):
-        return [f'PaxosNode_{i}' for i in range(1, self.number_of_nodes + 1) if f'PaxosNode_{i}' != self.node_id]
+        return [node_id for node_id in self.members + self.learners if node_id != self.node_id]
+
+    # Voting members of the configuration except node's id
+    def get_voting_peer_ids(self):
+        return [node_id for node_id in self.members if node_id != self.node_id]
+
+    def is_voter(self):
+        return self.node_id in self.members
+
+    def phase_1_quorum(self):
+        """
+        Number of nodes (including the candidate itself) that must promise before the candidate becomes proposer.
+        """
+        return self.phase_1_quorum_for(self.number_of_nodes)
+
+    def phase_2_quorum(self):
+        """
+        Number of nodes (including the proposer itself) that must accept an entry before it is committed.
+        """
+        return self.phase_2_quorum_for(self.number_of_nodes)
+
+    def phase_1_quorum_for(self, number_of_nodes):
+        if self.phase_1_quorum_size is None:
+            return majority(number_of_nodes)
+        return self.phase_1_quorum_size
+
+    def phase_2_quorum_for(self, number_of_nodes):
+        quorum = majority(number_of_nodes) if self.phase_2_quorum_size is None else self.phase_2_quorum_size
+        if self.parameters.erasure_coding_enabled:
+            # Every phase 1 quorum must share k members with every phase 2 quorum, see paxos/erasure.py
+            quorum = max(quorum, number_of_nodes - self.phase_1_quorum_for(number_of_nodes) +
+                         self.erasure_coding_data_fragments(number_of_nodes))
+        return quorum
+
+    def erasure_coding_data_fragments(self, number_of_nodes):
+        """
+        Number of fragments rebuilding a payload, at most the phase 1 quorum so that the raised phase 2 quorum exists.
+        """
+        return max(1, min(self.parameters.erasure_coding_data_fragments, self.phase_1_quorum_for(number_of_nodes)))
 
     def on_heartbeat(self, eventobj):
+        if self.checkpoints:
+            self.drop_abandoned_checkpoints()
         if self.state == NodeStatus.PROPOSER:
+            if self.transfer_target is not None and self.clock() - self.transfer_start_time > self.base_timeout:
+                logger.error(f"{self.node_id} could not transfer leadership to {self.transfer_target} in time")
+                self.complete_leadership_transfer()
+                return
             self.send_heartbeat_to_peers()
+            self.continue_catch_up()
+            if self.thrifty:
+                self.update_thrifty_replication()
+        elif self.feeder is not None:
+            if self.is_timeout():
+                if self.learn_request_pending:
+                    self.feeder = self.next_feeder()
+                self.send_learn_request()
         elif self.state == NodeStatus.FOLLOWER and self.is_timeout() and self.promised_term <= self.current_term:
             self.transition_to_candidate()
-        elif self.state == NodeStatus.CANDIDATE and self.is_timeout() > self.timeout:
-            self.send_prepare_to_peers()
+            if self.pre_vote:
+                self.send_pre_prepare_to_peers()
+        elif self.state == NodeStatus.FOLLOWER and self.fast_accepted:
+            self.report_fast_commands()
+        elif self.state == NodeStatus.CANDIDATE and self.is_timeout():
+            if self.pre_vote:
+                self.send_pre_prepare_to_peers()
+            else:
+                self.send_prepare_to_peers()
+
+    def send_to_peer(self, peer_id, event: Event):
+        """
+        Delivers the event only to the given peer. Unlike send_peer, which triggers the event on every peer connector
+        and leaves filtering by header to the receivers, this costs a single delivery.
+        """
+        peer = self.peer_component(peer_id)
+        if peer is None:
+            logger.error(f"{self.node_id} has no peer connector to {peer_id}")
+            return
+        self.count_sent_messages(1)
+        if self.send_stage is not None:
+            self.send_stage.put(peer.trigger_event, event)
+        else:
+            peer.trigger_event(event)
+
+    def peer_component(self, peer_id):
+        """
+        :return: The peer component with the given node id, or None if it is not connected.
+        """
+        peer = self.peer_components.get(peer_id)
+        if peer is None:
+            for component in self.connectors.get(ConnectorTypes.PEER, []):
+                if getattr(component, 'node_id', None) == peer_id:
+                    peer = component
+                    self.peer_components[peer_id] = component
+                    break
+        return peer
+
+    def send_peer(self, event: Event):
+        self.count_sent_messages(len(self.connectors.get(ConnectorTypes.PEER, [])))
+        super().send_peer(event)
+
+    def count_sent_messages(self, count):
+        self.sent_message_count += count
+        if self.state == NodeStatus.PROPOSER:
+            self.sent_message_count_as_proposer += count
 
     def reset_timer(self):
-        self.last_timer_reset_time = time.time()
+        self.last_timer_reset_time = self.clock()
 
     def on_sleep_trigger(self, eventobj: Event):
         """
@@ -460,10 +1711,12 @@ class PaxosNode(GenericModel):
         time_to_sleep = eventobj.eventcontent['time_to_sleep']
         sleep_leader = eventobj.eventcontent['sleep_leader']
         target_nodes = eventobj.eventcontent['target_node_ids']
-        if self.state == NodeStatus.PROPOSER and ALWAYS_SLEEP_LEADER:
+        if self.state == NodeStatus.PROPOSER and self.parameters.always_sleep_leader:
+            if self.parameters.transfer_leadership_before_sleep and \
+                    self.postpone_sleep_for_transfer(time_to_sleep, target_nodes):
+                return
             logger.debug(f"Leader {self.node_id} is sleeping for {time_to_sleep} seconds")
-            time.sleep(time_to_sleep)
-            self.transition_to_follower()
+            self.pause(time_to_sleep)
         elif self.node_id in target_nodes:
             if self.state == NodeStatus.PROPOSER and not sleep_leader:
                 non_leader_peer = self.choose_random_non_leader_peer(target_nodes)
@@ -472,11 +1725,338 @@ class PaxosNode(GenericModel):
                 trigger_sleep_event = Event(self, PaxosEventTypes.SLEEP_TRIGGER, payload)
                 self.send_peer(trigger_sleep_event)
             if self.state == NodeStatus.PROPOSER and sleep_leader:
+                if self.parameters.transfer_leadership_before_sleep and \
+                        self.postpone_sleep_for_transfer(time_to_sleep, target_nodes):
+                    return
                 logger.critical(f"{self.node_id} is sleeping for {time_to_sleep} seconds as a leader")
             logger.error(f"{self.node_id} is sleeping for {time_to_sleep} seconds")
-            time.sleep(time_to_sleep)
-            logger.critical(f"{self.node_id} is waking up from sleep with last_applied: {self.last_applied}")
+            self.pause(time_to_sleep)
+
+    def postpone_sleep_for_transfer(self, time_to_sleep, sleeping_node_ids):
+        """
+        Hands over leadership before the leader sleeps, to a voting peer that the same trigger does not put to sleep.
+        :return: Whether the sleep is postponed until the transfer completes. It is not if no peer is left to hand over
+        leadership to, the leader then sleeps right away.
+        """
+        if self.transfer_target is not None:
+            return True  # The sleep of the transfer in progress is pending already
+        # Set before the transfer starts, since an up-to-date target completes it at once
+        self.pending_sleep_time = time_to_sleep
+        if self.start_leadership_transfer(excluded_node_ids=sleeping_node_ids):
+            return True
+        self.pending_sleep_time = None
+        return False
+
+    # FAULTS
+    def trigger_event(self, eventobj: Event):
+        """
+        Every event delivered to the node passes through here. If a network emulator is attached, messages of peers
+        first cross the emulated link from their sender and reach the node later with receive_from_network.
+        """
+        if self.network is not None:
+            self.network.on_event(self, eventobj)
+        else:
+            self.receive_from_network(eventobj)
+
+    def receive_from_network(self, eventobj: Event):
+        """
+        If a fault injector is attached, it decides whether messages of peers are dropped, delayed or duplicated, and
+        delivers the rest with deliver_event.
+        """
+        if self.fault_injector is not None:
+            self.fault_injector.on_event(self, eventobj)
+        else:
+            self.deliver_event(eventobj)
+
+    def deliver_event(self, eventobj: Event):
+        """
+        Queues the event for the handlers. A crashed node loses the event. A paused node keeps it until it resumes,
+        except heartbeats which are generated again anyway.
+        """
+        if eventobj.event == EventTypes.EXIT:
+            super().trigger_event(eventobj)
+            return
+        with self.fault_lock:
+            if self.crashed:
+                return
+            if self.paused:
+                if eventobj.event != PaxosEventTypes.HEARTBEAT:
+                    self.paused_events.append(eventobj)
+                return
+            super().trigger_event(eventobj)
+
+    def pause(self, duration=None):
+        """
+        Stops handling events, e.g. to simulate a long garbage collection or an overloaded host, without blocking the
+        worker thread of the node. The node resumes after the given duration in seconds, or when resume is called.
+        """
+        with self.fault_lock:
+            self.paused = True
+        if duration is not None:
+            resume_timer = Timer(duration, self.resume)
+            resume_timer.daemon = True
+            resume_timer.start()
+
+    def resume(self):
+        with self.fault_lock:
+            if not self.paused:
+                return
+            self.paused = False
+            super().trigger_event(Event(self, PaxosEventTypes.RESUME, None))
+            while self.paused_events:
+                super().trigger_event(self.paused_events.popleft())
+
+    def on_resume(self, eventobj: Event):
+        logger.critical(f"{self.node_id} is waking up from sleep with last_applied: {self.last_applied}")
+        self.transition_to_follower()
+
+    def queue_handler(self, myqueue):
+        """
+        Handles the events of the queue as GenericModel does, each under the handler lock. A crashed node drops the
+        events it dequeues, except the exit event, since one may be dequeued while the node crashes.
+        """
+        while not self.terminated:
+            workitem = myqueue.get()
+            with self.handler_lock:
+                if self.crashed and workitem.event != EventTypes.EXIT:
+                    pass
+                elif workitem.event in self.eventhandlers:
+                    self.on_pre_event(workitem)
+                    self.eventhandlers[workitem.event](eventobj=workitem)
+                else:
+                    logger.error(f"{self.componentname}.{self.componentinstancenumber} Event Handler: {workitem.event} "
+                                 f"is not implemented")
+            myqueue.task_done()
+
+    def crash(self):
+        """
+        Stops the node, it loses the events waiting in its queue and every event until it restarts. The crash waits for
+        the handler in progress, if any, so that no handler runs on the node once it has crashed.
+        """
+        with self.handler_lock, self.fault_lock:
+            self.crashed = True
+            self.paused = False
+            self.paused_events.clear()
+            while True:
+                try:
+                    self.inputqueue.get_nowait()
+                    self.inputqueue.task_done()
+                except queue.Empty:
+                    break
+        if self.send_stage is not None:
+            self.send_stage.clear()
+        logger.critical(f"{self.node_id} crashed")
+
+    def restart(self):
+        with self.fault_lock:
+            if not self.crashed:
+                return
+            self.crashed = False
+            super().trigger_event(Event(self, PaxosEventTypes.RESTART, None))
+
+    def on_restart(self, eventobj: Event):
+        """
+        Restarts the node after a crash. The log, terms and snapshot are kept as if they were on stable storage, the
+        state of the role the node had is lost and it restarts as a follower.
+        """
+        logger.critical(f"{self.node_id} is restarting with last_applied: {self.last_applied}")
+        self.transfer_target = None
+        self.pending_sleep_time = None
+        self.promises_received = set()
+        self.pre_promises_received = set()
+        self.catch_up_sessions = {}
+        self.catch_up_in_flight = {}
+        self.snapshot_transfers = {}
+        self.snapshot_receiver = None
+        self.read_replicas = {}
+        self.learn_request_pending = False
+        self.transition_to_follower()
+
+    # CHECKPOINTS OF THE CLUSTER
+    def checkpoint_channels(self):
+        """
+        :return: Node ids of the peers, the checkpoint of the node is complete once each of them sent its marker.
+        """
+        return {component.node_id for component in self.connectors.get(ConnectorTypes.PEER, [])
+                if isinstance(component, PaxosNode)}
+
+    def checkpoint(self, checkpoint_id):
+        instance = self.checkpoints.get(checkpoint_id)
+        if instance is None:
+            instance = self.checkpoints[checkpoint_id] = ChandyLamportInstance(checkpoint_id)
+        return instance
+
+    def on_take_checkpoint(self, eventobj: Event):
+        instance = self.checkpoint(eventobj.eventcontent)
+        instance.init_snapshot = True
+        if instance.state is None:
+            self.record_checkpoint(instance)
+            self.complete_checkpoint(instance)
+
+    def record_checkpoint(self, instance):
+        """
+        Records the state of the node and sends the marker of the checkpoint to every peer. With the pipeline, the
+        committed entries are applied and the messages to peers are sent first, and the markers are sent directly, so
+        that they follow every message sent before the state is recorded and precede every message sent after it.
+        """
+        if self.apply_stage is not None:
+            self.apply_stage.wait_until_idle()
+        if self.send_stage is not None:
+            self.send_stage.wait_until_idle()
+        instance.state = NodeCheckpoint(self.node_id, self.capture_checkpoint_state(), self.log.snapshot_index,
+                                        list(self.log.entries), self.snapshot)
+        for peer_id in self.checkpoint_channels():
+            header = PaxosMessageHeader(PaxosMessageTypes.CHECKPOINT_MARKER, self.node_id, peer_id)
+            self.count_sent_messages(1)
+            self.peer_component(peer_id).trigger_event(
+                Event(self, PaxosEventTypes.CHECKPOINT_MARKER,
+                      GenericMessage(header, {'checkpointId': instance.snapshot_id})))
+
+    def capture_checkpoint_state(self):
+        """
+        :return: Copy of the state resulting from the applied entries, together with the terms, role and indexes of the
+        node and the commands it fast accepted, i.e. everything but the log and snapshot that a checkpoint has to
+        restore. A command fast accepted by a fast quorum is committed even if it is in no log yet.
+        """
+        state = self.capture_state()
+        state.update({
+            'status': self.state,
+            'current_term': self.current_term,
+            'promised_term': self.promised_term,
+            'commit_index': self.commit_index,
+            'last_applied': self.last_applied,
+            'last_applied_term': self.last_applied_term,
+            'fast_accepted': {command_key: (command, report_time is None)
+                              for command_key, (command, report_time) in self.fast_accepted.items()},
+            'fast_epoch': self.fast_epoch,
+            'fast_epoch_term': self.fast_epoch_term
+        })
+        return state
+
+    def on_checkpoint_marker(self, eventobj: Event):
+        """
+        Handles the marker of a checkpoint sent by a peer. The first marker of a checkpoint makes the node record its
+        state, the channel from the peer has no message in transit then. Otherwise, the messages received from the peer
+        since the state was recorded were in transit on the channel.
+        """
+        header = eventobj.eventcontent.header
+        if header.messageto != self.node_id:
+            return
+        instance = self.checkpoint(eventobj.eventcontent.payload['checkpointId'])
+        if instance.state is None:
+            self.record_checkpoint(instance)
+            instance.in_chnl_states[header.messagefrom] = []
+        else:
+            instance.in_chnl_states[header.messagefrom] = instance.in_chnl_events.pop(header.messagefrom, [])
+        instance.mark_recv_chnls.add(header.messagefrom)
+        self.complete_checkpoint(instance)
+
+    def on_pre_event(self, event):
+        if self.checkpoints and event.event != PaxosEventTypes.CHECKPOINT_MARKER:
+            self.record_channel_message(event)
+
+    def record_channel_message(self, event):
+        """
+        Records the message of a peer as in transit for every checkpoint whose state is recorded but whose marker has
+        not arrived from the peer yet.
+        """
+        header = getattr(event.eventcontent, 'header', None)
+        if header is None or header.messageto not in (None, self.node_id):
+            return
+        recorded_event = None
+        for instance in self.checkpoints.values():
+            if instance.state is not None and header.messagefrom not in instance.in_chnl_states:
+                if recorded_event is None:
+                    recorded_event = detached_event(event)
+                instance.in_chnl_events[header.messagefrom].append(recorded_event)
+
+    def complete_checkpoint(self, instance):
+        """
+        Reports the checkpoint of the node once the marker of every peer has arrived.
+        """
+        if instance.state is None or not instance.mark_recv_chnls >= self.checkpoint_channels():
+            return
+        del self.checkpoints[instance.snapshot_id]
+        instance.state.channel_messages = dict(instance.in_chnl_states)
+        logger.info(f"{self.node_id} completed {instance.state}")
+        ClusterCheckpoint.report(instance.snapshot_id, instance.state)
+
+    def drop_abandoned_checkpoints(self):
+        """
+        Drops the checkpoints that are not taken anymore, e.g. after a timeout, so that the node stops recording
+        messages for them.
+        """
+        for checkpoint_id in list(self.checkpoints):
+            if not ClusterCheckpoint.is_pending(checkpoint_id):
+                del self.checkpoints[checkpoint_id]
+
+    def restore_checkpoint(self, checkpoint: NodeCheckpoint):
+        """
+        Restores the state of the node recorded in a checkpoint of the cluster. It is called before the node starts,
+        the node then resumes from the checkpoint, see resume_from_checkpoint.
+        """
+        state = checkpoint.state
+        self.log.restore(checkpoint.log_snapshot_index, checkpoint.log_entries)
+        self.snapshot = checkpoint.snapshot
+        self.state_machine_value = state['state_machine_value']
+        self.applied_command_ids = dict(state['applied_command_ids'])
+        self.last_client_command = state['last_client_command']
+        self.members = list(state['members'])
+        self.learners = list(state['learners'])
+        self.applied_configuration = {'members': list(self.members), 'learners': list(self.learners)}
+        self.number_of_nodes = len(self.members)
+        self.current_term = state['current_term']
+        self.promised_term = state['promised_term']
+        self.commit_index = state['commit_index']
+        self.last_applied = state['last_applied']
+        self.last_applied_term = state['last_applied_term']
+        # Fast accepted commands that are not in the log of the leader are reported to it at the first heartbeat, and
+        # re-appended by the leader of the checkpoint when it becomes proposer again
+        self.fast_accepted = {command_key: [command, None if in_leader_log else 0.0]
+                              for command_key, (command, in_leader_log) in state['fast_accepted'].items()}
+        self.fast_epoch = state['fast_epoch']
+        self.fast_epoch_term = state['fast_epoch_term']
+        # The leadership of the checkpoint is not counted as a leader change
+        self.startup_term = self.current_term
+        self.restored_checkpoint = checkpoint
+
+    def resume_from_checkpoint(self):
+        """
+        Starts the node restored from a checkpoint without the startup election: the leader of the checkpoint becomes
+        proposer again, which resends the uncommitted entries, other nodes become followers or learners. The messages
+        in transit to the node at the checkpoint are delivered again.
+        """
+        checkpoint = self.restored_checkpoint
+        self.restored_checkpoint = None
+        logger.error(f"{self.node_id} is resuming from {checkpoint}")
+        if self.feeder is not None:
+            self.state = NodeStatus.LEARNER
+            self.send_learn_request()
+        elif checkpoint.state['status'] == NodeStatus.PROPOSER and self.is_voter():
+            self.transition_to_proposer()
+        else:
             self.transition_to_follower()
+        for peer_id, events in checkpoint.channel_messages.items():
+            peer = self.peer_component(peer_id)
+            for event in events:
+                event.eventsource = peer
+                self.trigger_event(event)
+
+    def clock(self):
+        """
+        Local clock of the node in seconds. It is the real time unless a clock skew is injected.
+        """
+        now = time.time()
+        return now + self.clock_offset + (now - self.clock_reference) * self.clock_drift
+
+    def set_clock_skew(self, offset, drift=0.0):
+        """
+        :param offset: Seconds added to the real time from now on.
+        :param drift: Seconds the clock gains (or loses if negative) per real second from now on.
+        """
+        self.clock_reference = time.time()
+        self.clock_offset = offset
+        self.clock_drift = drift
 
     def choose_random_non_leader_peer(self, exempt_list):
         """
@@ -490,4 +2070,12 @@ class PaxosNode(GenericModel):
         return [random.choice(peer_ids)]
 
     def is_timeout(self):
-        return time.time() - self.last_timer_reset_time > self.timeout
+        return self.clock() - self.last_timer_reset_time > self.timeout
+
+    def randomized_timeout(self):
+        """
+        Draws a new election timeout from [base timeout, base timeout + jitter], so that nodes of the cluster do not
+        time out at the same moment and start competing elections after the leader fails.
+        """
+        return self.base_timeout + random.uniform(0, self.timeout_jitter)
+
@@ -0,0 +1,94 @@
+"""
+Stages of the pipeline of a Paxos node. Without the pipeline, the single worker thread of a node handles a message,
+appends to the log, sends the accept, advances the commit index and applies the committed entries before it handles
+the next message, so the latency of accepts includes the cost of applying entries.
+
+With the pipeline, the worker thread of the node is the ingress stage: it handles the messages and runs the protocol,
+i.e. appends to the log and tracks the commit index, which share the state of elections and cannot run concurrently
+with them. Messages to peers, such as accepts and proposals, are handed over to the send stage, and committed entries
+to the apply stage, which applies them to the state machine and responds to the client. Each stage has its own worker
+thread and a bounded queue, a full queue blocks the stage handing work over until the next stage catches up, so that
+a slow state machine slows replication down instead of letting the committed but unapplied entries grow without limit.
+Stages only hand work over to later stages or to the unbounded input queues of other components, so the blocking does
+not form a cycle.
+"""
+import queue
+import time
+from threading import Thread
+
+from adhoccomputing.Generics import logger
+
+
+class PipelineStage:
+    """
+    Stage of the pipeline, a worker thread calling the functions put in its bounded queue in order.
+    """
+
+    def __init__(self, name, capacity):
+        """
+        :param name: Name of the stage, used in its thread name and by the profiler.
+        :param capacity: Number of items the queue of the stage holds before put blocks.
+        """
+        self.name = name
+        self.inputqueue = queue.Queue(maxsize=capacity)
+        self.running = True
+        self.processed_items = 0
+        self.blocked_time = 0.0  # Time in seconds that put waited for the queue to have room
+        self.worker = Thread(target=self.run, daemon=True, name=name)
+        self.worker.start()
+
+    def put(self, function, *args):
+        """
+        Queues the call of the function with the given arguments, waiting for room in the queue if it is full.
+        """
+        try:
+            self.inputqueue.put_nowait((function, args))
+        except queue.Full:
+            start_time = time.perf_counter()
+            self.inputqueue.put((function, args))
+            self.blocked_time += time.perf_counter() - start_time
+
+    def run(self):
+        while self.running:
+            item = self.inputqueue.get()
+            try:
+                if item is not None:
+                    function, args = item
+                    function(*args)
+                    self.processed_items += 1
+            except Exception:
+                # The stage goes on with the next item, a stopped worker would block the stages before it forever
+                logger.exception(f"Stage {self.name} failed")
+            finally:
+                self.inputqueue.task_done()
+
+    def wait_until_idle(self):
+        """
+        Waits until every queued item is processed. It must not be called by the worker of the stage.
+        """
+        self.inputqueue.join()
+
+    def clear(self):
+        """
+        Drops the queued items that are not processed yet.
+        """
+        while True:
+            try:
+                self.inputqueue.get_nowait()
+                self.inputqueue.task_done()
+            except queue.Empty:
+                break
+
+    def stop(self):
+        self.running = False
+        try:
+            self.inputqueue.put_nowait(None)
+        except queue.Full:
+            pass  # The worker sees that it is stopped after its next item
+
+    def summary(self):
+        return {
+            'processed_items': self.processed_items,
+            'queued_items': self.inputqueue.qsize(),
+            'blocked_time': self.blocked_time
+        }
@@ -0,0 +1,229 @@
+"""
+Profiling of the event handlers and input queues of nodes. Instrumented components have their registered event handlers
+wrapped, so that the time spent in each handler is collected in a histogram for each event type, and a sampler thread
+periodically collects the depth of their input queues, and of the queues of their pipeline stages if they have any.
+Components that are not instrumented are left untouched, so profiling costs nothing when it is disabled.
+
+The results are logged as tables, periodically while the experiment runs if a report interval is given and at its end,
+and can be written to a JSON file.
+"""
+import json
+import time
+from threading import Thread, Lock
+
+from adhoccomputing.Generics import *
+
+HISTOGRAM_BUCKETS = 64
+
+
+class Histogram:
+    """
+    Histogram with a bucket for each power of two, so that recording a value costs a constant time and memory does not
+    grow with the number of values. Percentiles are the upper bounds of the buckets, i.e. exact within a factor of two.
+    """
+
+    def __init__(self, scale=1.0):
+        """
+        :param scale: Factor applied to the values before bucketing, e.g. 1000000 to bucket seconds by microseconds.
+        """
+        self.scale = scale
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.buckets = [0] * HISTOGRAM_BUCKETS
+
+    def record(self, value):
+        self.count += 1
+        self.total += value
+        if value > self.max:
+            self.max = value
+        self.buckets[min(int(value * self.scale).bit_length(), HISTOGRAM_BUCKETS - 1)] += 1
+
+    def percentile(self, percent):
+        rank = percent / 100.0 * self.count
+        cumulative_count = 0
+        for bucket, bucket_count in enumerate(self.buckets):
+            cumulative_count += bucket_count
+            if cumulative_count >= rank and bucket_count:
+                return min(((1 << bucket) - 1) / self.scale, self.max)
+        return self.max
+
+    def summary(self):
+        if self.count == 0:
+            return {'count': 0}
+        return {
+            'count': self.count,
+            'total': self.total,
+            'mean': self.total / self.count,
+            'p50': self.percentile(50),
+            'p99': self.percentile(99),
+            'max': self.max
+        }
+
+
+class Profiler:
+    enabled = False
+    handler_times = {}  # for each (component name, event type name), Histogram of the handler durations in seconds
+    queue_depths = {}  # for each component or pipeline stage name, Histogram of the sampled queue depths
+    queues = []  # (name, queue) of the instrumented components and of their pipeline stages
+    sample_interval = 0.01
+    report_interval = None
+    running = False
+    start_time = None
+    lock = Lock()
+
+    @classmethod
+    def configure(cls, enabled, sample_interval=0.01, report_interval=None):
+        """
+        Clears the collected results.
+        :param enabled: Whether components are instrumented.
+        :param sample_interval: Interval between two samples of the queue depths, in seconds.
+        :param report_interval: Interval between two summary tables logged while running, in seconds. None means that
+        the summary is logged only when the profiler stops.
+        """
+        cls.enabled = enabled
+        cls.handler_times = {}
+        cls.queue_depths = {}
+        cls.queues = []
+        cls.sample_interval = sample_interval
+        cls.report_interval = report_interval
+        cls.running = False
+        cls.start_time = None
+
+    @classmethod
+    def reset(cls):
+        cls.configure(False)
+
+    @classmethod
+    def instrument(cls, component):
+        """
+        Wraps the event handlers registered by the component, if profiling is enabled. It has to be called after the
+        component registers its handlers, i.e. after it is created.
+        """
+        if not cls.enabled:
+            return
+        name = component_name(component)
+        for event_type, handler in list(component.eventhandlers.items()):
+            component.eventhandlers[event_type] = cls.timed_handler(name, event_type, handler)
+        queues = [(name, component.inputqueue)]
+        queues.extend((stage.name, stage.inputqueue) for stage in getattr(component, 'pipeline_stages', []))
+        with cls.lock:
+            for queue_name, sampled_queue in queues:
+                cls.queues.append((queue_name, sampled_queue))
+                cls.queue_depths[queue_name] = Histogram()
+
+    @classmethod
+    def timed_handler(cls, component_name, event_type, handler):
+        histogram = cls.handler_times.setdefault((component_name, getattr(event_type, 'name', str(event_type))),
+                                                 Histogram(1000000))
+
+        def timed(eventobj):
+            start_time = time.perf_counter()
+            try:
+                return handler(eventobj=eventobj)
+            finally:
+                histogram.record(time.perf_counter() - start_time)
+
+        return timed
+
+    @classmethod
+    def start(cls):
+        """
+        Starts sampling the queue depths of the instrumented components and of their pipeline stages.
+        """
+        if not cls.enabled:
+            return
+        cls.running = True
+        cls.start_time = time.time()
+        sampler_thread = Thread(target=cls.sample_queue_depths, daemon=True)
+        sampler_thread.start()
+
+    @classmethod
+    def stop(cls):
+        """
+        Stops sampling and logs the summary tables.
+        """
+        if not cls.enabled:
+            return
+        cls.running = False
+        cls.log_summary()
+
+    @classmethod
+    def sample_queue_depths(cls):
+        last_report_time = time.time()
+        while cls.running:
+            with cls.lock:
+                queues = list(cls.queues)
+            for name, sampled_queue in queues:
+                cls.queue_depths[name].record(sampled_queue.qsize())
+            if cls.report_interval is not None and time.time() - last_report_time >= cls.report_interval:
+                last_report_time = time.time()
+                cls.log_summary()
+            time.sleep(cls.sample_interval)
+
+    @classmethod
+    def event_counts(cls):
+        """
+        :return: For each event type name, number of events handled by all instrumented components.
+        """
+        counts = {}
+        for (_, event_type), histogram in list(cls.handler_times.items()):
+            if histogram.count:
+                counts[event_type] = counts.get(event_type, 0) + histogram.count
+        return counts
+
+    @classmethod
+    def summary(cls):
+        """
+        :return: Dictionary with the summaries of the handler durations in seconds by component and event type, of the
+        queue depths by component, and the number of handled events by event type.
+        """
+        handlers = {}
+        for (name, event_type), histogram in list(cls.handler_times.items()):
+            if histogram.count:
+                handlers.setdefault(name, {})[event_type] = histogram.summary()
+        return {
+            'duration': time.time() - cls.start_time if cls.start_time is not None else 0.0,
+            'handlers': handlers,
+            'queue_depths': {name: histogram.summary() for name, histogram in list(cls.queue_depths.items())},
+            'event_counts': cls.event_counts()
+        }
+
+    @classmethod
+    def summary_table(cls):
+        """
+        :return: The handler durations and queue depths as text tables, busiest handlers first.
+        """
+        rows = [("component", "event", "count", "total ms", "mean us", "p50 us", "p99 us", "max us")]
+        handler_histograms = sorted(((name, event_type, histogram)
+                                     for (name, event_type), histogram in list(cls.handler_times.items())
+                                     if histogram.count), key=lambda row: -row[2].total)
+        for name, event_type, histogram in handler_histograms:
+            rows.append((name, event_type, str(histogram.count), f"{histogram.total * 1000:.1f}",
+                         f"{histogram.total / histogram.count * 1000000:.1f}",
+                         f"{histogram.percentile(50) * 1000000:.1f}", f"{histogram.percentile(99) * 1000000:.1f}",
+                         f"{histogram.max * 1000000:.1f}"))
+        queue_rows = [("component", "samples", "mean depth", "p99 depth", "max depth")]
+        for name, histogram in sorted(list(cls.queue_depths.items()), key=lambda item: -item[1].max):
+            if histogram.count:
+                queue_rows.append((name, str(histogram.count), f"{histogram.total / histogram.count:.1f}",
+                                   str(int(histogram.percentile(99))), str(int(histogram.max))))
+        return format_table(rows) + "\n" + format_table(queue_rows)
+
+    @classmethod
+    def log_summary(cls):
+        logger.applog("Handler profile:\n" + cls.summary_table())
+
+    @classmethod
+    def dump(cls, path):
+        with open(path, "w") as profile_file:
+            json.dump(cls.summary(), profile_file, indent=2)
+
+
+def component_name(component):
+    return getattr(component, 'node_id', None) or f"{component.componentname}_{component.componentinstancenumber}"
+
+
+def format_table(rows):
+    widths = [max(len(row[column]) for row in rows) for column in range(len(rows[0]))]
+    return "\n".join(" | ".join(value.ljust(width) for value, width in zip(row, widths)) for row in rows)
@@ -0,0 +1,250 @@
+"""
+Sharded mode of the Paxos implementation. Several independent Paxos groups, each with its own log, leader and state
+machine partition, are hosted on the same set of hosts. A router in front of the client forwards every command to the
+group owning its key, so that commands of different groups are ordered and committed concurrently. Groups share nothing
+but the client, so a sharded node may host only some of the groups together with the client sessions of their keys,
+e.g. one group per process, so that groups do not share an interpreter.
+"""
+import random
+import time
+import zlib
+from threading import Thread, Timer
+
+from adhoccomputing.GenericModel import GenericModel
+from adhoccomputing.Generics import *
+
+from paxos.admission import busy_backoff
+from paxos.client_node import ClientNode
+from paxos.heartbeat_node import HeartbeatNode
+from paxos.parameters import ExperimentParameters
+from paxos.paxos_node import PaxosNode
+from paxos.statistics import Statistics
+from paxos.tracing import Tracer
+from paxos.utils import NodeStatus, PaxosEventTypes, CommandTypes, Command, NUMBER_OF_PAXOS_GROUPS, \
+    NUMBER_OF_SHARD_KEYS
+
+
+def group_of_key(key, number_of_groups):
+    """
+    Stable mapping of a command key to the Paxos group owning it. Commands without a key belong to the first group.
+    """
+    if key is None:
+        return 0
+    return zlib.crc32(str(key).encode()) % number_of_groups
+
+
+class ShardRouter(GenericModel):
+    """
+    Router between the client and the Paxos groups. Client requests are forwarded to the nodes of the group owning
+    the key of the command only, responses of all groups are passed down to the client.
+    """
+
+    def __init__(self, componentname, componentinstancenumber, groups, numberofgroups=None, context=None,
+                 configurationparameters=None, num_worker_threads=1, topology=None):
+        """
+        :param groups: Dictionary of the hosted Paxos groups by group number, each is the list of Paxos nodes of the
+        group.
+        :param numberofgroups: Number of groups keys are mapped to, including the groups hosted elsewhere. The number of
+        hosted groups if None.
+        """
+        super().__init__(componentname, componentinstancenumber, context, configurationparameters,
+                         num_worker_threads, topology)
+        self.groups = groups
+        self.number_of_groups = numberofgroups if numberofgroups is not None else len(groups)
+        self.node_id = componentname + '_' + str(componentinstancenumber)
+
+        self.eventhandlers[PaxosEventTypes.CLIENT_REQUEST] = self.on_client_request
+        self.eventhandlers[PaxosEventTypes.CLIENT_RESPONSE] = self.on_client_response
+
+    def on_init(self, eventobj: Event):
+        pass
+
+    def on_client_request(self, eventobj: Event):
+        group = self.groups[group_of_key(eventobj.eventcontent.key, self.number_of_groups)]
+        for paxos_node in group:
+            paxos_node.trigger_event(Event(self, PaxosEventTypes.CLIENT_REQUEST, eventobj.eventcontent))
+
+    def on_client_response(self, eventobj: Event):
+        self.send_down(eventobj)
+
+
+class ShardedClientNode(ClientNode):
+    """
+    Client of the sharded mode. It runs one closed-loop session per key, each session sends the next command of its key
+    after the previous one is committed. Commands which are not answered within the timeout are sent again, since the
+    responses of a group are lost while it elects a new leader. A command rejected by a busy leader is sent again after
+    an exponential backoff, other sessions go on meanwhile. On the fast path, a command is also committed once a fast
+    quorum of members of its group accepted it in the same term and epoch. Commands are sent again after the election
+    timeout of the ExperimentParameters given as configurationparameters.
+    """
+
+    def __init__(self, componentname, componentinstancenumber, numberofkeys=NUMBER_OF_SHARD_KEYS,
+                 requestintervalinms=None, sessionkeys=None, context=None, configurationparameters=None,
+                 num_worker_threads=1, topology=None):
+        """
+        :param numberofkeys: Number of keys, i.e. number of concurrent client sessions.
+        :param requestintervalinms: Interval between the response of a command and the next command of the same key,
+        client_request_interval_in_ms of the parameters if None.
+        :param sessionkeys: Keys of the sessions of this client, all numberofkeys keys if None.
+        """
+        super().__init__(componentname, componentinstancenumber, requestintervalinms, context=context,
+                         configurationparameters=configurationparameters, num_worker_threads=num_worker_threads,
+                         topology=topology)
+        self.number_of_keys = numberofkeys
+        self.session_keys = list(sessionkeys) if sessionkeys is not None else list(range(numberofkeys))
+        self.retry_timeout = ExperimentParameters.of(configurationparameters).timeout_in_ms / 1000.0
+        self.last_commands = {}  # for each key, the command waiting for a response
+        self.command_sent_times = {}  # for each key, time the waiting command is first sent
+        self.command_resent_times = {}  # for each key, time the waiting command is last sent
+        self.busy_attempts = {}  # for each key, busy responses received in a row for the waiting command
+        self.fast_accepts = {}  # for each key, members that fast accepted the waiting command by term and epoch
+
+    def on_init(self, eventobj: Event):
+        for key in self.session_keys:
+            self.send_command(Command(self.first_command_ids.get(key, 0) + 1, CommandTypes.ADD, 33, key,
+                                      self.create_payload()))
+        # Stale commands are sent again from a separate thread, so that the node can still handle the exit event
+        retry_thread = Thread(target=self.retry_commands, daemon=True)
+        retry_thread.start()
+
+    def on_client_response(self, eventobj: Event):
+        command = eventobj.eventcontent.payload['command']
+        if eventobj.eventcontent.payload.get('busy') and command == self.last_commands.get(command.key):
+            attempt = self.busy_attempts.get(command.key, 0) + 1
+            self.busy_attempts[command.key] = attempt
+            delay = busy_backoff(attempt, self.busy_backoff, self.max_busy_backoff)
+            # The retry thread does not send the command again before the backoff ends
+            self.command_resent_times[command.key] = time.time() + delay
+            Timer(delay, self.send_up, [Event(self, PaxosEventTypes.CLIENT_REQUEST, command)]).start()
+            return
+        if not eventobj.eventcontent.payload['success'] or command != self.last_commands.get(command.key):
+            return  # Stale or repeated response, the waiting command is sent again by the retry thread
+        if eventobj.eventcontent.payload.get('fast') and \
+                not self.count_fast_accept(eventobj, self.fast_accepts.setdefault(command.key, {})):
+            return
+        self.busy_attempts.pop(command.key, None)
+        self.fast_accepts.pop(command.key, None)
+        Statistics.record_command_latency(time.time() - self.command_sent_times[command.key])
+        if Tracer.enabled:
+            Tracer.end_command(self.node_id, command)
+        del self.last_commands[command.key]
+        self.apply_command(command)
+        next_command = self.generate_command(command)
+        if self.request_interval_in_ms > 0:
+            # Other sessions go on while this one waits
+            Timer(self.request_interval_in_ms / 1000.0, self.send_command, [next_command]).start()
+        else:
+            self.send_command(next_command)
+
+    # Choose random number to add to the key of the last command, between -100 and 100, or negate the value of the key
+    # with non_commuting_command_ratio
+    def generate_command(self, last_command):
+        if random.random() < self.non_commuting_command_ratio:
+            return Command(last_command.id + 1, CommandTypes.MULTIPLY, -1, last_command.key, self.create_payload())
+        value = random.randint(-100, 100)
+        command_type = CommandTypes.ADD if value > 0 else CommandTypes.SUBTRACT
+        return Command(last_command.id + 1, command_type, abs(value), last_command.key, self.create_payload())
+
+    def send_command(self, command):
+        self.last_commands[command.key] = command
+        self.command_sent_times[command.key] = self.command_resent_times[command.key] = time.time()
+        if Tracer.enabled:
+            Tracer.begin_command(self.node_id, command)
+        self.send_up(Event(self, PaxosEventTypes.CLIENT_REQUEST, command))
+
+    def retry_commands(self):
+        while not self.terminated:
+            now = time.time()
+            for key, command in list(self.last_commands.items()):
+                if now - self.command_resent_times[key] > self.retry_timeout:
+                    self.command_resent_times[key] = now
+                    self.send_up(Event(self, PaxosEventTypes.CLIENT_REQUEST, command))
+            time.sleep(self.retry_timeout / 2)
+
+
+class ShardedNode(GenericModel):
+    """
+    Composite node of the sharded mode. Each of the numberofhosts hosts runs one Paxos node of every group, the nodes of
+    a group are connected as peers only to each other. The initial leaders are spread over the hosts, group g starts
+    with its leader on host g % numberofhosts + 1. A single client and heartbeat node serve all groups, the client
+    reaches the groups through a ShardRouter. A node may host only some of the groups, the client then runs the
+    sessions of the keys of these groups only. All of them are configured by the ExperimentParameters (or a dictionary
+    of them) given as configurationparameters.
+    """
+
+    def on_init(self, eventobj: Event):
+        pass
+
+    def __init__(self, componentname, componentinstancenumber, numberofgroups=NUMBER_OF_PAXOS_GROUPS,
+                 numberofhosts=None, numberofkeys=NUMBER_OF_SHARD_KEYS, requestintervalinms=None, hostedgroups=None,
+                 context=None, configurationparameters=None, num_worker_threads=1, topology=None):
+        """
+        :param numberofhosts: Number of hosts, i.e. nodes of each group, number_of_paxos_nodes of the parameters if None.
+        :param requestintervalinms: Interval between two commands of a client session, client_request_interval_in_ms of
+        the parameters if None.
+        :param hostedgroups: Group numbers of the groups hosted by this node, all numberofgroups groups if None.
+        """
+        super().__init__(componentname, componentinstancenumber, context, configurationparameters, num_worker_threads,
+                         topology)
+        self.parameters = ExperimentParameters.of(configurationparameters)
+        self.number_of_groups = numberofgroups
+        self.number_of_hosts = numberofhosts if numberofhosts is not None else self.parameters.number_of_paxos_nodes
+        self.hosted_groups = list(hostedgroups) if hostedgroups is not None else list(range(numberofgroups))
+
+        self.groups = []
+        groups_by_number = {}
+        for group_number in self.hosted_groups:
+            group_name = f"PaxosGroup{group_number}Node"
+            initial_proposer = f"{group_name}_{group_number % self.number_of_hosts + 1}"
+            group = [self.create_paxos_node(group_name, host_number, initial_proposer)
+                     for host_number in range(1, self.number_of_hosts + 1)]
+            for paxos_node in group:
+                for peer in group:
+                    if paxos_node is not peer:
+                        paxos_node.connect_me_to_component(ConnectorTypes.PEER, peer)
+            self.groups.append(group)
+            groups_by_number[group_number] = group
+            self.components.extend(group)
+        self.paxos_nodes = list(self.components)
+
+        self.router = ShardRouter("ShardRouter", 0, groups_by_number, self.number_of_groups)
+        session_keys = [key for key in range(numberofkeys)
+                        if group_of_key(key, self.number_of_groups) in groups_by_number]
+        self.client = ShardedClientNode("ClientNode", 0, numberofkeys, requestintervalinms, session_keys,
+                                        configurationparameters=self.parameters)
+        self.heartbeat = HeartbeatNode("HeartbeatNode", 0, configurationparameters=self.parameters)
+        self.components.extend([self.router, self.client, self.heartbeat])
+        self.client.connect_me_to_component(ConnectorTypes.UP, self.router)
+        self.router.connect_me_to_component(ConnectorTypes.DOWN, self.client)
+        for paxos_node in self.paxos_nodes:
+            # The router forwards requests to the nodes of a single group, so it is connected only downwards
+            paxos_node.connect_me_to_component(ConnectorTypes.DOWN, self.router)
+            self.heartbeat.connect_me_to_component(ConnectorTypes.UP, paxos_node)
+            paxos_node.connect_me_to_component(ConnectorTypes.DOWN, self.heartbeat)
+
+    def create_paxos_node(self, group_name, host_number, initial_proposer):
+        """
+        Creates the Paxos node of a group on a host, subclasses may override it to create other kinds of nodes.
+        """
+        parameters = self.parameters
+        return PaxosNode(group_name, host_number, self.number_of_hosts, parameters.timeout_in_ms / 1000.0,
+                         parameters.election_timeout_jitter_in_ms / 1000.0, parameters.pre_vote_enabled,
+                         parameters.phase_1_quorum_size, parameters.phase_2_quorum_size,
+                         parameters.thrifty_replication, initialproposer=initial_proposer,
+                         configurationparameters=parameters)
+
+    def leaders(self):
+        """
+        :return: For each hosted group, the node id of its current proposer, or None during an election.
+        """
+        leaders = []
+        for group in self.groups:
+            proposers = [node.node_id for node in group if node.state == NodeStatus.PROPOSER]
+            leaders.append(proposers[0] if proposers else None)
+        return leaders
+
+    def state_machine_value(self):
+        """
+        :return: Sum of the state machine partitions of the hosted groups, as seen by the node with the most applied entries.
+        """
+        return sum(max(group, key=lambda node: node.last_applied).state_machine_value for group in self.groups)
@@ -1,17 +1,19 @@
 import random
 import time
+from threading import Thread
 
 from adhoccomputing.GenericModel import GenericModel
 from adhoccomputing.Generics import Event
 
-from paxos.utils import NodeStatus, PaxosEventTypes, SLEEP_TRIGGER_INTERVAL, ALLOW_LEADER_IN_NODES_TO_SLEEP, SLEEP_TIME, \
-    NUMBER_OF_NODES_TO_SLEEP
+from paxos.parameters import ExperimentParameters
+from paxos.utils import NodeStatus, PaxosEventTypes
 
 
 class SleepTriggerNode(GenericModel):
     """
     This class is responsible for sending sleep trigger event to a random set of Raft or Paxos nodes.
-    Sleep trigger is used to simulate crashes or other failures in the system.
+    Sleep trigger is used to simulate crashes or other failures in the system. The number of nodes, interval and sleep
+    time are given by the ExperimentParameters given as configurationparameters.
     """
 
     def __init__(self, componentname, componentinstancenumber, numberofnodes, context=None,
@@ -23,12 +25,20 @@ class SleepTriggerNode(GenericModel):
         self.state = NodeStatus.SLEEP_TRIGGER
         self.node_id = componentname + '_' + str(componentinstancenumber)
         self.number_of_nodes = numberofnodes
+        self.parameters = ExperimentParameters.of(configurationparameters)
 
     def on_init(self, eventobj: Event):
+        # Sleep triggers are sent from a separate thread, so that the node can still handle the exit event
+        sleep_trigger_thread = Thread(target=self.send_sleep_triggers, daemon=True)
+        sleep_trigger_thread.start()
+
+    def send_sleep_triggers(self):
         time.sleep(5)
-        while True:
-            time.sleep(SLEEP_TRIGGER_INTERVAL)
-            payload = {'target_node_ids': self.get_random_node_ids(NUMBER_OF_NODES_TO_SLEEP), 'sleep_leader': ALLOW_LEADER_IN_NODES_TO_SLEEP, 'time_to_sleep': SLEEP_TIME}
+        while not self.terminated:
+            time.sleep(self.parameters.sleep_trigger_interval)
+            payload = {'target_node_ids': self.get_random_node_ids(self.parameters.number_of_nodes_to_sleep),
+                       'sleep_leader': self.parameters.allow_leader_in_nodes_to_sleep,
+                       'time_to_sleep': self.parameters.sleep_time}
             trigger_sleep_event = Event(self, PaxosEventTypes.SLEEP_TRIGGER, payload)
             self.send_up(trigger_sleep_event)
 
@@ -0,0 +1,70 @@
+import pickle
+import tempfile
+
+from paxos.utils import SNAPSHOT_MEMORY_LIMIT_IN_BYTES
+
+
+class Snapshot:
+    """
+    Serialized state of a Paxos node after applying the entries up to index, whose last entry has the given term. The
+    state is a dictionary including the state machine value, the highest applied command id of each client and the
+    configuration.
+    """
+
+    def __init__(self, index, term, data):
+        self.index = index
+        self.term = term
+        self.data = data
+
+    @classmethod
+    def create(cls, index, term, state):
+        """
+        Serializes the given state. It may take long for a large state, so it is called outside the event handlers.
+        """
+        return cls(index, term, pickle.dumps(state))
+
+    def size(self):
+        return len(self.data)
+
+    def chunk(self, offset, size):
+        return self.data[offset:offset + size]
+
+    def state(self):
+        return pickle.loads(self.data)
+
+    def __str__(self):
+        return f"Snapshot(index={self.index}, term={self.term}, size={self.size()})"
+
+
+class SnapshotReceiver:
+    """
+    Collects the chunks of a snapshot streamed by the leader. Chunks are kept in memory up to memory_limit bytes and
+    written to a temporary file beyond that, so that a large snapshot does not have to fit in memory twice while it is
+    received.
+    """
+
+    def __init__(self, index, term, memory_limit=SNAPSHOT_MEMORY_LIMIT_IN_BYTES):
+        self.index = index
+        self.term = term
+        self.received_bytes = 0
+        self.file = tempfile.SpooledTemporaryFile(max_size=memory_limit)
+
+    def write(self, offset, data):
+        """
+        Appends the chunk if it starts where the previous one ended, duplicate or out of order chunks are ignored.
+        :return: Whether the chunk is written.
+        """
+        if offset != self.received_bytes:
+            return False
+        self.file.write(data)
+        self.received_bytes += len(data)
+        return True
+
+    def finish(self):
+        """
+        :return: The received snapshot. The receiver cannot be used afterwards.
+        """
+        self.file.seek(0)
+        snapshot = Snapshot(self.index, self.term, self.file.read())
+        self.file.close()
+        return snapshot
@@ -1,3 +1,4 @@
+import math
 import time
 
 from adhoccomputing.Generics import logger
@@ -7,7 +8,33 @@ class Statistics:
     number_of_leader_changes = 0
     total_time_during_elections = 0
     time_of_election = None
-    first_election = True
+    election_durations = []
+    command_latencies = []
+    catch_up_chunks = 0
+    catch_up_entries = 0
+    catch_up_bytes = 0
+    catch_up_start_time = None  # Time of the first catch-up chunk
+    catch_up_last_time = None  # Time of the last catch-up chunk
+    catch_up_durations = []
+    busy_responses = 0  # Client commands rejected by the admission controller of a leader
+
+    @classmethod
+    def reset(cls):
+        """
+        Clears all collected statistics, so that several experiments can run one after another in the same process.
+        """
+        cls.number_of_leader_changes = 0
+        cls.total_time_during_elections = 0
+        cls.time_of_election = None
+        cls.election_durations = []
+        cls.command_latencies = []
+        cls.catch_up_chunks = 0
+        cls.catch_up_entries = 0
+        cls.catch_up_bytes = 0
+        cls.catch_up_start_time = None
+        cls.catch_up_last_time = None
+        cls.catch_up_durations = []
+        cls.busy_responses = 0
 
     @classmethod
     def increment_leader_changes(cls):
@@ -15,20 +42,115 @@ class Statistics:
 
     @classmethod
     def add_time_during_election(cls):
+        # The startup election is not timed, nodes start timing elections only after the startup term
         if cls.time_of_election is not None:
-            if cls.first_election:
-                cls.number_of_leader_changes = 0
-                cls.total_time_during_elections = 0
-                cls.time_of_election = None
-                cls.first_election = False
-                return  # Skip the first election
-            cls.total_time_during_elections += (time.time() - cls.time_of_election)
+            election_duration = time.time() - cls.time_of_election
+            cls.total_time_during_elections += election_duration
+            cls.election_durations.append(election_duration)
             logger.info(
                 f"Average time during elections: {cls.total_time_during_elections / cls.number_of_leader_changes}")
         cls.time_of_election = None
 
     @classmethod
-    def start_time_for_election(cls):
+    def start_time_for_election(cls, start_time=None):
+        """
+        :param start_time: Time the leader became unavailable, e.g. the last contact of a node with it, now if None.
+        """
         if cls.time_of_election is None:
             logger.info("Election started")
-            cls.time_of_election = time.time()
+            cls.time_of_election = start_time if start_time is not None else time.time()
+
+    @classmethod
+    def record_command_latency(cls, latency):
+        cls.command_latencies.append(latency)
+
+    @classmethod
+    def record_busy_response(cls):
+        cls.busy_responses += 1
+
+    @classmethod
+    def record_catch_up_chunk(cls, number_of_entries, number_of_bytes):
+        now = time.time()
+        if cls.catch_up_start_time is None:
+            cls.catch_up_start_time = now
+        cls.catch_up_last_time = now
+        cls.catch_up_chunks += 1
+        cls.catch_up_entries += number_of_entries
+        cls.catch_up_bytes += number_of_bytes
+
+    @classmethod
+    def record_catch_up_duration(cls, duration):
+        cls.catch_up_durations.append(duration)
+
+    @classmethod
+    def catch_up_summary(cls):
+        """
+        Summarizes the catch-up traffic sent by leaders to lagging peers.
+        :return: Dictionary with the number of chunks, entries and bytes sent, the bandwidth in bytes per second between
+        the first and the last chunk, and the number of completed catch-ups with their mean and maximum duration.
+        """
+        summary = {
+            'chunks': cls.catch_up_chunks,
+            'entries': cls.catch_up_entries,
+            'bytes': cls.catch_up_bytes,
+            'bandwidth': 0.0
+        }
+        if cls.catch_up_start_time is not None and cls.catch_up_last_time > cls.catch_up_start_time:
+            summary['bandwidth'] = cls.catch_up_bytes / (cls.catch_up_last_time - cls.catch_up_start_time)
+        durations = distribution_summary(cls.catch_up_durations)
+        summary['completed'] = durations['count']
+        if durations['count']:
+            summary['duration_mean'] = durations['mean']
+            summary['duration_max'] = durations['max']
+        return summary
+
+    @classmethod
+    def election_duration_summary(cls):
+        """
+        Summarizes the distribution of the measured election durations, i.e. the unavailability caused by each leader
+        change from the last contact with the former leader or the start of a leadership transfer, in seconds.
+        :return: Dictionary with the number of elections, mean, min, max and 50th, 90th, 99th percentiles.
+        """
+        return distribution_summary(cls.election_durations)
+
+    @classmethod
+    def command_latency_summary(cls):
+        """
+        Summarizes the distribution of the commit latencies observed by clients, in seconds.
+        :return: Dictionary with the number of commands, mean, min, max and 50th, 90th, 99th percentiles.
+        """
+        return distribution_summary(cls.command_latencies)
+
+    @classmethod
+    def log_summary(cls):
+        logger.applog(f"Leader changes: {cls.number_of_leader_changes}")
+        logger.applog("Election durations: " + format_summary(cls.election_duration_summary()))
+        logger.applog("Command latencies: " + format_summary(cls.command_latency_summary()))
+        logger.applog("Catch-up: " + format_summary(cls.catch_up_summary()))
+        logger.applog(f"Busy responses: {cls.busy_responses}")
+
+
+def distribution_summary(values):
+    values = sorted(values)
+    if not values:
+        return {'count': 0}
+    return {
+        'count': len(values),
+        'mean': sum(values) / len(values),
+        'min': values[0],
+        'p50': percentile(values, 50),
+        'p90': percentile(values, 90),
+        'p99': percentile(values, 99),
+        'max': values[-1]
+    }
+
+
+def format_summary(summary):
+    return ", ".join(
+        f"{key}={value:.4f}" if isinstance(value, float) else f"{key}={value}" for key, value in summary.items())
+
+
+# Nearest-rank percentile of an already sorted list
+def percentile(sorted_values, percent):
+    rank = max(math.ceil(percent / 100.0 * len(sorted_values)) - 1, 0)
+    return sorted_values[rank]
@@ -0,0 +1,162 @@
+"""
+Parameter sweeps of the Paxos experiment. A sweep runs the experiment once for each parameter set of a grid or of a
+random sample of a parameter space, in a pool of processes, and writes one row per run with the parameters and the
+results to a CSV or Parquet file. Writing Parquet requires pandas with a Parquet engine such as pyarrow.
+
+Runs of the same pool share the cores, a run timing out elections or client requests because of an overloaded machine
+is not representative, so keep the number of processes below the number of cores.
+
+Run a sweep with, for example::
+
+    python -m paxos.sweep --grid timeout_in_ms=150,250,500 number_of_paxos_nodes=5,13 \
+        --set experiment_execution_in_secs=20 --output sweep.csv
+    python -m paxos.sweep --random 10 --seed 1 timeout_in_ms=100..500 thrifty_replication=false,true \
+        --output sweep.parquet
+
+Values are parsed as JSON, so that numbers, booleans and null are given as in JSON and anything else is a string. A
+range low..high is sampled uniformly by random sweeps, as an integer if both bounds are integers.
+"""
+import argparse
+import contextlib
+import csv
+import itertools
+import json
+import multiprocessing
+import os
+import random
+
+from adhoccomputing.Generics import *
+
+from paxos.experiment import run_experiment
+from paxos.parameters import ExperimentParameters
+
+
+def grid_sweep(grid):
+    """
+    :param grid: Dictionary of the list of values of each swept parameter.
+    :return: List of parameter dictionaries, one for each combination of values.
+    """
+    names = list(grid.keys())
+    return [dict(zip(names, values)) for values in itertools.product(*(grid[name] for name in names))]
+
+
+def random_sweep(space, count, seed=None):
+    """
+    :param space: Dictionary of the values of each swept parameter, either a list of values to choose from or a
+    (low, high) tuple to sample uniformly, as an integer if both bounds are integers.
+    :param count: Number of parameter sets.
+    :param seed: Seed of the random sample.
+    :return: List of count parameter dictionaries.
+    """
+    generator = random.Random(seed)
+    parameter_sets = []
+    for _ in range(count):
+        parameters = {}
+        for name, values in space.items():
+            if isinstance(values, tuple):
+                low, high = values
+                if isinstance(low, int) and isinstance(high, int):
+                    parameters[name] = generator.randint(low, high)
+                else:
+                    parameters[name] = generator.uniform(low, high)
+            else:
+                parameters[name] = generator.choice(values)
+        parameter_sets.append(parameters)
+    return parameter_sets
+
+
+def run_sweep(parameter_sets, base=None, processes=None):
+    """
+    Runs the experiment once for each parameter set in a pool of processes. Each run gets a fresh process, since the
+    statistics are collected in class attributes and the threads of a run outlive it.
+    :param parameter_sets: List of parameter dictionaries, applied over the base parameters.
+    :param base: ExperimentParameters shared by all runs, the defaults if None.
+    :param processes: Number of runs at the same time, the number of cores if None.
+    :return: List of the results of the runs, in the order of the parameter sets.
+    """
+    base = ExperimentParameters.of(base)
+    # Invalid parameter names are reported before any run starts
+    runs = [base.replace(**parameters) for parameters in parameter_sets]
+    results = []
+    with multiprocessing.Pool(processes, maxtasksperchild=1) as pool:
+        for run_number, result in enumerate(pool.imap(run_in_worker, runs)):
+            logger.critical(f"Sweep run {run_number + 1}/{len(runs)} finished: throughput={result['throughput']}")
+            results.append(result)
+    return results
+
+
+def run_in_worker(parameters):
+    setAHCLogLevel(CRITICAL)
+    # The client prints every response, which is of no use for a sweep
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        return run_experiment(parameters)
+
+
+def write_results(results, path):
+    """
+    Writes the results as a CSV file, or as a Parquet file if the path ends with .parquet.
+    :raises ImportError: If a Parquet file is requested and pandas is not installed.
+    """
+    if path.endswith(".parquet"):
+        try:
+            import pandas
+        except ImportError:
+            raise ImportError("Writing Parquet files requires pandas and pyarrow, write a .csv file instead")
+        pandas.DataFrame(results).to_parquet(path, index=False)
+        return
+    columns = []
+    for result in results:
+        columns.extend(column for column in result if column not in columns)
+    with open(path, "w", newline="") as results_file:
+        writer = csv.DictWriter(results_file, fieldnames=columns)
+        writer.writeheader()
+        writer.writerows(results)
+
+
+def parse_value(text):
+    try:
+        return json.loads(text)
+    except ValueError:
+        return text
+
+
+def parse_assignments(assignments, ranges=False):
+    """
+    Parses name=value,value,... assignments, and name=low..high ranges if allowed.
+    :return: Dictionary of the list of values, or (low, high) tuple, of each name.
+    """
+    space = {}
+    for assignment in assignments:
+        name, _, values = assignment.partition("=")
+        if ranges and ".." in values:
+            low, high = values.split("..", 1)
+            space[name] = (parse_value(low), parse_value(high))
+        else:
+            space[name] = [parse_value(value) for value in values.split(",")]
+    return space
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Runs the Paxos experiment for a grid or random sample of parameters.")
+    sweep_type = parser.add_mutually_exclusive_group(required=True)
+    sweep_type.add_argument("--grid", nargs="+", metavar="NAME=VALUES", help="parameters to sweep, all combinations")
+    sweep_type.add_argument("--random", type=int, metavar="COUNT", help="number of random parameter sets")
+    parser.add_argument("space", nargs="*", metavar="NAME=VALUES|LOW..HIGH", help="parameter space of a random sweep")
+    parser.add_argument("--seed", type=int, help="seed of the random sweep")
+    parser.add_argument("--set", nargs="+", default=[], metavar="NAME=VALUE", help="parameters shared by all runs")
+    parser.add_argument("--processes", type=int, help="number of runs at the same time")
+    parser.add_argument("--output", default="sweep.csv", help="results file, .csv or .parquet")
+    arguments = parser.parse_args()
+
+    base = ExperimentParameters(**{name: values[0] for name, values in parse_assignments(arguments.set).items()})
+    if arguments.grid is not None:
+        parameter_sets = grid_sweep(parse_assignments(arguments.grid))
+    else:
+        parameter_sets = random_sweep(parse_assignments(arguments.space, ranges=True), arguments.random, arguments.seed)
+    results = run_sweep(parameter_sets, base, arguments.processes)
+    write_results(results, arguments.output)
+    logger.critical(f"Wrote the results of {len(results)} runs to {arguments.output}")
+
+
+if __name__ == "__main__":
+    main()
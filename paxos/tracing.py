@@ -0,0 +1,236 @@
+"""
+Tracing of the lifecycle of client commands across all nodes, exported in the Chrome trace event format which can be
+opened in chrome://tracing or https://ui.perfetto.dev. Each node is shown as a process. Handler spans of a node are
+shown on its thread, named after the stage, such as client_request, propose, handle_propose, accept, commit and apply.
+Before each handler span, an asynchronous "wait" span covers the time between sending the message and the start of the
+handler, i.e. the time spent in flight and in the queue of the node. The client shows one asynchronous span per command
+from sending it to receiving its response, and flow arrows link the spans of the same command across nodes.
+
+Commands are sampled by their key and id, so that every node makes the same decision without adding anything to the
+messages. If a slow command threshold is given, the spans of every command are kept in memory until the client
+receives the response, and the spans of commands slower than the threshold are kept in addition to the sampled ones.
+Tracing costs a single attribute check per traced point when it is disabled.
+"""
+import json
+import time
+import zlib
+from collections import OrderedDict
+from threading import Lock
+
+from paxos.statistics import distribution_summary
+from paxos.utils import CommandTypes
+
+MAX_PENDING_TRACES = 10000  # Commands whose spans are kept until their latency is known, the oldest ones are dropped
+MAX_DECIDED_TRACES = 10000  # Commands whose kept or dropped decision is remembered for spans recorded after it
+MAX_FLOWS = 10000  # Commands whose flow is continued by later spans, the oldest ones start a new flow
+INTERNAL_COMMAND_TYPES = (CommandTypes.NOOP.value, CommandTypes.CONFIGURATION.value)  # Never traced
+
+
+class Tracer:
+    enabled = False
+    sample_rate = 0.0
+    slow_command_threshold = None  # In seconds, None means that only sampled commands are traced
+    max_events = 0
+    start_time = 0.0
+    events = []  # Chrome trace events of the kept commands
+    pending_events = OrderedDict()  # for each command that is not decided yet, its events
+    decisions = OrderedDict()  # for each decided command, whether its events are kept
+    flows_started = OrderedDict()  # Commands with a flow start event
+    command_start_times = {}  # for each traced command, time the client sent it
+    process_ids = {}  # for each node id, process id in the trace
+    dropped_events = 0
+    lock = Lock()
+
+    @classmethod
+    def configure(cls, sample_rate, slow_command_threshold=None, max_events=1000000):
+        """
+        Clears the collected events and enables tracing if the sample rate is positive or a threshold is given.
+        :param sample_rate: Fraction of the commands to trace, between 0 and 1.
+        :param slow_command_threshold: Latency in seconds above which a command is traced even if it is not sampled.
+        :param max_events: Number of events after which further events are dropped.
+        """
+        with cls.lock:
+            cls.enabled = sample_rate > 0 or slow_command_threshold is not None
+            cls.sample_rate = sample_rate
+            cls.slow_command_threshold = slow_command_threshold
+            cls.max_events = max_events
+            cls.start_time = time.time()
+            cls.events = []
+            cls.pending_events = OrderedDict()
+            cls.decisions = OrderedDict()
+            cls.flows_started = OrderedDict()
+            cls.command_start_times = {}
+            cls.process_ids = {}
+            cls.dropped_events = 0
+
+    @classmethod
+    def reset(cls):
+        cls.configure(0.0)
+
+    @staticmethod
+    def trace_id(command):
+        return zlib.crc32(f"{command.key}/{command.id}".encode())
+
+    @classmethod
+    def is_sampled(cls, trace_id):
+        return trace_id % 1000000 < cls.sample_rate * 1000000
+
+    @classmethod
+    def is_traced(cls, trace_id):
+        return cls.slow_command_threshold is not None or cls.is_sampled(trace_id)
+
+    @classmethod
+    def record(cls, node_id, stage, commands, start_time, eventobj=None):
+        """
+        Records a span of the node from start_time to now for each traced client command. If the event handled by the
+        span is given, the time from its creation to start_time is recorded as a wait span.
+        """
+        end_time = time.time()
+        sent_time = eventobj.time.timestamp() if eventobj is not None else None
+        for command in commands:
+            if command.type in INTERNAL_COMMAND_TYPES:
+                continue
+            trace_id = cls.trace_id(command)
+            if not cls.is_traced(trace_id):
+                continue
+            events = []
+            process_id = cls.process_id(node_id)
+            arguments = {'command': f"{command.key}/{command.id}"}
+            if sent_time is not None and sent_time < start_time:
+                # Waits of the same command on different nodes overlap, so their ids are local to the node
+                wait = {'name': f"{stage} wait", 'cat': "wait", 'id2': {'local': trace_id}, 'pid': process_id,
+                        'tid': stage, 'args': arguments}
+                events.append(dict(wait, ph="b", ts=cls.timestamp(sent_time)))
+                events.append(dict(wait, ph="e", ts=cls.timestamp(start_time)))
+            events.append({'name': stage, 'cat': "stage", 'ph': "X", 'ts': cls.timestamp(start_time),
+                           'dur': (end_time - start_time) * 1000000, 'pid': process_id, 'tid': stage,
+                           'args': arguments})
+            events.append(cls.flow_event(trace_id, process_id, stage, start_time))
+            cls.add_events(trace_id, events)
+
+    @classmethod
+    def begin_command(cls, node_id, command):
+        """
+        Called by a client when it sends a command for the first time.
+        """
+        trace_id = cls.trace_id(command)
+        if not cls.is_traced(trace_id):
+            return
+        now = time.time()
+        cls.command_start_times[trace_id] = now
+        cls.add_events(trace_id, [{'name': f"command {command.key}/{command.id}", 'cat': "command", 'ph': "b",
+                                   'id': trace_id, 'ts': cls.timestamp(now), 'pid': cls.process_id(node_id),
+                                   'tid': "commands"}])
+
+    @classmethod
+    def end_command(cls, node_id, command):
+        """
+        Called by a client when it receives the response of a command. Decides whether the spans of the command are kept
+        if slow commands are traced.
+        """
+        trace_id = cls.trace_id(command)
+        start_time = cls.command_start_times.pop(trace_id, None)
+        if start_time is None:
+            return
+        now = time.time()
+        process_id = cls.process_id(node_id)
+        cls.add_events(trace_id, [
+            {'name': f"command {command.key}/{command.id}", 'cat': "command", 'ph': "e", 'id': trace_id,
+             'ts': cls.timestamp(now), 'pid': process_id, 'tid': "commands"},
+            {'name': "response", 'cat': "stage", 'ph': "X", 'ts': cls.timestamp(now), 'dur': 0, 'pid': process_id,
+             'tid': "commands", 'args': {'command': f"{command.key}/{command.id}", 'latency': now - start_time}},
+            cls.flow_event(trace_id, process_id, "commands", now)
+        ])
+        with cls.lock:
+            if cls.slow_command_threshold is None or trace_id in cls.decisions:
+                return
+            keep = cls.is_sampled(trace_id) or now - start_time > cls.slow_command_threshold
+            cls.decisions[trace_id] = keep
+            if len(cls.decisions) > MAX_DECIDED_TRACES:
+                cls.decisions.popitem(last=False)
+            events = cls.pending_events.pop(trace_id, [])
+            if keep:
+                cls.append_events(events)
+
+    @classmethod
+    def flow_event(cls, trace_id, process_id, thread_id, at_time):
+        """
+        Flow event binding the span starting at the given time to the previous spans of the command. Flows are not
+        terminated, since followers may still apply the command after the client receives its response.
+        """
+        with cls.lock:
+            phase = "t" if trace_id in cls.flows_started else "s"
+            cls.flows_started[trace_id] = True
+            if len(cls.flows_started) > MAX_FLOWS:
+                cls.flows_started.popitem(last=False)
+        return {'name': "command", 'cat': "flow", 'ph': phase, 'id': trace_id, 'ts': cls.timestamp(at_time),
+                'pid': process_id, 'tid': thread_id, 'bp': "e"}
+
+    @classmethod
+    def add_events(cls, trace_id, events):
+        with cls.lock:
+            if cls.slow_command_threshold is None or cls.decisions.get(trace_id, False) or \
+                    (trace_id not in cls.decisions and cls.is_sampled(trace_id)):
+                cls.append_events(events)
+            elif trace_id not in cls.decisions:
+                cls.pending_events.setdefault(trace_id, []).extend(events)
+                if len(cls.pending_events) > MAX_PENDING_TRACES:
+                    cls.pending_events.popitem(last=False)
+
+    @classmethod
+    def append_events(cls, events):
+        if len(cls.events) + len(events) > cls.max_events:
+            cls.dropped_events += len(events)
+            return
+        cls.events.extend(events)
+
+    @classmethod
+    def process_id(cls, node_id):
+        process_id = cls.process_ids.get(node_id)
+        if process_id is None:
+            with cls.lock:
+                process_id = cls.process_ids.setdefault(node_id, len(cls.process_ids) + 1)
+        return process_id
+
+    @classmethod
+    def timestamp(cls, at_time):
+        # Microseconds since tracing is configured
+        return (at_time - cls.start_time) * 1000000
+
+    @classmethod
+    def export(cls, path):
+        """
+        Writes the kept events to a JSON file in the Chrome trace event format.
+        """
+        with cls.lock:
+            metadata = [{'name': "process_name", 'ph': "M", 'pid': process_id, 'args': {'name': node_id}}
+                        for node_id, process_id in cls.process_ids.items()]
+            trace = {'traceEvents': metadata + cls.events, 'displayTimeUnit': "ms",
+                     'otherData': {'sample_rate': cls.sample_rate, 'slow_command_threshold': cls.slow_command_threshold,
+                                   'dropped_events': cls.dropped_events}}
+            with open(path, "w") as trace_file:
+                json.dump(trace, trace_file)
+
+    @classmethod
+    def stage_summary(cls):
+        """
+        Summarizes the kept spans by stage.
+        :return: Dictionary of stage name to the summaries of the durations and waits of its spans, in seconds.
+        """
+        with cls.lock:
+            events = list(cls.events)
+        durations = {}
+        waits = {}
+        wait_starts = {}
+        for event in events:
+            if event['ph'] == "X":
+                durations.setdefault(event['name'], []).append(event['dur'] / 1000000)
+            elif event['cat'] == "wait" and event['ph'] == "b":
+                wait_starts[(event['name'], event['id2']['local'], event['pid'])] = event['ts']
+            elif event['cat'] == "wait" and event['ph'] == "e":
+                start = wait_starts.pop((event['name'], event['id2']['local'], event['pid']), None)
+                if start is not None:
+                    waits.setdefault(event['name'][:-len(" wait")], []).append((event['ts'] - start) / 1000000)
+        return {stage: {'duration': distribution_summary(stage_durations),
+                        'wait': distribution_summary(waits.get(stage, []))}
+                for stage, stage_durations in durations.items()}
@@ -2,7 +2,10 @@ from enum import Enum
 
 from adhoccomputing.Generics import GenericMessageHeader
 
+# Default values of the experiment parameters, an experiment changes them with ExperimentParameters, see parameters.py
 TIMEOUT_IN_MS = 250
+ELECTION_TIMEOUT_JITTER_IN_MS = 150  # Each election timeout is drawn from [TIMEOUT_IN_MS, TIMEOUT_IN_MS + jitter]
+PRE_VOTE_ENABLED = True  # Candidates run a pre-vote round before increasing their term
 
 EXPERIMENT_EXECUTION_IN_SECS = 50
 NUMBER_OF_PAXOS_NODES = 13
@@ -15,11 +18,123 @@ NUMBER_OF_NODES_TO_SLEEP = 5
 SLEEP_TRIGGER_INTERVAL = 1.1
 SLEEP_TIME = 1
 
+# Flexible Paxos quorum sizes, None means majority. Phase 1 and phase 2 quorums must intersect.
+PHASE_1_QUORUM_SIZE = None
+PHASE_2_QUORUM_SIZE = None
+
+# Thrifty replication: proposals go only to the fastest phase 2 quorum, other peers are caught up periodically
+THRIFTY_REPLICATION = False
+ACCEPT_TIMEOUT_IN_MS = 50  # A quorum peer not accepting within this duration is replaced immediately
+CATCH_UP_INTERVAL_IN_MS = 100
+
+# Proposals are split into chunks, entries that are already committed are sent to lagging peers at a limited rate
+MAX_ENTRIES_PER_PROPOSE = 64
+MAX_BYTES_PER_PROPOSE = 32 * 1024  # A single entry larger than this is still sent alone
+CATCH_UP_RATE_LIMIT_IN_BYTES_PER_SEC = 4 * 1024 * 1024  # Shared by all lagging peers of a leader
+
+# Admission control: the leader rejects client commands with a busy response while its log has this many uncommitted
+# entries, or once their queue time has stayed above the target for the interval. None disables a limit.
+ADMISSION_MAX_IN_FLIGHT_ENTRIES = None
+ADMISSION_QUEUE_TIME_TARGET_IN_MS = None
+ADMISSION_QUEUE_TIME_INTERVAL_IN_MS = 100
+# Clients back off from busy responses exponentially with jitter, up to the maximum
+CLIENT_BUSY_BACKOFF_IN_MS = 10
+CLIENT_MAX_BUSY_BACKOFF_IN_MS = 1000
+
+# Fast path of commuting commands (ADD and SUBTRACT): every voting member accepts them straight from the client, which
+# considers a command committed once a majority accepted it in the same term and epoch of the leader, after a single
+# round trip. The leader appends them to the log in any order, since they commute. A non-commuting command starts a new
+# epoch and waits until enough members reported their fast accepted commands, so that it is ordered after all of the
+# commands committed on the fast path before it.
+FAST_PATH_ENABLED = False
+FAST_PATH_REPORT_INTERVAL_IN_MS = 20  # Fast accepted commands that are not in the log yet are reported to the leader
+# Members stop fast accepting while they have this many fast accepted commands that are not applied yet, so that clients
+# wait for the leader to commit instead of getting ahead of the replication of the log
+FAST_PATH_MAX_PENDING_COMMANDS = 256
+CLIENT_NON_COMMUTING_COMMAND_RATIO = 0.0  # Fraction of the commands of clients that negate the value, i.e. MULTIPLY -1
+
+# Pipeline of the nodes, see paxos/pipeline.py: messages to peers are sent and committed entries are applied by stages
+# with their own worker threads, instead of the worker thread handling the messages. Sizes of the stage queues in items,
+# an item of the apply stage is a batch of committed entries.
+PIPELINE_ENABLED = False
+PIPELINE_SEND_QUEUE_SIZE = 1024
+PIPELINE_APPLY_QUEUE_SIZE = 256
+
+# Erasure coded replication, see paxos/erasure.py: the leader sends each voting member its own fragment of the payload
+# of commands at least as large as the minimum size, instead of the whole payload, any ERASURE_CODING_DATA_FRAGMENTS
+# fragments rebuild it. The phase 2 quorum is raised accordingly.
+ERASURE_CODING_ENABLED = False
+ERASURE_CODING_DATA_FRAGMENTS = 2  # At most the phase 1 quorum, larger values are lowered to it
+ERASURE_CODING_MIN_PAYLOAD_SIZE_IN_BYTES = 1024
+CLIENT_COMMAND_PAYLOAD_SIZE_IN_BYTES = 0  # Size of the random payload of the commands of clients, 0 means no payload
+
+# Every node snapshots its state after applying this many entries and drops the entries covered by the snapshot, except
+# the last retained ones which are still sent as entries to slightly lagging peers. Peers lagging behind the compacted
+# part of the log receive the snapshot in chunks of MAX_BYTES_PER_PROPOSE bytes.
+SNAPSHOT_INTERVAL_IN_ENTRIES = 1000
+SNAPSHOT_RETAINED_ENTRIES = 200
+SNAPSHOT_MEMORY_LIMIT_IN_BYTES = 1024 * 1024  # Received snapshots larger than this are written to a temporary file
+
+# Read replicas are non-voting nodes fed with committed entries by followers, clients read from them in turn
+NUMBER_OF_READ_REPLICAS = 2
+
+# Sharded mode: independent Paxos groups hosted on the same nodes, client commands are routed to groups by key
+NUMBER_OF_PAXOS_GROUPS = 4
+NUMBER_OF_SHARD_KEYS = 16  # Number of keys, i.e. concurrent client sessions, used by the sharded client
+
+# Events received by a paused node are kept until it resumes, at most this many, the oldest ones are dropped
+PAUSED_EVENT_BUFFER_SIZE = 10000
+FAULT_SCENARIO = None  # Name of a fault scenario in paxos/scenarios to run during the experiment, e.g. "leader_crash"
+
+# Name of a network topology in paxos/topologies whose links delay the messages between nodes, e.g. "three_regions".
+# None means peers exchange messages instantly in memory.
+NETWORK_TOPOLOGY = None
+
+# Tracing of the lifecycle of client commands, exported to TRACE_FILE in the Chrome trace format if it is given
+TRACE_SAMPLE_RATE = 0.0  # Fraction of the commands traced, 0 disables tracing unless slow commands are traced
+TRACE_SLOW_COMMAND_IN_MS = None  # Commands slower than this are traced even if they are not sampled
+TRACE_FILE = None
+
+# Profiling of the event handlers and input queue depths of all nodes, logged as tables at the end of the experiment,
+# every PROFILING_REPORT_INTERVAL_IN_SECS while it runs if it is given, and written to PROFILING_FILE if it is given
+PROFILING_ENABLED = False
+PROFILING_SAMPLE_INTERVAL_IN_MS = 10  # Interval between two samples of the input queue depths
+PROFILING_REPORT_INTERVAL_IN_SECS = None
+PROFILING_FILE = None
+
+# Consistent checkpoints of the whole cluster, see paxos/checkpoint.py. The cluster is checkpointed to CHECKPOINT_FILE at
+# the end of the experiment if it is given, and restored from RESTORE_CHECKPOINT_FILE at the start if it is given, so
+# that an experiment starts from the state another one ended in, without the startup election.
+CHECKPOINT_FILE = None
+RESTORE_CHECKPOINT_FILE = None
+CHECKPOINT_TIMEOUT_IN_SECS = 10  # A checkpoint fails if some node has not recorded its state within this duration
+CHECKPOINT_ENTRIES_PER_RECORD = 4096  # Log entries written to the checkpoint file together, in a single record
+
 ALWAYS_SLEEP_LEADER = True
+TRANSFER_LEADERSHIP_BEFORE_SLEEP = True  # Leader hands over leadership to the most up-to-date peer before sleeping
+
+
+def majority(number_of_nodes):
+    return number_of_nodes // 2 + 1
+
+
+def validate_quorum_sizes(number_of_nodes, phase_1_quorum_size, phase_2_quorum_size):
+    """
+    Checks the Flexible Paxos intersection rule: every phase 1 (election) quorum must intersect every phase 2
+    (replication) quorum, that is, the sum of the quorum sizes must exceed the number of nodes.
+    :raises ValueError: If a quorum size is out of range or the quorums do not intersect.
+    """
+    for quorum_size in (phase_1_quorum_size, phase_2_quorum_size):
+        if not 1 <= quorum_size <= number_of_nodes:
+            raise ValueError(f"Quorum size {quorum_size} is not in range [1, {number_of_nodes}]")
+    if phase_1_quorum_size + phase_2_quorum_size <= number_of_nodes:
+        raise ValueError(f"Phase 1 quorum {phase_1_quorum_size} and phase 2 quorum {phase_2_quorum_size} do not "
+                         f"intersect for {number_of_nodes} nodes")
 
 
 class NodeStatus(Enum):
     FOLLOWER = "FOLLOWER"  # Learner
+    LEARNER = "LEARNER"  # Non-voting node, a new member catching up before its promotion or a read replica
     ACCEPTOR = "ACCEPTOR"
     CANDIDATE = "CANDIDATE"
     PROPOSER = "PROPOSER"
@@ -34,14 +149,31 @@ class PaxosEventTypes(Enum):
     PROMISE = "PROMISE"
     PROPOSE = "PROPOSE"
     ACCEPT = "ACCEPT"
+    PRE_PREPARE = "PRE_PREPARE"
+    PRE_PROMISE = "PRE_PROMISE"
+    TIMEOUT_NOW = "TIMEOUT_NOW"
+    FAST_REPORT = "FAST_REPORT"  # Fast accepted commands reported by a member to the leader
+    LEARN = "LEARN"  # Committed entries streamed from a follower to a read replica
+    LEARN_REQUEST = "LEARN_REQUEST"
+    INSTALL_SNAPSHOT = "INSTALL_SNAPSHOT"  # Chunk of a snapshot streamed from the leader to a lagging peer
+    SNAPSHOT_ACK = "SNAPSHOT_ACK"
+    SNAPSHOT_CREATED = "SNAPSHOT_CREATED"  # Sent to itself once a snapshot is serialized
+    TAKE_CHECKPOINT = "TAKE_CHECKPOINT"  # Starts a checkpoint of the cluster, see paxos/checkpoint.py
+    CHECKPOINT_MARKER = "CHECKPOINT_MARKER"  # Marker of a checkpoint, sent to every peer once the node recorded its state
 
     # Client
     CLIENT_REQUEST = "CLIENT_REQUEST"  # Come from bottom layer
-    CLIENT_RESPONSE = "CLIENT_RESPONSE"  # Goes to bottom layer from leader
+    CLIENT_RESPONSE = "CLIENT_RESPONSE"  # Goes to bottom layer from leader, or from any member on the fast path
+    READ_REQUEST = "READ_REQUEST"  # Come from bottom layer
+    READ_RESPONSE = "READ_RESPONSE"  # Goes to bottom layer from the node that is read
 
     # Organizational
     HEARTBEAT = "HEARTBEAT"  # Come from bottom layer
     SLEEP_TRIGGER = "SLEEP_TRIGGER"  # Come from bottom layer
+    TRANSFER_LEADERSHIP = "TRANSFER_LEADERSHIP"  # Come from bottom layer
+    RECONFIGURE = "RECONFIGURE"  # Come from bottom layer
+    RESUME = "RESUME"  # Sent to itself when a paused node resumes
+    RESTART = "RESTART"  # Sent to itself when a crashed node restarts
 
 
 class PaxosMessageTypes(Enum):
@@ -49,8 +181,18 @@ class PaxosMessageTypes(Enum):
     PROMISE = "PROMISE"
     PROPOSE = "PROPOSE"
     ACCEPT = "ACCEPT"
+    PRE_PREPARE = "PRE_PREPARE"
+    PRE_PROMISE = "PRE_PROMISE"
+    TIMEOUT_NOW = "TIMEOUT_NOW"
+    FAST_REPORT = "FAST_REPORT"
+    LEARN = "LEARN"
+    LEARN_REQUEST = "LEARN_REQUEST"
+    INSTALL_SNAPSHOT = "INSTALL_SNAPSHOT"
+    SNAPSHOT_ACK = "SNAPSHOT_ACK"
+    CHECKPOINT_MARKER = "CHECKPOINT_MARKER"
     CLIENT_REQUEST = "CLIENT_REQUEST"
     CLIENT_RESPONSE = "CLIENT_RESPONSE"
+    READ_RESPONSE = "READ_RESPONSE"
 
 
 class PaxosMessageHeader(GenericMessageHeader):
@@ -66,19 +208,41 @@ class CommandTypes(Enum):
     SUBTRACT = "SUBTRACT"
     MULTIPLY = "MULTIPLY"
     DIVIDE = "DIVIDE"
+    CONFIGURATION = "CONFIGURATION"  # Value is the new configuration, {'members': [...], 'learners': [...]}
+
+
+COMMUTING_COMMAND_TYPES = (CommandTypes.ADD.value, CommandTypes.SUBTRACT.value)  # Can be applied in any order
+COMMAND_OPERATORS = {CommandTypes.ADD.value: '+', CommandTypes.SUBTRACT.value: '-', CommandTypes.MULTIPLY.value: '*',
+                     CommandTypes.DIVIDE.value: '/'}
 
 
 class Command:
 
-    def __init__(self, command_id, command_type: CommandTypes, command_value):
+    def __init__(self, command_id, command_type: CommandTypes, command_value, command_key=None, command_payload=None):
         self.id = command_id
         self.type = command_type.value
         self.value = command_value
+        self.key = command_key  # Commands with the same key form a client session and are routed to the same shard
+        # Opaque bytes carried by the command, e.g. the value written to the key, not used by the state machine
+        self.payload = command_payload
+
+    def with_payload(self, payload):
+        return Command(self.id, CommandTypes(self.type), self.value, self.key, payload)
+
+    def without_payload(self):
+        return self.with_payload(None)
 
     def __eq__(self, other):
+        # Payloads are not compared, followers of the erasure coded replication keep commands without their payload
+        if not isinstance(other, Command):
+            return False
         return (self.id == other.id and
                 self.type == other.type and
-                self.value == other.value)
+                self.value == other.value and
+                self.key == other.key)
 
     def __str__(self):
-        return f"Command(id={self.id}, type={self.type}, value={self.value})"
+        payload = f", payload={len(self.payload)} bytes" if self.payload is not None else ""
+        if self.key is None:
+            return f"Command(id={self.id}, type={self.type}, value={self.value}{payload})"
+        return f"Command(id={self.id}, type={self.type}, value={self.value}, key={self.key}{payload})"
@@ -0,0 +1,42 @@
+#!/usr/bin/env python3
+import os
+import sys
+
+sys.path.insert(0, os.getcwd())
+
+from paxos.admission import AdmissionController, busy_backoff
+
+
+def main():
+    controller = AdmissionController()
+    assert not controller.is_enabled()
+    assert controller.admit(1000000, 1000.0, 0.0) is None
+
+    controller = AdmissionController(maxinflightentries=32)
+    assert controller.is_enabled()
+    assert controller.admit(31, 0.0, 0.0) is None
+    assert controller.admit(32, 0.0, 0.0) == "in_flight"
+    assert controller.rejected_commands == 1
+    print("In-flight window rejects commands once the window is full")
+
+    controller = AdmissionController(queuetimetarget=0.005, queuetimeinterval=0.1)
+    # A burst above the target is tolerated for the interval
+    assert controller.admit(0, 0.010, 1.0) is None
+    assert controller.admit(0, 0.010, 1.05) is None
+    assert controller.admit(0, 0.010, 1.1) == "queue_time"
+    assert controller.admit(0, 0.010, 1.2) == "queue_time"
+    # Commands are admitted again once the queue time drops below the target, and the interval restarts
+    assert controller.admit(0, 0.001, 1.3) is None
+    assert controller.admit(0, 0.010, 1.35) is None
+    controller.reset()
+    assert controller.admit(0, 0.010, 1.5) is None
+    assert controller.rejected_commands == 2
+    print("Queue time target rejects commands after the interval only")
+
+    for attempt in range(1, 10):
+        assert 0 <= busy_backoff(attempt, 0.01, 0.5) <= min(0.5, 0.01 * 2 ** (attempt - 1))
+    print("Busy backoff is bounded")
+
+
+if __name__ == "__main__":
+    exit(main())
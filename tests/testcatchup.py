@@ -0,0 +1,43 @@
+#!/usr/bin/env python3
+import os
+import sys
+
+sys.path.insert(0, os.getcwd())
+
+from adhoccomputing.Generics import *
+
+from paxos.experiment import Node
+from paxos.statistics import Statistics
+from paxos.utils import NodeStatus
+
+# A follower coming back from a long pause is caught up chunk by chunk, each chunk within the entry limit of a propose
+
+
+def main():
+    setAHCLogLevel(CRITICAL)
+    Statistics.reset()
+    node = Node("Node", 0, configurationparameters={
+        'number_of_paxos_nodes': 3,
+        'number_of_read_replicas': 0,
+        'sleep_trigger_interval': 1000,
+        'client_request_interval_in_ms': 0,
+        'max_entries_per_propose': 8,
+        'paused_event_buffer_size': 4
+    })
+    node.initiate_process()
+    time.sleep(2)
+    follower = next(paxos_node for paxos_node in node.paxos_nodes if paxos_node.state != NodeStatus.PROPOSER)
+    follower.pause(3)
+    time.sleep(6)
+    leader = node.current_configuration_holder()
+    summary = Statistics.catch_up_summary()
+    lag = leader.commit_index - follower.last_applied
+    node.exit_process()
+    print(f"Catch-up of {follower.node_id}: {summary}, entries behind the leader: {lag}")
+    assert summary['chunks'] > 1 and summary['entries'] <= 8 * summary['chunks'] and summary['completed'] >= 1
+    assert lag < 64
+    print("A paused follower is caught up in chunks")
+
+
+if __name__ == "__main__":
+    exit(main())
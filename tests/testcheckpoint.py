@@ -0,0 +1,57 @@
+#!/usr/bin/env python3
+import os
+import sys
+import tempfile
+
+sys.path.insert(0, os.getcwd())
+
+from adhoccomputing.Generics import *
+
+from paxos.checkpoint import ClusterCheckpoint
+from paxos.experiment import Node, run_experiment
+from paxos.log import LogEntry, PaxosLog
+from paxos.parameters import ExperimentParameters
+from paxos.utils import Command, CommandTypes, NodeStatus
+
+# A checkpoint of a running cluster is written to a file, and a new cluster restored from it goes on from its logs
+
+
+def main():
+    setAHCLogLevel(CRITICAL)
+    log = PaxosLog()
+    for index in range(1, 10):
+        log.append_entry(LogEntry(1, Command(index, CommandTypes.ADD, 1), "PaxosNode_1", index))
+    log.compact(5)
+    restored_log = PaxosLog()
+    restored_log.restore(log.snapshot_index, log[log.snapshot_index:])
+    assert len(restored_log) == len(log) and restored_log.snapshot_index == log.snapshot_index
+    assert all(restored_log[index] == log[index] for index in range(log.snapshot_index, len(log)))
+    print("Restored logs continue from their snapshot index")
+
+    checkpoint_file = os.path.join(tempfile.mkdtemp(), "checkpoint")
+    parameters = ExperimentParameters(number_of_paxos_nodes=3, number_of_read_replicas=0,
+                                      experiment_execution_in_secs=4, sleep_trigger_interval=1000)
+    result = run_experiment(parameters.replace(checkpoint_file=checkpoint_file))
+    print(f"Checkpoint: {result['checkpoint_log_entries']} entries, {result['checkpoint_bytes']} bytes")
+    checkpoint = ClusterCheckpoint.read(checkpoint_file)
+    node_checkpoints = list(checkpoint.node_checkpoints.values())
+    assert len(node_checkpoints) == 3 and result['checkpoint_log_entries'] > 0
+    assert [node_checkpoint.state['status'] for node_checkpoint in node_checkpoints].count(NodeStatus.PROPOSER) == 1
+    checkpoint_commit_index = max(node_checkpoint.state['commit_index'] for node_checkpoint in node_checkpoints)
+
+    node = Node("Node", 0, configurationparameters=parameters)
+    checkpoint.restore(node.paxos_nodes, [node.client])
+    for paxos_node in node.paxos_nodes:
+        assert len(paxos_node.log) == checkpoint.node_checkpoints[paxos_node.node_id].log_length()
+    node.initiate_process()
+    time.sleep(2)
+    leader = node.current_configuration_holder()
+    commit_index = leader.commit_index
+    node.exit_process()
+    print(f"Commit index of the checkpoint: {checkpoint_commit_index}, after the restore: {commit_index}")
+    assert leader.state == NodeStatus.PROPOSER and commit_index > checkpoint_commit_index
+    print("Restored clusters go on committing from the checkpoint")
+
+
+if __name__ == "__main__":
+    exit(main())
@@ -0,0 +1,33 @@
+#!/usr/bin/env python3
+import os
+import sys
+
+sys.path.insert(0, os.getcwd())
+
+from adhoccomputing.Generics import *
+
+from Snapshot.Snapshot import SnapshotComponentModel
+
+# Concurrent snapshots are kept by id up to a limit, late messages of the dropped snapshots are ignored while the
+# memory of the dropped ids stays bounded
+
+
+def main():
+    setAHCLogLevel(CRITICAL)
+    component = SnapshotComponentModel("SnapshotComponentModel", 0)
+    component.snapshot_instances_limit = 4
+    component.dropped_snapshot_ids_limit = 8
+    for sequence in range(100):
+        assert component.snapshot((1, sequence)).snapshot_id == (1, sequence)
+    assert list(component.snapshots) == [(1, sequence) for sequence in range(96, 100)]
+    assert len(component.dropped_snapshot_ids) == len(component.dropped_snapshot_id_order) == 8
+    print("Concurrent snapshots and dropped snapshot ids are bounded")
+
+    assert all(component.snapshot((1, sequence)) is None for sequence in range(88, 96))
+    assert component.snapshot((2, 0)) is not None and (1, 96) in component.dropped_snapshot_ids
+    assert list(component.snapshots)[-1] == (2, 0) and len(component.dropped_snapshot_ids) == 8
+    print("Late messages of the last dropped snapshots are ignored")
+
+
+if __name__ == "__main__":
+    exit(main())
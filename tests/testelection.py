@@ -0,0 +1,56 @@
+#!/usr/bin/env python3
+import os
+import sys
+
+sys.path.insert(0, os.getcwd())
+
+from adhoccomputing.Generics import *
+from adhoccomputing.GenericModel import GenericMessage
+
+from paxos.experiment import run_experiment
+from paxos.paxos_node import PaxosNode
+from paxos.utils import PaxosEventTypes, PaxosMessageHeader, PaxosMessageTypes
+
+# Election timeouts are jittered, pre-votes are refused while the leader is alive, and election durations include the
+# time the followers need to notice that the leader failed
+
+
+def pre_prepare_event(proposer_id, term):
+    header = PaxosMessageHeader(PaxosMessageTypes.PRE_PREPARE, proposer_id, None)
+    return Event(None, PaxosEventTypes.PRE_PREPARE, GenericMessage(header, {'term': term, 'proposerId': proposer_id}))
+
+
+def main():
+    setAHCLogLevel(CRITICAL)
+    node = PaxosNode("PaxosNode", 1, 5, 0.25, 0.15, True)
+    timeouts = [node.randomized_timeout() for _ in range(1000)]
+    assert all(0.25 <= timeout <= 0.40 for timeout in timeouts) and max(timeouts) - min(timeouts) > 0.1
+    print("Election timeouts are drawn from [timeout, timeout + jitter]")
+
+    sent_events = []
+    node.send_to_peer = lambda peer_id, event: sent_events.append(event)
+    node.last_leader_contact_time = node.clock()
+    node.on_pre_prepare(pre_prepare_event("PaxosNode_2", 10))
+    node.last_leader_contact_time = node.clock() - 1.0
+    node.on_pre_prepare(pre_prepare_event("PaxosNode_2", 10))
+    node.on_pre_prepare(pre_prepare_event("PaxosNode_2", 0))
+    assert [event.eventcontent.payload['voteGranted'] for event in sent_events] == [False, True, False]
+    assert node.current_term == 0 and node.promised_term == 0
+    print("Pre-votes are granted only without a live leader, and do not change the term")
+
+    result = run_experiment({
+        'number_of_paxos_nodes': 5,
+        'number_of_read_replicas': 0,
+        'experiment_execution_in_secs': 11,
+        'fault_scenario': "leader_crash",
+        'always_sleep_leader': False,
+        'sleep_trigger_interval': 1000
+    })
+    print(f"Leader changes: {result['leader_changes']}, mean election duration: {result['election_duration_mean']}")
+    assert result['leader_changes'] >= 2
+    assert result['election_duration_mean'] >= result['timeout_in_ms'] / 1000.0
+    print("Election durations include the failure detection time")
+
+
+if __name__ == "__main__":
+    exit(main())
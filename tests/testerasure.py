@@ -0,0 +1,42 @@
+#!/usr/bin/env python3
+import os
+import sys
+from itertools import combinations
+
+sys.path.insert(0, os.getcwd())
+
+from paxos.erasure import ReedSolomonCode, decode_payload, encode_payload
+
+# Every k fragments out of n must rebuild the data, whichever of them are data or parity fragments
+
+
+def main():
+    for data_fragments, total_fragments in ((1, 1), (1, 3), (2, 3), (3, 5), (4, 7)):
+        code = ReedSolomonCode(data_fragments, total_fragments)
+        for length in (0, 1, data_fragments, 1000, 1001):
+            data = os.urandom(length)
+            fragments = code.encode(data)
+            assert len(fragments) == total_fragments
+            assert all(len(fragment) == code.fragment_size(length) for fragment in fragments)
+            for numbers in combinations(range(total_fragments), data_fragments):
+                assert code.decode({number: fragments[number] for number in numbers}, length) == data, \
+                    f"k={data_fragments} n={total_fragments} length={length} fragments={numbers}"
+        try:
+            code.decode({number: fragments[number] for number in range(data_fragments - 1)}, length)
+            assert False, "Decoding less than k fragments must fail"
+        except ValueError:
+            pass
+        print(f"k={data_fragments} n={total_fragments}: every {data_fragments} fragments rebuild the data")
+
+    payload = os.urandom(4096)
+    fragments = encode_payload(payload, 3, 5)
+    assert decode_payload(fragments[2:]) == payload
+    assert decode_payload(fragments[3:]) is None
+    # Fragments of another code, e.g. from before a configuration change, are not mixed with them
+    assert decode_payload(fragments[3:] + encode_payload(payload, 2, 3)[:1]) is None
+    assert decode_payload(fragments[3:] + encode_payload(payload, 2, 3)[1:]) == payload
+    print("Payloads are rebuilt from fragments of the same code only")
+
+
+if __name__ == "__main__":
+    exit(main())
@@ -0,0 +1,61 @@
+#!/usr/bin/env python3
+import os
+import sys
+
+sys.path.insert(0, os.getcwd())
+
+from adhoccomputing.Generics import *
+
+from paxos.client_node import ClientNode
+from paxos.experiment import Node
+from paxos.paxos_node import PaxosNode
+from paxos.statistics import Statistics
+from paxos.utils import PaxosEventTypes
+
+# Fast quorums intersect every phase 1 quorum, and commands committed on the fast path are applied in the same order by
+# every node across leader changes
+
+
+def main():
+    setAHCLogLevel(CRITICAL)
+    assert PaxosNode("PaxosNode", 1, 5, 0.25).fast_quorum_size() == 3
+    assert PaxosNode("PaxosNode", 1, 5, 0.25, phase1quorum=2, phase2quorum=4).fast_quorum_size() == 4
+    print("Fast quorums are majorities unless phase 1 quorums are smaller")
+
+    fast_commits = []
+    count_fast_accept = ClientNode.count_fast_accept
+
+    def count_fast_commit(eventobj, fast_accepts):
+        committed = count_fast_accept(eventobj, fast_accepts)
+        if committed:
+            fast_commits.append(eventobj.eventcontent.payload['command'])
+        return committed
+
+    ClientNode.count_fast_accept = staticmethod(count_fast_commit)
+    Statistics.reset()
+    node = Node("Node", 0, configurationparameters={
+        'number_of_paxos_nodes': 5,
+        'number_of_read_replicas': 0,
+        'number_of_nodes_to_sleep': 1,
+        'sleep_trigger_interval': 1.5,
+        'client_request_interval_in_ms': 0,
+        'fast_path_enabled': True
+    })
+    node.initiate_process()
+    time.sleep(9)
+    node.sleep_trigger.terminated = True
+    node.client.eventhandlers[PaxosEventTypes.CLIENT_RESPONSE] = lambda eventobj: None
+    time.sleep(3)
+    applied = {}  # for each number of applied entries, the states of the nodes that applied them
+    for paxos_node in node.paxos_nodes:
+        applied.setdefault(paxos_node.last_applied, set()).add(paxos_node.state_machine_value)
+    node.exit_process()
+    print(f"Fast commits: {len(fast_commits)}, leader changes: {Statistics.number_of_leader_changes}, "
+          f"states by applied entries: {applied}")
+    assert fast_commits and Statistics.number_of_leader_changes >= 2
+    assert all(len(states) == 1 for states in applied.values())
+    print("Nodes apply the same commands with the fast path across leader changes")
+
+
+if __name__ == "__main__":
+    exit(main())
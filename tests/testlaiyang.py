@@ -0,0 +1,32 @@
+#!/usr/bin/env python3
+import os
+import sys
+
+sys.path.insert(0, os.getcwd())
+
+from adhoccomputing.Generics import *
+
+from Snapshot.benchmark import run_snapshot_benchmark
+
+# The counting variant of Lai-Yang reports the states of the incoming channels of a component together, so flooding
+# them costs as many messages as flooding the local states
+
+
+def main():
+    setAHCLogLevel(CRITICAL)
+    result = run_snapshot_benchmark({
+        'algorithm': 'lai_yang',
+        'topology': 'full_mesh',
+        'number_of_components': 6,
+        'traffic_interval_in_ms': 100,
+        'timeout_in_secs': 30
+    })
+    print(f"Completion time: {result['completion_time']}, collection messages: {result['collection_messages']}")
+    assert result['completed']
+    # Every component floods its local state and the states of its channels on each end of every channel
+    assert result['collection_messages'] <= 2 * result['number_of_components'] * 2 * result['number_of_channels']
+    print("Channel states of each component are collected in a single report")
+
+
+if __name__ == "__main__":
+    exit(main())
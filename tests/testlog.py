@@ -0,0 +1,52 @@
+#!/usr/bin/env python3
+import os
+import sys
+
+sys.path.insert(0, os.getcwd())
+
+from paxos.log import LogEntry, PaxosLog
+from paxos.utils import Command, CommandTypes
+
+
+def new_entry(index, term=1):
+    return LogEntry(term, Command(index, CommandTypes.ADD, index), "node", index)
+
+
+def main():
+    log = PaxosLog()
+    log.append_entries([new_entry(index) for index in range(1, 11)])
+    assert len(log) == 11
+
+    # Compacted entries are dropped, the last compacted one is kept first and indexes do not change
+    log.compact(5)
+    assert len(log) == 11 and log.snapshot_index == 5
+    assert log[5].index == 5 and log[10].index == 10 and log[-1].index == 10
+    assert [entry.index for entry in log[3:8]] == [5, 6, 7]
+    assert [entry.index for entry in log[6:]] == [6, 7, 8, 9, 10]
+    try:
+        log[4]
+        assert False, "Compacted entries must not be read"
+    except IndexError:
+        pass
+    log.compact(3)
+    assert log.snapshot_index == 5
+    print("Compaction keeps the indexes of the entries")
+
+    log.truncate(8)
+    assert len(log) == 8 and log[-1].index == 7
+    log.truncate(2)
+    assert len(log) == 6 and log[-1].index == 5
+    log.append_entry(new_entry(6, 2))
+    assert log[6].term == 2
+    print("Truncation keeps the last compacted entry")
+
+    reset_log = PaxosLog()
+    reset_log.reset(20, 3)
+    assert len(reset_log) == 21 and reset_log[20].term == 3 and reset_log[20].index == 20
+    reset_log.append_entry(new_entry(21, 3))
+    assert reset_log[21].index == 21
+    print("Reset logs continue from their snapshot index")
+
+
+if __name__ == "__main__":
+    exit(main())
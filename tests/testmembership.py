@@ -0,0 +1,49 @@
+#!/usr/bin/env python3
+import os
+import sys
+
+sys.path.insert(0, os.getcwd())
+
+from adhoccomputing.Generics import *
+
+from paxos.experiment import Node
+from paxos.statistics import Statistics
+
+# A node added while the cluster runs joins as a learner, catches up and becomes a voting member, a removed node leaves
+# the voting members, and the cluster goes on committing commands meanwhile
+
+
+def main():
+    setAHCLogLevel(CRITICAL)
+    Statistics.reset()
+    node = Node("Node", 0, configurationparameters={
+        'number_of_paxos_nodes': 3,
+        'number_of_read_replicas': 0,
+        'sleep_trigger_interval': 1000
+    })
+    node.initiate_process()
+    time.sleep(2)
+    new_node = node.add_paxos_node()
+    time.sleep(3)
+    leader = node.current_configuration_holder()
+    print(f"Members after adding {new_node.node_id}: {leader.members}, learners: {leader.learners}")
+    assert new_node.node_id in leader.members and leader.learners == []
+    assert new_node.members == leader.members and new_node.last_applied > 0
+
+    removed_node_id = next(node_id for node_id in leader.members if node_id not in (leader.node_id, new_node.node_id))
+    node.remove_paxos_node(removed_node_id)
+    time.sleep(2)
+    leader = node.current_configuration_holder()
+    commit_index = leader.commit_index
+    time.sleep(1)
+    members = list(leader.members)
+    progressed = leader.commit_index > commit_index
+    node.exit_process()
+    print(f"Members after removing {removed_node_id}: {members}")
+    assert removed_node_id not in members and len(members) == 3 and new_node.node_id in members
+    assert progressed
+    print("Nodes join and leave the voting members while commands are committed")
+
+
+if __name__ == "__main__":
+    exit(main())
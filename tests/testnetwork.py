@@ -0,0 +1,61 @@
+#!/usr/bin/env python3
+import os
+import random
+import sys
+
+sys.path.insert(0, os.getcwd())
+
+from paxos.network import LatencyDistribution, Link, LinkModel, NetworkEmulator, NetworkTopology
+
+
+def main():
+    generator = random.Random(1)
+    distribution = LatencyDistribution("uniform", {'min_ms': 10, 'max_ms': 20})
+    assert all(0.010 <= distribution.sample(generator) <= 0.020 for _ in range(1000))
+    distribution = LatencyDistribution("pareto", {'min_ms': 1, 'alpha': 1.0, 'max_ms': 50})
+    assert all(0.001 <= distribution.sample(generator) <= 0.050 for _ in range(1000))
+    assert LatencyDistribution.from_description(None).sample(generator) == 0.0
+    try:
+        LatencyDistribution("unknown")
+        assert False, "Unknown distributions must be rejected"
+    except ValueError:
+        pass
+    print("Latencies are sampled within their bounds")
+
+    for name in NetworkTopology.available_names():
+        topology = NetworkTopology.load(name)
+        regions = topology.place([f"node{number}" for number in range(len(topology.regions) * 2)])
+        assert set(regions.values()) <= set(topology.regions)
+        for source_region in topology.regions:
+            for destination_region in topology.regions:
+                assert topology.link_model(source_region, destination_region) is \
+                    topology.link_model(destination_region, source_region)
+    topology = NetworkTopology.load("three_regions")
+    assert topology.place(["a", "b", "c", "d"]) == {'a': "us-east", 'b': "us-west", 'c': "eu-west", 'd': "us-east"}
+    assert topology.link_model("us-east", "us-west").bandwidth == 1000 * 1000 * 1000 / 8
+    print(f"Topologies {', '.join(NetworkTopology.available_names())} are loaded")
+
+    emulator = NetworkEmulator([], NetworkTopology("test", ["region"], {}))
+    # Latencies vary widely, messages of a link still arrive in the order they are sent
+    link = Link(LinkModel(LatencyDistribution("uniform", {'min_ms': 0, 'max_ms': 100})))
+    delivery_times = [emulator.transmit(link, 1000) for _ in range(1000)]
+    assert delivery_times == sorted(delivery_times)
+    # Unless they are reordered on purpose
+    link = Link(LinkModel(LatencyDistribution("uniform", {'min_ms': 0, 'max_ms': 100}), reorder=0.5,
+                          reorder_delay=0.1))
+    delivery_times = [emulator.transmit(link, 1000) for _ in range(1000)]
+    assert delivery_times != sorted(delivery_times) and emulator.reordered_messages > 0
+    print("Messages of a link arrive in order unless reordered")
+
+    # 1000 bytes per second: each message waits for the transmission of those before it
+    link = Link(LinkModel(bandwidth=1000, queue_limit=2500))
+    delivery_times = [emulator.transmit(link, 1000) for _ in range(3)]
+    assert delivery_times[2] is None and emulator.queue_dropped_messages == 1
+    assert 0.99 <= delivery_times[1] - delivery_times[0] <= 1.01
+    link = Link(LinkModel(loss=1.0))
+    assert emulator.transmit(link, 1000) is None and emulator.lost_messages == 1
+    print("Bandwidth, queue limit and loss are emulated")
+
+
+if __name__ == "__main__":
+    exit(main())
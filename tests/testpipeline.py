@@ -0,0 +1,50 @@
+#!/usr/bin/env python3
+import os
+import sys
+
+sys.path.insert(0, os.getcwd())
+
+from adhoccomputing.Generics import *
+
+from paxos.experiment import Node
+from paxos.statistics import Statistics
+from paxos.utils import PaxosEventTypes
+
+# With the pipeline, committed entries are applied by the apply stage, also across leader changes on the fast path.
+# Once the client and the sleep trigger stop, the nodes applying the same entries reach the same state.
+
+
+def main():
+    setAHCLogLevel(CRITICAL)
+    Statistics.reset()
+    node = Node("Node", 0, configurationparameters={
+        'number_of_paxos_nodes': 5,
+        'number_of_read_replicas': 0,
+        'number_of_nodes_to_sleep': 1,
+        'sleep_trigger_interval': 1.5,
+        'client_request_interval_in_ms': 0,
+        'pipeline_enabled': True,
+        'fast_path_enabled': True,
+        'snapshot_interval_in_entries': 500
+    })
+    node.initiate_process()
+    time.sleep(11)
+    node.sleep_trigger.terminated = True
+    node.client.eventhandlers[PaxosEventTypes.CLIENT_RESPONSE] = lambda eventobj: None
+    time.sleep(3)
+    applied = {}  # for each number of applied entries, the states of the nodes that applied them
+    for paxos_node in node.paxos_nodes:
+        applied.setdefault(paxos_node.last_applied, set()).add(paxos_node.state_machine_value)
+    apply_stage_summary = node.paxos_nodes[0].apply_stage.summary()
+    node.exit_process()
+    print(f"Leader changes: {Statistics.number_of_leader_changes}, states by applied entries: {applied}")
+    print(f"Apply stage of {node.paxos_nodes[0].node_id}: {apply_stage_summary}")
+    assert Statistics.number_of_leader_changes >= 2
+    assert all(len(states) == 1 for states in applied.values())
+    # Followers learn the commit index of the last entry with the next propose, which never comes once the client stops
+    assert min(applied) > 0 and max(applied) - min(applied) <= 1
+    print("Nodes apply the same entries with the pipeline and the fast path across leader changes")
+
+
+if __name__ == "__main__":
+    exit(main())
@@ -0,0 +1,36 @@
+#!/usr/bin/env python3
+import os
+import sys
+from itertools import combinations
+
+sys.path.insert(0, os.getcwd())
+
+from paxos.utils import majority, validate_quorum_sizes
+
+
+def intersect(number_of_nodes, phase_1_quorum_size, phase_2_quorum_size):
+    nodes = range(number_of_nodes)
+    return all(set(phase_1_quorum) & set(phase_2_quorum)
+               for phase_1_quorum in combinations(nodes, phase_1_quorum_size)
+               for phase_2_quorum in combinations(nodes, phase_2_quorum_size))
+
+
+def main():
+    # Quorum sizes are accepted exactly when every phase 1 quorum intersects every phase 2 quorum
+    for number_of_nodes in range(1, 8):
+        for phase_1_quorum_size in range(0, number_of_nodes + 2):
+            for phase_2_quorum_size in range(0, number_of_nodes + 2):
+                in_range = 1 <= phase_1_quorum_size <= number_of_nodes and 1 <= phase_2_quorum_size <= number_of_nodes
+                try:
+                    validate_quorum_sizes(number_of_nodes, phase_1_quorum_size, phase_2_quorum_size)
+                    valid = True
+                except ValueError:
+                    valid = False
+                assert valid == (in_range and intersect(number_of_nodes, phase_1_quorum_size, phase_2_quorum_size)), \
+                    f"n={number_of_nodes} q1={phase_1_quorum_size} q2={phase_2_quorum_size}"
+        validate_quorum_sizes(number_of_nodes, majority(number_of_nodes), majority(number_of_nodes))
+        print(f"{number_of_nodes} nodes: quorum sizes validated")
+
+
+if __name__ == "__main__":
+    exit(main())
@@ -0,0 +1,39 @@
+#!/usr/bin/env python3
+import os
+import sys
+
+sys.path.insert(0, os.getcwd())
+
+from adhoccomputing.Generics import *
+
+from Snapshot.Snapshot import SnapshotComponentModel
+
+# Local states hold the events since the previous local state, at most recorded_events_limit of them, and the others
+# are only counted
+
+
+class RecordingComponentModel(SnapshotComponentModel):
+    recorded_events_limit = 16
+
+
+def main():
+    setAHCLogLevel(CRITICAL)
+    component = RecordingComponentModel("RecordingComponentModel", 0)
+    for number in range(10):
+        component.on_pre_event(Event(None, EventTypes.MFRT, number))
+    first_state = component.record_local_state()
+    for number in range(10, 50):
+        component.on_pre_event(Event(None, EventTypes.MFRT, number))
+    second_state = component.record_local_state()
+    third_state = component.record_local_state()
+
+    assert first_state.checkpoint == 0 and [event.eventcontent for event in first_state.events] == list(range(10))
+    assert second_state.checkpoint == 1 and second_state.dropped_event_count == 24
+    assert [event.eventcontent for event in second_state.events] == list(range(34, 50))
+    assert third_state.events == [] and third_state.dropped_event_count == 0
+    assert len(component.recv_events) == 16 and third_state.event_count() == 50
+    print("Local states are recorded since the previous checkpoint with bounded retention")
+
+
+if __name__ == "__main__":
+    exit(main())
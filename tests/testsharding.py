@@ -0,0 +1,44 @@
+#!/usr/bin/env python3
+import os
+import sys
+
+sys.path.insert(0, os.getcwd())
+
+from adhoccomputing.Generics import *
+
+from paxos.benchmark import run_benchmark, ShardedBenchmarkNode
+from paxos.parameters import ExperimentParameters
+from paxos.sharding import ShardedNode, group_of_key
+
+# Nodes of all groups, the client and the heartbeat node of the sharded mode are configured by the experiment parameters
+
+
+def main():
+    setAHCLogLevel(CRITICAL)
+    parameters = ExperimentParameters(number_of_paxos_nodes=4, timeout_in_ms=400, election_timeout_jitter_in_ms=50,
+                                      pre_vote_enabled=False, phase_1_quorum_size=3, phase_2_quorum_size=2,
+                                      thrifty_replication=True, heartbeat_in_ms=25, client_request_interval_in_ms=5)
+    sharded_node = ShardedNode("ShardedNode", 0, numberofgroups=3, numberofkeys=12, hostedgroups=[0, 2],
+                               configurationparameters=parameters)
+    assert len(sharded_node.paxos_nodes) == 8
+    for paxos_node in sharded_node.paxos_nodes:
+        assert paxos_node.base_timeout == 0.4 and paxos_node.timeout_jitter == 0.05 and not paxos_node.pre_vote
+        assert paxos_node.phase_1_quorum() == 3 and paxos_node.phase_2_quorum() == 2 and paxos_node.thrifty
+    assert sharded_node.heartbeat.heartbeat_interval == 0.025
+    assert sharded_node.client.retry_timeout == 0.4 and sharded_node.client.request_interval_in_ms == 5
+    assert all(group_of_key(key, 3) in (0, 2) for key in sharded_node.client.session_keys)
+    assert len(sharded_node.client.session_keys) == len([key for key in range(12) if group_of_key(key, 3) != 1])
+    print("Groups, client and heartbeat node follow the experiment parameters")
+
+    result = run_benchmark({
+        'number_of_groups': 2,
+        'number_of_nodes': 3,
+        'number_of_keys': 8,
+        'timeout_in_ms': 400
+    }, 3, nodeclass=ShardedBenchmarkNode)
+    print(f"Throughput of 2 groups: {result['throughput']}")
+    assert result['throughput'] > 0
+
+
+if __name__ == "__main__":
+    exit(main())
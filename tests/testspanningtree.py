@@ -0,0 +1,31 @@
+#!/usr/bin/env python3
+import os
+import sys
+
+sys.path.insert(0, os.getcwd())
+
+from adhoccomputing.Generics import *
+
+from Snapshot.benchmark import run_snapshot_benchmark
+
+# Over the spanning tree of the markers, the initiator receives the state of every component with one message per
+# component other than itself
+
+
+def main():
+    setAHCLogLevel(CRITICAL)
+    result = run_snapshot_benchmark({
+        'algorithm': 'chandy_lamport_tree',
+        'topology': 'grid',
+        'number_of_components': 16,
+        'traffic_interval_in_ms': 100,
+        'timeout_in_secs': 30
+    })
+    print(f"Completion time: {result['completion_time']}, collection messages: {result['collection_messages']}")
+    assert result['completed']
+    assert result['collection_messages'] == result['number_of_components'] - 1
+    print("Local states are collected over the spanning tree")
+
+
+if __name__ == "__main__":
+    exit(main())
@@ -0,0 +1,54 @@
+#!/usr/bin/env python3
+import os
+import sys
+
+sys.path.insert(0, os.getcwd())
+
+from adhoccomputing.Generics import *
+from adhoccomputing.GenericModel import GenericMessage
+
+from paxos.log import LogEntry
+from paxos.paxos_node import PaxosNode
+from paxos.utils import Command, CommandTypes, NodeStatus, PaxosEventTypes, PaxosMessageHeader, PaxosMessageTypes
+
+# A thrifty leader replaces a slow quorum peer once, and feeds the peers outside the quorum only periodically
+
+
+def accept_event(peer_id, index):
+    header = PaxosMessageHeader(PaxosMessageTypes.ACCEPT, peer_id, "PaxosNode_1")
+    return Event(None, PaxosEventTypes.ACCEPT, GenericMessage(header, {'term': 1, 'index': index, 'success': True}))
+
+
+def main():
+    setAHCLogLevel(CRITICAL)
+    leader = PaxosNode("PaxosNode", 1, 5, 0.25, thrifty=True)
+    proposed_peer_ids = []
+    # Heartbeats are proposes without entries
+    leader.send_to_peer = lambda peer_id, event: proposed_peer_ids.append(peer_id) \
+        if event.event == PaxosEventTypes.PROPOSE and event.eventcontent.payload['entries'] else None
+    leader.current_term = 1
+    leader.state = NodeStatus.PROPOSER
+    leader.next_index = {peer_id: 1 for peer_id in leader.get_peer_ids()}
+    leader.match_index = {peer_id: 0 for peer_id in leader.get_peer_ids()}
+    leader.thrifty_quorum = ["PaxosNode_2", "PaxosNode_3"]
+    for index in range(1, 201):
+        leader.log.append_entry(LogEntry(1, Command(index, CommandTypes.ADD, 1), leader.node_id, index))
+    leader.propose_send_times = {"PaxosNode_2": leader.clock() - 1.0, "PaxosNode_3": leader.clock()}
+    leader.last_catch_up_time = leader.clock() + 60.0
+
+    for _ in range(5):
+        leader.update_thrifty_replication()
+    assert len(leader.thrifty_quorum) == 2 and "PaxosNode_2" not in leader.thrifty_quorum
+    assert len(proposed_peer_ids) == 1 and proposed_peer_ids[0] in leader.thrifty_quorum
+    print(f"Slow quorum peer is replaced once by {proposed_peer_ids[0]}")
+
+    proposed_peer_ids.clear()
+    leader.on_accept(accept_event("PaxosNode_2", 64))
+    assert proposed_peer_ids == [] and leader.match_index["PaxosNode_2"] == 64
+    leader.on_accept(accept_event("PaxosNode_3", 64))
+    assert proposed_peer_ids == ["PaxosNode_3"]
+    print("Only quorum peers are sent the following entries right after they accept")
+
+
+if __name__ == "__main__":
+    exit(main())
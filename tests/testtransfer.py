@@ -0,0 +1,56 @@
+#!/usr/bin/env python3
+import os
+import sys
+
+sys.path.insert(0, os.getcwd())
+
+from adhoccomputing.Generics import *
+
+from paxos.experiment import run_experiment
+from paxos.paxos_node import PaxosNode
+from paxos.statistics import Statistics
+from paxos.utils import NodeStatus, PaxosEventTypes
+
+# A leader about to sleep hands over leadership to a peer that is not put to sleep with it, within about a round trip
+
+
+def new_leader():
+    node = PaxosNode("PaxosNode", 1, 5, 0.25)
+    node.sent_events = []
+    node.send_to_peer = lambda peer_id, event: node.sent_events.append((peer_id, event.event))
+    node.state = NodeStatus.PROPOSER
+    node.match_index = {peer_id: 0 for peer_id in node.get_peer_ids()}
+    return node
+
+
+def main():
+    setAHCLogLevel(CRITICAL)
+    leader = new_leader()
+    assert leader.start_leadership_transfer(excluded_node_ids=["PaxosNode_2", "PaxosNode_3", "PaxosNode_5"])
+    assert leader.sent_events == [("PaxosNode_4", PaxosEventTypes.TIMEOUT_NOW)]
+    assert leader.state == NodeStatus.FOLLOWER and leader.transfer_target is None
+    print("Leadership is handed over to a peer outside the sleeping nodes")
+
+    leader = new_leader()
+    assert not leader.start_leadership_transfer("PaxosNode_9")
+    assert not leader.postpone_sleep_for_transfer(1.0, leader.get_voting_peer_ids())
+    assert leader.sent_events == [] and leader.state == NodeStatus.PROPOSER and leader.pending_sleep_time is None
+    print("Unknown targets are rejected, the leader sleeps at once if every peer sleeps")
+    Statistics.reset()
+
+    result = run_experiment({
+        'number_of_paxos_nodes': 5,
+        'number_of_read_replicas': 0,
+        'experiment_execution_in_secs': 12,
+        'number_of_nodes_to_sleep': 1,
+        'sleep_trigger_interval': 1.5,
+        'sleep_time': 1
+    })
+    print(f"Leader changes: {result['leader_changes']}, mean election duration: {result['election_duration_mean']}")
+    assert result['leader_changes'] >= 2
+    assert result['election_duration_mean'] < result['timeout_in_ms'] / 1000.0
+    print("Transfers before sleeping are shorter than a timeout")
+
+
+if __name__ == "__main__":
+    exit(main())